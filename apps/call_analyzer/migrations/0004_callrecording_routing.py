@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call_analyzer', '0003_remove_callrecording_call_summary_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callrecording',
+            name='routing',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call_analyzer', '0004_callrecording_routing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callrecording',
+            name='performance_deferred',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call_analyzer', '0005_callrecording_performance_deferred'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callrecording',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='callrecording',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='call_analyzer.callrecording'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('call_analyzer', '0006_callrecording_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callrecording',
+            name='fingerprint',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='FingerprintHash',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.IntegerField()),
+                ('offset', models.IntegerField()),
+                ('call_recording', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprint_hashes', to='call_analyzer.callrecording')),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fingerprint_hashes', to='core.organization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'hash'], name='call_analyz_organiz_69a01f_idx')],
+            },
+        ),
+    ]
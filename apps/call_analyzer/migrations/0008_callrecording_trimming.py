@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call_analyzer', '0007_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callrecording',
+            name='trimmed_duration',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='callrecording',
+            name='trimmed_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call_analyzer', '0008_callrecording_trimming'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='partial',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call_analyzer', '0009_transcription_partial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callrecording',
+            name='near_duplicates',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
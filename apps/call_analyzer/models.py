@@ -43,10 +43,57 @@ class CallRecording(TimeStampedModel):
     customer_name = models.CharField(max_length=255, null=True, blank=True)
     customer_company = models.CharField(max_length=255, null=True, blank=True)
     
+    # Whisper model and summary path chosen for this call (see RoutingPolicy)
+    routing = models.JSONField(default=dict, blank=True)
+    # Performance analysis skipped under load, to be backfilled
+    performance_deferred = models.BooleanField(default=False, db_index=True)
+    
+    # SHA-256 of the uploaded file, and the identical recording whose analysis was reused
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        related_name='duplicates',
+        null=True, blank=True
+    )
+    # Packed spectral peak hashes (see FingerprintService), indexed in FingerprintHash
+    fingerprint = models.BinaryField(null=True, blank=True)
+    # Processed calls this pending upload sounds like, as {'id', 'title', 'score'}, awaiting
+    # the user's choice to reuse one of their analyses or process it
+    near_duplicates = models.JSONField(default=list, blank=True)
+    # Audio left for Whisper after cutting non-speech (see NonSpeechTrimmer), and the seconds cut
+    trimmed_duration = models.DurationField(null=True, blank=True)
+    trimmed_seconds = models.FloatField(null=True, blank=True)
+    
     def __str__(self):
         return self.title
 
 
+class FingerprintHash(models.Model):
+    """
+    Inverted index of acoustic fingerprint hashes: one row per hash of a recording.
+    """
+    hash = models.IntegerField()
+    offset = models.IntegerField()  # Spectrogram frame of the hash's anchor peak
+    call_recording = models.ForeignKey(
+        CallRecording,
+        on_delete=models.CASCADE,
+        related_name='fingerprint_hashes'
+    )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='fingerprint_hashes',
+        null=True, blank=True
+    )
+    
+    class Meta:
+        indexes = [models.Index(fields=['organization', 'hash'])]
+    
+    def __str__(self):
+        return f"Fingerprint hash {self.hash} of {self.call_recording_id}"
+
+
 class Transcription(TimeStampedModel):
     """
     Represents the text transcription of a call recording.
@@ -62,6 +109,8 @@ class Transcription(TimeStampedModel):
     segments = models.JSONField(default=list)  # List of {start, end, text, speaker} objects
     
     confidence_score = models.FloatField(null=True, blank=True)
+    # Still being transcribed: segments so far, saved progressively
+    partial = models.BooleanField(default=False)
     
     def __str__(self):
         return f"Transcription for {self.call_recording.title}"
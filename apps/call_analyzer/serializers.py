@@ -25,7 +25,7 @@ class TranscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transcription
         fields = ['id', 'call_recording', 'text', 'segments', 'confidence_score', 
-                  'created_at', 'updated_at']
+                  'partial', 'created_at', 'updated_at']
 
 
 class CallSummarySerializer(serializers.ModelSerializer):
@@ -72,7 +72,10 @@ class CallRecordingDetailSerializer(serializers.ModelSerializer):
                   'call_date', 'call_type', 'customer_name', 'customer_company', 
                   'tags', 'transcription_available', 'summary_available', 
                   'sentiment_available', 'performance_available', 
-                  'created_at', 'updated_at']
+                  'routing', 'content_hash', 'duplicate_of', 'near_duplicates',
+                  'trimmed_duration', 'trimmed_seconds', 'created_at', 'updated_at']
+        read_only_fields = ['routing', 'content_hash', 'duplicate_of', 'near_duplicates',
+                            'trimmed_duration', 'trimmed_seconds']
     
     def get_transcription_available(self, obj):
         """Check if transcription is available."""
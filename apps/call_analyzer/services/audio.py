@@ -0,0 +1,168 @@
+import logging
+import subprocess
+from typing import Iterator, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Whisper works on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+
+def decode_audio(file_path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode an audio file of any format ffmpeg reads to mono float32 samples.
+
+    ffmpeg writes raw 16-bit PCM to a pipe, so the recording is read from
+    disk once and no intermediate file is created.
+
+    Args:
+        file_path: Path to the audio file
+        sample_rate: Output sample rate
+
+    Returns:
+        Samples in [-1, 1] as a float32 array
+    """
+    command = [
+        'ffmpeg', '-nostdin', '-threads', '0',
+        '-i', file_path,
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(sample_rate),
+        '-'
+    ]
+    try:
+        completed = subprocess.run(command, capture_output=True, check=True)
+    except FileNotFoundError as e:
+        raise RuntimeError("ffmpeg is required to decode audio") from e
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode {file_path}: {e.stderr.decode(errors='replace').strip()}") from e
+
+    audio = np.frombuffer(completed.stdout, np.int16).astype(np.float32) / 32768.0
+    logger.debug(f"Decoded {len(audio) / sample_rate:.0f}s of audio from {file_path}")
+    return audio
+
+
+def downsample(audio: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Reduce the sample rate by an integer factor.
+
+    A windowed-sinc low-pass filter below the new Nyquist frequency is
+    applied before decimating, so higher frequencies do not alias.
+
+    Args:
+        audio: Mono float32 samples
+        factor: Ratio of the old to the new sample rate
+
+    Returns:
+        Float32 samples at the lower rate
+    """
+    if factor == 1:
+        return np.asarray(audio, dtype=np.float32)
+    return np.convolve(audio, _lowpass_kernel(factor), mode='same')[::factor]
+
+
+def _lowpass_kernel(factor: int) -> np.ndarray:
+    """Windowed-sinc low-pass filter for decimating by `factor`, 8 * factor taps either side."""
+    taps = np.arange(-8 * factor, 8 * factor + 1)
+    kernel = np.sinc(taps / factor) * np.hamming(len(taps))
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def downsample_windows(audio: np.ndarray, factor: int, window: int) -> Iterator[np.ndarray]:
+    """
+    `downsample` a long (e.g. memory-mapped) array a window at a time.
+
+    Each window is filtered with the samples either side of it that the
+    filter reaches, so the concatenated output equals `downsample(audio, factor)`.
+
+    Args:
+        audio: Mono float32 samples
+        factor: Ratio of the old to the new sample rate
+        window: Input samples per window
+
+    Yields:
+        Consecutive float32 blocks of samples at the lower rate
+    """
+    window = max(window // factor, 1) * factor
+    kernel = _lowpass_kernel(factor)
+    reach = len(kernel) // 2
+    for start in range(0, len(audio), window):
+        low = max(start - reach, 0)
+        samples = np.array(audio[low:min(start + window + reach, len(audio))], dtype=np.float32)
+        filtered = np.convolve(samples, kernel)[reach:reach + len(samples)]
+        yield filtered[start - low:start - low + window:factor]
+
+
+def stream_audio_windows(source: Union[str, np.ndarray], window_seconds: float, overlap_seconds: float,
+                         sample_rate: int = SAMPLE_RATE) -> Iterator[Tuple[int, np.ndarray, bool]]:
+    """
+    Decode an audio file with ffmpeg in fixed, overlapping windows.
+
+    Only one window of samples is held at a time, so memory use does not
+    grow with the length of the recording. The ffmpeg process is stopped
+    when the generator is closed. Already decoded samples, e.g. a
+    memory-mapped array from the feature store, are windowed the same way
+    without ffmpeg.
+
+    Args:
+        source: Path to the audio file, or its samples at `sample_rate`
+        window_seconds: Length of each window
+        overlap_seconds: Audio shared by consecutive windows
+        sample_rate: Output sample rate
+
+    Yields:
+        (start_sample, samples, is_last) per window; the last window may be shorter
+    """
+    window = int(window_seconds * sample_rate)
+    hop = window - int(overlap_seconds * sample_rate)
+    if hop <= 0:
+        raise ValueError("Window overlap must be shorter than the window")
+
+    if not isinstance(source, str):
+        start = 0
+        while True:
+            is_last = start + window >= len(source)
+            # Copy the window out so a memory-mapped source is only paged in a window at a time
+            yield start, np.array(source[start:start + window], dtype=np.float32), is_last
+            if is_last:
+                break
+            start += hop
+        return
+
+    file_path = source
+    command = [
+        'ffmpeg', '-nostdin', '-loglevel', 'error', '-threads', '0',
+        '-i', file_path,
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(sample_rate),
+        '-'
+    ]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError as e:
+        raise RuntimeError("ffmpeg is required to decode audio") from e
+
+    def read(samples: int) -> np.ndarray:
+        data = process.stdout.read(samples * 2)
+        return np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+
+    try:
+        start = 0
+        buffer = read(window)
+        if not len(buffer):
+            process.wait()
+            error = process.stderr.read().decode(errors='replace').strip()
+            raise RuntimeError(f"Failed to decode {file_path}: {error}")
+
+        while True:
+            following = read(hop)
+            is_last = not len(following)
+            yield start, buffer, is_last
+            if is_last:
+                break
+            buffer = np.concatenate([buffer[hop:], following])
+            start += hop
+    finally:
+        process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
@@ -0,0 +1,174 @@
+import logging
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from apps.call_analyzer.services.audio import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# Whisper decodes 30 s at a time; adjacent low-confidence segments are re-decoded together up to this
+MAX_SPAN_SECONDS = 30.0
+# Words of the transcript before a span passed to the larger model as its prompt
+PROMPT_CONTEXT_WORDS = 50
+
+
+def segment_confidence(segment: Dict[str, Any]) -> Optional[float]:
+    """Geometric mean token probability of a segment, from Whisper's avg_logprob."""
+    if segment.get('avg_logprob') is None:
+        return None
+    return math.exp(segment['avg_logprob'])
+
+
+def transcript_confidence(segments: List[Dict[str, Any]]) -> Optional[float]:
+    """
+    Confidence of a whole transcript.
+
+    Args:
+        segments: Transcript segments carrying Whisper's avg_logprob
+
+    Returns:
+        Duration-weighted mean segment confidence in [0, 1], or None if no
+        segment has a log probability
+    """
+    weighted, total = 0.0, 0.0
+    for segment in segments:
+        confidence = segment_confidence(segment)
+        if confidence is None:
+            continue
+        weight = max(segment.get('end', 0) - segment.get('start', 0), 0.01)
+        weighted += confidence * weight
+        total += weight
+    return weighted / total if total else None
+
+
+def _mean_logprob(segments: List[Dict[str, Any]]) -> float:
+    """Duration-weighted mean avg_logprob; -inf for no segments."""
+    scored = [segment for segment in segments if segment.get('avg_logprob') is not None]
+    if not scored:
+        return -math.inf
+    weights = [max(segment['end'] - segment['start'], 0.01) for segment in scored]
+    return sum(segment['avg_logprob'] * weight for segment, weight in zip(scored, weights)) / sum(weights)
+
+
+class CascadeTranscriber:
+    """
+    Second tier of a two-model transcription cascade.
+
+    A small Whisper model transcribes the whole recording first; this class
+    re-decodes only the segments it was unsure of with a larger model and
+    splices the new segments back in, so the larger model runs on a
+    fraction of the audio. A segment is low-confidence when its avg_logprob
+    is below `min_logprob`, unless its no_speech_prob marks it as noise the
+    larger model would not transcribe either. A re-decoded span replaces
+    the original only if the larger model is more confident in it.
+    """
+
+    def __init__(self, load_model: Callable[[], Any], min_logprob: Optional[float] = None,
+                 no_speech_threshold: Optional[float] = None):
+        """
+        Args:
+            load_model: Returns the larger Whisper model; only called if a segment needs it
+            min_logprob: Lowest confident avg_logprob. Defaults to
+                         settings.TRANSCRIPTION_CASCADE_MIN_LOGPROB.
+            no_speech_threshold: no_speech_prob above which a segment is left as is.
+                                 Defaults to settings.TRANSCRIPTION_CASCADE_NO_SPEECH_THRESHOLD.
+        """
+        self.load_model = load_model
+        self.min_logprob = (settings.TRANSCRIPTION_CASCADE_MIN_LOGPROB
+                            if min_logprob is None else min_logprob)
+        self.no_speech_threshold = (settings.TRANSCRIPTION_CASCADE_NO_SPEECH_THRESHOLD
+                                    if no_speech_threshold is None else no_speech_threshold)
+
+    def is_confident(self, segment: Dict[str, Any]) -> bool:
+        """Whether the small model's segment can be kept."""
+        if segment.get('avg_logprob') is None:
+            return True
+        if (segment.get('no_speech_prob') or 0) > self.no_speech_threshold:
+            return True
+        return segment['avg_logprob'] >= self.min_logprob
+
+    def refine(self, result: Dict[str, Any], audio: np.ndarray) -> Dict[str, Any]:
+        """
+        Re-decode the low-confidence segments of a transcript.
+
+        Args:
+            result: Whisper-style result of the small model, with per-segment
+                    avg_logprob and no_speech_prob
+            audio: Mono float32 samples at 16 kHz the result was transcribed from
+
+        Returns:
+            Whisper-style result with the re-decoded segments spliced in
+        """
+        segments = result.get('segments', [])
+        spans = self._spans(segments)
+        if not spans:
+            logger.info(f"Cascade: all {len(segments)} segments confident, larger model not needed")
+            return result
+
+        model = self.load_model()
+        refined = []
+        position = 0
+        replaced = 0
+        for first, last in spans:
+            refined.extend(segments[position:first])
+            original = segments[first:last + 1]
+            replacement = self._redecode(model, audio, original[0]['start'], original[-1]['end'],
+                                         refined, result.get('language'))
+            if _mean_logprob(replacement) > _mean_logprob(original):
+                refined.extend(replacement)
+                replaced += len(original)
+            else:
+                refined.extend(original)
+            position = last + 1
+        refined.extend(segments[position:])
+
+        redecoded = sum(segments[last]['end'] - segments[first]['start'] for first, last in spans)
+        logger.info(f"Cascade: re-decoded {redecoded:.0f}s in {len(spans)} spans, "
+                    f"replaced {replaced} of {len(segments)} segments")
+        return {
+            **result,
+            'text': ''.join(segment['text'] for segment in refined),
+            'segments': refined,
+        }
+
+    def _spans(self, segments: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """(first, last) indices of runs of low-confidence segments, each at most MAX_SPAN_SECONDS."""
+        spans = []
+        for index, segment in enumerate(segments):
+            if self.is_confident(segment):
+                continue
+            if spans and spans[-1][1] == index - 1 \
+                    and segment['end'] - segments[spans[-1][0]]['start'] <= MAX_SPAN_SECONDS:
+                spans[-1] = (spans[-1][0], index)
+            else:
+                spans.append((index, index))
+        return spans
+
+    def _redecode(self, model, audio: np.ndarray, start: float, end: float,
+                  preceding: List[Dict[str, Any]], language: Optional[str]) -> List[Dict[str, Any]]:
+        """Transcribe [start, end) with the larger model, in recording-relative segments."""
+        samples = np.array(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)], dtype=np.float32)
+        if not len(samples):
+            return []
+
+        words = ' '.join(segment['text'] for segment in preceding[-10:]).split()[-PROMPT_CONTEXT_WORDS:]
+        result = model.transcribe(
+            samples,
+            fp16=False,
+            language=language,
+            initial_prompt=' '.join(words) or None,
+            condition_on_previous_text=False
+        )
+        return [
+            {
+                'start': min(segment.get('start', 0) + start, end),
+                'end': min(segment.get('end', 0) + start, end),
+                'text': segment.get('text', ''),
+                'avg_logprob': segment.get('avg_logprob'),
+                'no_speech_prob': segment.get('no_speech_prob'),
+            }
+            for segment in result.get('segments', [])
+        ]
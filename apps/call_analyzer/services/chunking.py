@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from apps.call_analyzer.models import Transcription
+
+logger = logging.getLogger(__name__)
+
+# Chunked transcripts keyed by tokenizer, content hash and budget, so the
+# summary, extraction and performance prompts share a single tokenization
+_CHUNK_CACHE_SIZE = 32
+_chunk_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+_chunk_cache_lock = threading.Lock()
+
+
+class TranscriptChunker:
+    """
+    Packs whole Whisper segments into chunks that fit a token budget.
+
+    Consecutive chunks share up to `overlap_tokens` worth of trailing
+    segments so context spanning a chunk boundary is not lost.
+    """
+
+    def __init__(self, tokenizer, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None):
+        """
+        Initialize the chunker.
+
+        Args:
+            tokenizer: Tokenizer of the LLM the chunks are prompted to
+            max_tokens: Token budget per chunk. Defaults to settings.TRANSCRIPT_CHUNK_TOKENS.
+            overlap_tokens: Tokens of trailing segments repeated at the start of
+                            the next chunk. Defaults to settings.TRANSCRIPT_CHUNK_OVERLAP_TOKENS.
+        """
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens or settings.TRANSCRIPT_CHUNK_TOKENS
+        self.overlap_tokens = settings.TRANSCRIPT_CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    def chunk(self, transcription: Transcription) -> List[Dict[str, Any]]:
+        """
+        Split a transcription into token-bounded chunks.
+
+        Args:
+            transcription: The Transcription model instance
+
+        Returns:
+            List of {start, end, text, token_ids} chunks in transcript order
+        """
+        segments = self._get_segments(transcription)
+        content_hash = hashlib.sha1(
+            json.dumps([segment['text'] for segment in segments]).encode('utf-8')
+        ).hexdigest()
+        key = (self.tokenizer.name_or_path, content_hash, self.max_tokens, self.overlap_tokens)
+
+        with _chunk_cache_lock:
+            if key in _chunk_cache:
+                _chunk_cache.move_to_end(key)
+                return _chunk_cache[key]
+
+        chunks = self._pack(segments)
+        logger.info(f"Split transcription {transcription.id} into {len(chunks)} chunks "
+                    f"of up to {self.max_tokens} tokens")
+
+        with _chunk_cache_lock:
+            _chunk_cache[key] = chunks
+            while len(_chunk_cache) > _CHUNK_CACHE_SIZE:
+                _chunk_cache.popitem(last=False)
+
+        return chunks
+
+    def _get_segments(self, transcription: Transcription) -> List[Dict[str, Any]]:
+        """Use the Whisper segments, or the full text as one segment if there are none."""
+        segments = [segment for segment in transcription.segments if segment.get('text', '').strip()]
+        if segments:
+            return segments
+        return [{'start': 0, 'end': 0, 'text': transcription.text}]
+
+    def _pack(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Tokenize each segment once and greedily pack them into chunks."""
+        token_ids = self.tokenizer(
+            [segment['text'] for segment in segments],
+            add_special_tokens=False
+        )['input_ids']
+
+        # Segments longer than the budget are split into budget-sized pieces
+        pieces = []
+        for segment, ids in zip(segments, token_ids):
+            for offset in range(0, max(len(ids), 1), self.max_tokens):
+                piece_ids = ids[offset:offset + self.max_tokens]
+                text = segment['text'] if len(ids) <= self.max_tokens else self.tokenizer.decode(piece_ids)
+                pieces.append({
+                    'start': segment.get('start', 0),
+                    'end': segment.get('end', 0),
+                    'text': text,
+                    'token_ids': piece_ids,
+                })
+
+        chunks = []
+        current: List[Dict[str, Any]] = []
+        current_tokens = 0
+
+        for piece in pieces:
+            if current and current_tokens + len(piece['token_ids']) > self.max_tokens:
+                chunks.append(self._build_chunk(current))
+                current = self._overlap(current, self.max_tokens - len(piece['token_ids']))
+                current_tokens = sum(len(p['token_ids']) for p in current)
+            current.append(piece)
+            current_tokens += len(piece['token_ids'])
+
+        if current:
+            chunks.append(self._build_chunk(current))
+
+        return chunks
+
+    def _overlap(self, pieces: List[Dict[str, Any]], room: int) -> List[Dict[str, Any]]:
+        """Trailing pieces to repeat in the next chunk, within the overlap budget and remaining room."""
+        budget = min(self.overlap_tokens, room)
+        overlap = []
+        used = 0
+        for piece in reversed(pieces):
+            used += len(piece['token_ids'])
+            if used > budget:
+                break
+            overlap.insert(0, piece)
+        return overlap
+
+    def _build_chunk(self, pieces: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            'start': pieces[0]['start'],
+            'end': pieces[-1]['end'],
+            'text': ' '.join(piece['text'].strip() for piece in pieces),
+            'token_ids': [token_id for piece in pieces for token_id in piece['token_ids']],
+        }
@@ -0,0 +1,109 @@
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.call_analyzer.models import (
+    CallRecording, Transcription, SentimentAnalysis, CallSummary, SalesPerformance
+)
+
+logger = logging.getLogger(__name__)
+
+# Analysis rows copied from the original recording to a re-upload
+ANALYSIS_MODELS = (Transcription, SentimentAnalysis, CallSummary, SalesPerformance)
+
+
+class DeduplicationService:
+    """
+    Reuses the analysis of identical recordings.
+
+    A new upload whose content hash matches a recording already processed
+    in the same organization (or, without an organization, uploaded by the
+    same user) gets copies of that recording's transcription, sentiment,
+    summary and performance analysis instead of being processed again. The
+    same applies to a near duplicate found by FingerprintService once the
+    user confirms it.
+    """
+
+    def find_original(self, call_recording: CallRecording) -> Optional[CallRecording]:
+        """
+        Find an already processed recording with the same content.
+
+        Args:
+            call_recording: The newly uploaded CallRecording
+
+        Returns:
+            The earliest matching processed CallRecording, or None
+        """
+        if not settings.CALL_DEDUPLICATION_ENABLED or not call_recording.content_hash:
+            return None
+
+        candidates = self.reusable_recordings(call_recording).filter(content_hash=call_recording.content_hash)
+        return candidates.order_by('created_at').first()
+
+    def reusable_recordings(self, call_recording: CallRecording):
+        """
+        Processed recordings whose analysis a new upload may reuse: those of
+        its organization, or of its user when it has no organization.
+
+        Args:
+            call_recording: The newly uploaded CallRecording
+
+        Returns:
+            CallRecording queryset
+        """
+        candidates = CallRecording.objects.filter(
+            status='processed',
+            transcription__isnull=False
+        ).exclude(id=call_recording.id)
+        if call_recording.organization_id:
+            return candidates.filter(organization_id=call_recording.organization_id)
+        return candidates.filter(organization__isnull=True, user_id=call_recording.user_id)
+
+    def reuse_analysis(self, call_recording: CallRecording, original: Optional[CallRecording] = None) -> bool:
+        """
+        Copy the analysis of an identical processed recording, if there is one.
+
+        Args:
+            call_recording: The newly uploaded CallRecording
+            original: Recording to copy from, e.g. a near duplicate the user
+                      confirmed. Defaults to one with the same content hash.
+
+        Returns:
+            True if the analysis was reused and no processing is needed
+        """
+        if original is None:
+            original = self.find_original(call_recording)
+        elif not self.reusable_recordings(call_recording).filter(id=original.id).exists():
+            logger.warning(f"Call recording {original.id} cannot be reused for {call_recording.id}")
+            return False
+        if original is None:
+            return False
+
+        try:
+            with transaction.atomic():
+                for model in ANALYSIS_MODELS:
+                    row = model.objects.filter(call_recording=original).first()
+                    if row is None:
+                        continue
+                    row.pk = None
+                    row._state.adding = True
+                    row.call_recording = call_recording
+                    row.save()
+
+                call_recording.duplicate_of = original
+                call_recording.near_duplicates = []
+                call_recording.duration = original.duration
+                call_recording.trimmed_duration = original.trimmed_duration
+                call_recording.trimmed_seconds = original.trimmed_seconds
+                call_recording.routing = original.routing
+                call_recording.performance_deferred = original.performance_deferred
+                call_recording.status = 'processed'
+                call_recording.save()
+        except Exception as e:
+            logger.error(f"Error reusing analysis of {original.id} for {call_recording.id}: {str(e)}")
+            return False
+
+        logger.info(f"Call recording {call_recording.id} is identical to {original.id}; reused its analysis")
+        return True
@@ -0,0 +1,256 @@
+import logging
+import os
+import string
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from django.conf import settings
+from numpy.lib.stride_tricks import sliding_window_view
+
+from apps.call_analyzer.services.audio import SAMPLE_RATE, stream_audio_windows
+
+logger = logging.getLogger(__name__)
+
+# 25 ms frames every 10 ms, summarized on a 40-band mel scale
+FRAME_SECONDS = 0.025
+HOP_SECONDS = 0.010
+MEL_BANDS = 40
+# Frames per block of the spectrogram computed by one pool thread
+BLOCK_FRAMES = 6000
+
+
+def mel_filterbank(sample_rate: int, fft_size: int, bands: int = MEL_BANDS) -> np.ndarray:
+    """Triangular mel filters as a (bands, fft_size // 2 + 1) matrix."""
+    def to_mel(hz):
+        return 2595 * np.log10(1 + hz / 700)
+
+    def to_hz(mel):
+        return 700 * (10 ** (mel / 2595) - 1)
+
+    edges_hz = to_hz(np.linspace(to_mel(60), to_mel(0.95 * sample_rate / 2), bands + 2))
+    bins = np.fft.rfftfreq(fft_size, 1 / sample_rate)
+    lower, center, upper = edges_hz[:-2, None], edges_hz[1:-1, None], edges_hz[2:, None]
+    rising = (bins - lower) / (center - lower)
+    falling = (upper - bins) / (upper - center)
+    return np.clip(np.minimum(rising, falling), 0, None)
+
+
+class LogMelStream:
+    """
+    Builds the `log_mel` spectrogram of a recording from consecutive pieces of its audio.
+
+    Only the samples of the frame in progress are held between pieces, so
+    the spectrogram of a streamed recording is computed without its whole
+    audio in memory. The result equals `log_mel` of the concatenated pieces.
+    """
+
+    def __init__(self, diarization: 'DiarizationService', sample_rate: int = SAMPLE_RATE):
+        self.diarization = diarization
+        self.sample_rate = sample_rate
+        self.frame_length = int(FRAME_SECONDS * sample_rate)
+        self.hop = int(HOP_SECONDS * sample_rate)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.blocks = []
+
+    def feed(self, samples: np.ndarray) -> None:
+        """Add the next samples of the recording, computing every frame they complete."""
+        self.pending = np.concatenate([self.pending, np.asarray(samples, dtype=np.float32)])
+        if len(self.pending) < self.frame_length:
+            return
+        count = 1 + (len(self.pending) - self.frame_length) // self.hop
+        self.blocks.append(self.diarization.log_mel(
+            self.pending[:(count - 1) * self.hop + self.frame_length], self.sample_rate
+        ))
+        self.pending = self.pending[count * self.hop:]
+
+    def features(self) -> np.ndarray:
+        """The spectrogram of all samples fed so far."""
+        if not self.blocks:
+            return self.diarization.log_mel(self.pending, self.sample_rate)
+        return np.concatenate(self.blocks)
+
+
+class DiarizationService:
+    """
+    CPU speaker diarization from spectral embeddings.
+
+    Each transcript segment is embedded as the mean and standard deviation
+    of its log-mel spectrum, with the frame gain removed and each band
+    normalized across the recording. Embeddings are
+    clustered with spherical k-means; the number of speakers (2 to
+    settings.DIARIZATION_MAX_SPEAKERS) is the one with the best silhouette,
+    or a single speaker if even that silhouette is below
+    settings.DIARIZATION_MIN_SILHOUETTE.
+    The spectrogram is computed in blocks on a thread pool, where NumPy's
+    FFT runs without the GIL.
+    """
+
+    def __init__(self, max_speakers: Optional[int] = None, workers: Optional[int] = None,
+                 min_silhouette: Optional[float] = None):
+        """
+        Args:
+            max_speakers: Most speakers to consider. Defaults to settings.DIARIZATION_MAX_SPEAKERS.
+            workers: Threads computing the spectrogram. Defaults to
+                     settings.DIARIZATION_WORKERS, or the number of CPU cores if that is 0.
+            min_silhouette: Lowest silhouette accepted as separate speakers. Defaults to
+                            settings.DIARIZATION_MIN_SILHOUETTE.
+        """
+        self.max_speakers = max_speakers or settings.DIARIZATION_MAX_SPEAKERS
+        self.min_silhouette = (settings.DIARIZATION_MIN_SILHOUETTE
+                               if min_silhouette is None else min_silhouette)
+        self.workers = workers or settings.DIARIZATION_WORKERS or os.cpu_count() or 1
+
+    def diarize(self, audio: np.ndarray, segments: List[Dict[str, Any]],
+                sample_rate: int = SAMPLE_RATE) -> List[str]:
+        """
+        Assign a speaker to each segment.
+
+        Args:
+            audio: Mono float32 samples of the whole recording
+            segments: Transcript segments with start and end times in seconds
+            sample_rate: Sample rate of `audio`
+
+        Returns:
+            Speaker label per segment ('speaker_A', 'speaker_B', ... in order of first appearance)
+        """
+        return self.diarize_features(self.log_mel(audio, sample_rate), segments)
+
+    def diarize_features(self, features: np.ndarray, segments: List[Dict[str, Any]]) -> List[str]:
+        """
+        Assign a speaker to each segment from a precomputed `log_mel` spectrogram.
+
+        Args:
+            features: Log-mel spectrogram of the whole recording
+            segments: Transcript segments with start and end times in seconds
+
+        Returns:
+            Speaker label per segment
+        """
+        if len(segments) < 2:
+            return ['speaker_A'] * len(segments)
+
+        embeddings = self._embed(features, segments)
+        labels = self._cluster(embeddings)
+
+        # Name speakers in order of appearance
+        names = {}
+        for label in labels:
+            names.setdefault(label, f"speaker_{string.ascii_uppercase[len(names) % 26]}")
+        logger.info(f"Diarized {len(segments)} segments into {len(names)} speakers")
+        return [names[label] for label in labels]
+
+    def feature_params(self, sample_rate: int = SAMPLE_RATE) -> Dict[str, Any]:
+        """Parameters of `log_mel`, for versioning stored spectrograms."""
+        return {'sample_rate': sample_rate, 'frame': FRAME_SECONDS, 'hop': HOP_SECONDS, 'bands': MEL_BANDS}
+
+    def log_mel(self, audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+        """Log-mel spectrogram, (frames, MEL_BANDS), computed block by block on the pool."""
+        frame_length = int(FRAME_SECONDS * sample_rate)
+        hop = int(HOP_SECONDS * sample_rate)
+        if len(audio) < frame_length:
+            audio = np.pad(audio, (0, frame_length - len(audio)))
+        frames = sliding_window_view(audio, frame_length)[::hop]
+
+        fft_size = 1 << (frame_length - 1).bit_length()
+        window = np.hamming(frame_length).astype(np.float32)
+        filters = mel_filterbank(sample_rate, fft_size).astype(np.float32)
+
+        def block(start: int) -> np.ndarray:
+            power = np.abs(np.fft.rfft(frames[start:start + BLOCK_FRAMES] * window, n=fft_size)) ** 2
+            return np.log(power @ filters.T + 1e-8)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return np.concatenate(list(pool.map(block, range(0, len(frames), BLOCK_FRAMES))))
+
+    def stream_log_mel(self, source: Union[str, np.ndarray]) -> np.ndarray:
+        """
+        `log_mel` of a recording decoded window by window.
+
+        Args:
+            source: Path to the audio file, or its (e.g. memory-mapped) 16 kHz samples
+
+        Returns:
+            Log-mel spectrogram of the whole recording
+        """
+        stream = LogMelStream(self)
+        for _, samples, _ in stream_audio_windows(source, settings.TRANSCRIPTION_WINDOW_SECONDS, 0):
+            stream.feed(samples)
+        return stream.features()
+
+    def _embed(self, features: np.ndarray, segments: List[Dict[str, Any]]) -> np.ndarray:
+        """Per-segment mean and standard deviation of the normalized log-mel spectrum."""
+        # Spectral shape only: remove each frame's gain, then normalize each band
+        features = features - features.mean(axis=1, keepdims=True)
+        features = (features - features.mean(axis=0)) / (features.std(axis=0) + 1e-8)
+
+        # Segment frame ranges, pooled with cumulative sums
+        starts = np.array([segment['start'] for segment in segments]) / HOP_SECONDS
+        ends = np.array([segment['end'] for segment in segments]) / HOP_SECONDS
+        starts = np.clip(starts.astype(int), 0, len(features) - 1)
+        ends = np.clip(np.maximum(ends.astype(int), starts + 1), 1, len(features))
+
+        padded = np.vstack([np.zeros((1, features.shape[1])), features])
+        sums = np.cumsum(padded, axis=0)
+        squares = np.cumsum(padded ** 2, axis=0)
+        counts = (ends - starts)[:, None]
+        means = (sums[ends] - sums[starts]) / counts
+        stds = np.sqrt(np.maximum((squares[ends] - squares[starts]) / counts - means ** 2, 0))
+
+        embeddings = np.hstack([means, stds])
+        embeddings -= embeddings.mean(axis=0)
+        return embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+
+    def _cluster(self, embeddings: np.ndarray) -> np.ndarray:
+        """Cluster embeddings into the speaker count with the best silhouette, or one speaker."""
+        single = np.zeros(len(embeddings), dtype=int)
+        similarity = embeddings @ embeddings.T
+        best_labels, best_score = single, -np.inf
+        for speakers in range(2, min(self.max_speakers, len(embeddings) - 1) + 1):
+            labels = self._kmeans(embeddings, speakers)
+            score = self._silhouette(1 - similarity, labels)
+            if score > best_score:
+                best_labels, best_score = labels, score
+        # Clusters this poorly separated are one voice split by what was said
+        if best_score < self.min_silhouette:
+            return single
+        return best_labels
+
+    def _kmeans(self, embeddings: np.ndarray, clusters: int, iterations: int = 50) -> np.ndarray:
+        """Spherical k-means with k-means++ seeding."""
+        rng = np.random.default_rng(0)
+        centers = embeddings[[rng.integers(len(embeddings))]]
+        while len(centers) < clusters:
+            distance = np.clip(1 - embeddings @ centers.T, 0, None).min(axis=1)
+            probabilities = distance / distance.sum() if distance.sum() > 0 else None
+            centers = np.vstack([centers, embeddings[rng.choice(len(embeddings), p=probabilities)]])
+
+        labels = np.argmax(embeddings @ centers.T, axis=1)
+        for _ in range(iterations):
+            for cluster in range(clusters):
+                members = embeddings[labels == cluster]
+                if len(members):
+                    center = members.sum(axis=0)
+                    centers[cluster] = center / (np.linalg.norm(center) + 1e-8)
+            updated = np.argmax(embeddings @ centers.T, axis=1)
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+        return labels
+
+    def _silhouette(self, distance: np.ndarray, labels: np.ndarray) -> float:
+        """Mean silhouette coefficient for a precomputed distance matrix."""
+        clusters = np.unique(labels)
+        if len(clusters) < 2:
+            return -1.0
+        # Mean distance from every point to every cluster
+        member = labels[None, :] == clusters[:, None]
+        mean_distance = (distance @ member.T) / member.sum(axis=1)
+        own = np.searchsorted(clusters, labels)
+        sizes = member.sum(axis=1)[own]
+        # Exclude the point itself from its own cluster's mean
+        intra = mean_distance[np.arange(len(labels)), own] * sizes / np.maximum(sizes - 1, 1)
+        mean_distance[np.arange(len(labels)), own] = np.inf
+        nearest = mean_distance.min(axis=1)
+        silhouettes = np.where(sizes > 1, (nearest - intra) / np.maximum(np.maximum(intra, nearest), 1e-8), 0)
+        return float(silhouettes.mean())
@@ -0,0 +1,218 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import numpy as np
+from django.conf import settings
+
+from apps.call_analyzer.models import CallRecording
+from apps.call_analyzer.services.audio import SAMPLE_RATE, decode_audio, stream_audio_windows
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every stored feature after a change to how features are computed
+FEATURE_STORE_VERSION = 1
+FEATURES_SUFFIX = '.features'
+# Seconds of audio read from ffmpeg per write when decoding into the store
+DECODE_BLOCK_SECONDS = 30
+
+
+class FeatureStore:
+    """
+    Per-recording store of decoded audio and derived features.
+
+    Arrays are saved as .npy files in a directory next to the recording's
+    media file and loaded memory-mapped, so every audio stage (fingerprint,
+    VAD, Whisper, diarization) shares one decode and reprocessing a call
+    does not decode it again. File names carry a hash of the feature's
+    parameters and FEATURE_STORE_VERSION; files of older versions are
+    replaced on write, and `evict_features` applies the retention policy.
+    """
+
+    def __init__(self, call_recording: CallRecording):
+        """
+        Args:
+            call_recording: The CallRecording whose features are stored
+        """
+        self.call_recording = call_recording
+        self.directory = Path(call_recording.file.path + FEATURES_SUFFIX)
+
+    def audio(self, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+        """
+        Mono float32 samples of the recording, decoded on first use.
+
+        The first decode streams ffmpeg's output into the store block by
+        block, so the whole recording is never held in memory.
+
+        Args:
+            sample_rate: Sample rate of the samples
+
+        Returns:
+            Read-only memory-mapped array (an in-memory array if the store is disabled)
+        """
+        params = {'sample_rate': sample_rate}
+        stored = self.load('pcm', params)
+        if stored is not None:
+            return stored
+
+        file_path = self.call_recording.file.path
+        if settings.FEATURE_STORE_ENABLED:
+            windows = stream_audio_windows(file_path, DECODE_BLOCK_SECONDS, 0, sample_rate)
+            try:
+                self._save_blocks('pcm', params, (samples for _, samples, _ in windows))
+            except OSError as e:
+                logger.warning(f"Could not store pcm features of {self.call_recording.title}: {str(e)}")
+            else:
+                stored = self.load('pcm', params)
+                if stored is not None:
+                    return stored
+        return decode_audio(file_path, sample_rate=sample_rate)
+
+    def cached_audio(self, sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
+        """The stored samples if the recording was already decoded, else None."""
+        return self.load('pcm', {'sample_rate': sample_rate})
+
+    def features(self, name: str, params: Dict[str, Any], compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Load a stored feature array, computing and storing it if missing.
+
+        Args:
+            name: Feature name, e.g. 'pcm' or 'logmel'
+            params: Parameters the feature depends on
+            compute: Computes the array when it is not stored
+
+        Returns:
+            Read-only memory-mapped array (the computed array if storing failed)
+        """
+        stored = self.load(name, params)
+        if stored is not None:
+            return stored
+
+        array = compute()
+        if not settings.FEATURE_STORE_ENABLED:
+            return array
+        try:
+            self._save(name, params, array)
+        except OSError as e:
+            logger.warning(f"Could not store {name} features of {self.call_recording.title}: {str(e)}")
+            return array
+        return self.load(name, params)
+
+    def load(self, name: str, params: Dict[str, Any]) -> Optional[np.ndarray]:
+        """The stored array for these parameters, or None."""
+        if not settings.FEATURE_STORE_ENABLED:
+            return None
+        path = self._path(name, params)
+        try:
+            array = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        # Retention is by last use
+        os.utime(path)
+        return array
+
+    def _path(self, name: str, params: Dict[str, Any]) -> Path:
+        key = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        return self.directory / f"{name}-{key}.v{FEATURE_STORE_VERSION}.npy"
+
+    def _save(self, name: str, params: Dict[str, Any], array: np.ndarray) -> None:
+        """Write atomically and drop other versions of the same feature."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(name, params)
+        temporary = path.with_name(f".{path.stem}-{os.getpid()}.tmp.npy")
+        np.save(temporary, np.ascontiguousarray(array))
+        self._replace(temporary, path)
+
+    def _save_blocks(self, name: str, params: Dict[str, Any], blocks: Iterable[np.ndarray]) -> None:
+        """
+        Write a float32 vector arriving in blocks, without holding it in memory.
+
+        The blocks are appended after a placeholder .npy header of the same
+        padded size as the final one, which is written once the length is known.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(name, params)
+        temporary = path.with_name(f".{path.stem}-{os.getpid()}.tmp.npy")
+        try:
+            with open(temporary, 'wb') as file:
+                file.write(_vector_header(0))
+                length = 0
+                for block in blocks:
+                    file.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+                    length += len(block)
+                header = _vector_header(length)
+                if len(header) != len(_vector_header(0)):
+                    raise OSError(f"Cannot store {length} samples in a fixed-size header")
+                file.seek(0)
+                file.write(header)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+        self._replace(temporary, path)
+
+    def _replace(self, temporary: Path, path: Path) -> None:
+        """Move a written file into place and drop other versions of the same feature."""
+        os.replace(temporary, path)
+
+        prefix = path.name.split('.v')[0]
+        for stale in self.directory.glob(f"{prefix}.v*.npy"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+
+def _vector_header(length: int) -> bytes:
+    """.npy header of a float32 vector of `length` samples."""
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        buffer, {'descr': np.lib.format.dtype_to_descr(np.dtype('<f4')), 'fortran_order': False, 'shape': (length,)}
+    )
+    return buffer.getvalue()
+
+
+def evict_features(retention_days: Optional[int] = None, max_bytes: Optional[int] = None) -> int:
+    """
+    Apply the feature store's retention policy.
+
+    Features unused for `retention_days` are deleted, then the least recently
+    used ones until the store is at most `max_bytes`.
+
+    Args:
+        retention_days: Defaults to settings.FEATURE_STORE_RETENTION_DAYS
+        max_bytes: Defaults to settings.FEATURE_STORE_MAX_BYTES
+
+    Returns:
+        Number of files deleted
+    """
+    retention_days = settings.FEATURE_STORE_RETENTION_DAYS if retention_days is None else retention_days
+    max_bytes = settings.FEATURE_STORE_MAX_BYTES if max_bytes is None else max_bytes
+    cutoff = time.time() - retention_days * 24 * 60 * 60
+
+    files = []
+    for path in Path(settings.MEDIA_ROOT).glob(f"calls/*/*/*{FEATURES_SUFFIX}/*.npy"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    for last_used, size, path in files:
+        if last_used >= cutoff and total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        deleted += 1
+        # Drop the directory with its last feature
+        if not any(path.parent.iterdir()):
+            path.parent.rmdir()
+
+    if deleted:
+        logger.info(f"Evicted {deleted} stored feature files")
+    return deleted
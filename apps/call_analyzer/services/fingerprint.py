@@ -0,0 +1,239 @@
+import logging
+from collections import Counter, defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from numpy.lib.stride_tricks import sliding_window_view
+
+from apps.call_analyzer.models import CallRecording, FingerprintHash
+from apps.call_analyzer.services.audio import SAMPLE_RATE, downsample_windows
+from apps.call_analyzer.services.deduplication import DeduplicationService
+from apps.call_analyzer.services.feature_store import FeatureStore
+
+logger = logging.getLogger(__name__)
+
+# Telephone-band audio is enough to recognize a recording
+FINGERPRINT_SAMPLE_RATE = 8000
+FFT_SIZE = 512
+HOP_SIZE = 256
+# Log-spaced frequency bands (Hz) in which one spectral peak per frame is considered
+BAND_EDGES_HZ = [300, 500, 800, 1200, 1800, 2600, 3800]
+# Peaks must be the loudest of their band within this many frames either side
+PEAK_NEIGHBORHOOD_FRAMES = 15
+# Peaks must exceed their band's mean log magnitude in the frame by this much
+PEAK_PROMINENCE = 1.0
+# Each peak is paired with this many later peaks up to MAX_PAIR_FRAMES ahead
+FAN_OUT = 3
+MAX_PAIR_FRAMES = 63
+# Query hashes per lookup statement
+QUERY_BATCH_SIZE = 500
+# Frames per FFT block, bounding the memory of the spectrum
+BLOCK_FRAMES = 8192
+# Seconds of 16 kHz audio downsampled at a time when fingerprinting stored samples
+WINDOW_SECONDS = 60
+
+
+def compute_fingerprint(audio: np.ndarray) -> np.ndarray:
+    """
+    Compute spectral peak-pair hashes of a recording.
+
+    Each hash packs the frequency bins of two nearby spectral peaks and the
+    number of frames between them (9 + 9 + 6 bits). Hashes survive
+    re-encoding at another bitrate, and trimming only removes hashes.
+
+    Args:
+        audio: Mono float32 samples at FINGERPRINT_SAMPLE_RATE
+
+    Returns:
+        (N, 2) uint32 array of (hash, anchor frame) rows, ordered by frame
+    """
+    return compute_fingerprint_blocks([audio])
+
+
+def compute_fingerprint_blocks(blocks: Iterable[np.ndarray]) -> np.ndarray:
+    """
+    `compute_fingerprint` of a recording given as consecutive blocks of samples.
+
+    Only the strongest bin of each band is kept per frame, so the spectrum
+    of one block at a time is held in memory.
+
+    Args:
+        blocks: Consecutive mono float32 blocks at FINGERPRINT_SAMPLE_RATE
+
+    Returns:
+        (N, 2) uint32 array of (hash, anchor frame) rows, ordered by frame
+    """
+    strongest, magnitude, prominence = [], [], []
+    pending = np.zeros(0, dtype=np.float32)
+    for block in blocks:
+        pending = np.concatenate([pending, np.asarray(block, dtype=np.float32)])
+        if len(pending) < FFT_SIZE:
+            continue
+        count = 1 + (len(pending) - FFT_SIZE) // HOP_SIZE
+        frames = sliding_window_view(pending, FFT_SIZE)[::HOP_SIZE][:count]
+        for start in range(0, count, BLOCK_FRAMES):
+            block_peaks = _band_peaks(frames[start:start + BLOCK_FRAMES])
+            strongest.append(block_peaks[0])
+            magnitude.append(block_peaks[1])
+            prominence.append(block_peaks[2])
+        pending = pending[count * HOP_SIZE:]
+
+    if sum(len(rows) for rows in strongest) < 2:
+        return np.zeros((0, 2), dtype=np.uint32)
+    strongest, magnitude, prominence = (np.concatenate(rows) for rows in (strongest, magnitude, prominence))
+
+    peaks = []
+    for band in range(len(BAND_EDGES_HZ) - 1):
+        padded = np.pad(magnitude[:, band], PEAK_NEIGHBORHOOD_FRAMES, constant_values=-np.inf)
+        local_max = sliding_window_view(padded, 2 * PEAK_NEIGHBORHOOD_FRAMES + 1).max(axis=1)
+        # Skip silence and broadband noise: peaks must stand out from the band's
+        # typical level and from the rest of the band in their frame
+        is_peak = ((magnitude[:, band] == local_max) & (magnitude[:, band] > np.median(magnitude[:, band]))
+                   & (prominence[:, band] > PEAK_PROMINENCE))
+        for frame in np.flatnonzero(is_peak):
+            peaks.append((frame, strongest[frame, band]))
+
+    peaks.sort()
+    hashes = []
+    for index, (frame, frequency) in enumerate(peaks):
+        paired = 0
+        for target_frame, target_frequency in peaks[index + 1:]:
+            delta = target_frame - frame
+            if delta > MAX_PAIR_FRAMES:
+                break
+            if delta == 0:
+                continue
+            hashes.append(((frequency << 15) | (target_frequency << 6) | delta, frame))
+            paired += 1
+            if paired == FAN_OUT:
+                break
+
+    return np.array(hashes, dtype=np.uint32).reshape(-1, 2)
+
+
+def _band_peaks(frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Strongest bin of each band per frame, with its log magnitude and its
+    prominence over the band's mean; (frames, bands) arrays.
+    """
+    spectrum = np.log1p(np.abs(np.fft.rfft(frames * np.hanning(FFT_SIZE), axis=1)))
+    bin_hz = FINGERPRINT_SAMPLE_RATE / FFT_SIZE
+    strongest, magnitude, prominence = [], [], []
+    for low_hz, high_hz in zip(BAND_EDGES_HZ, BAND_EDGES_HZ[1:]):
+        low, high = int(low_hz / bin_hz), int(high_hz / bin_hz)
+        band = spectrum[:, low:high]
+        strongest.append(band.argmax(axis=1) + low)
+        magnitude.append(band.max(axis=1))
+        prominence.append(magnitude[-1] - band.mean(axis=1))
+    return np.stack(strongest, axis=1), np.stack(magnitude, axis=1), np.stack(prominence, axis=1)
+
+
+class FingerprintService:
+    """
+    Acoustic fingerprinting of call recordings for near-duplicate detection.
+
+    The packed fingerprint is stored on each CallRecording and its hashes in
+    the FingerprintHash inverted index. A lookup lets matching hashes vote
+    for (recording, time offset) pairs, so re-encoded or trimmed copies of a
+    call are found even though their bytes differ.
+    """
+
+    def fingerprint(self, call_recording: CallRecording) -> Optional[np.ndarray]:
+        """
+        Fingerprint a recording and add it to the index.
+
+        Args:
+            call_recording: The CallRecording model instance
+
+        Returns:
+            The (hash, frame) array, or None on error
+        """
+        try:
+            # Decoded at Whisper's rate into the feature store, so transcription reuses this
+            # decode, then downsampled and fingerprinted a window of the memory map at a time
+            audio = FeatureStore(call_recording).audio()
+            fingerprint = compute_fingerprint_blocks(downsample_windows(
+                audio, SAMPLE_RATE // FINGERPRINT_SAMPLE_RATE, WINDOW_SECONDS * SAMPLE_RATE
+            ))
+
+            with transaction.atomic():
+                call_recording.fingerprint = fingerprint.tobytes()
+                call_recording.save(update_fields=['fingerprint'])
+                FingerprintHash.objects.filter(call_recording=call_recording).delete()
+                FingerprintHash.objects.bulk_create(
+                    [
+                        FingerprintHash(
+                            hash=int(hash_value),
+                            offset=int(frame),
+                            call_recording=call_recording,
+                            organization_id=call_recording.organization_id
+                        )
+                        for hash_value, frame in fingerprint
+                    ],
+                    batch_size=1000
+                )
+
+            logger.info(f"Fingerprinted {call_recording.title}: {len(fingerprint)} hashes")
+            return fingerprint
+
+        except Exception as e:
+            logger.error(f"Fingerprinting error for {call_recording.title}: {str(e)}")
+            return None
+
+    def find_near_duplicates(self, call_recording: CallRecording,
+                             limit: int = 3) -> List[Tuple[CallRecording, float]]:
+        """
+        Find processed recordings in the same organization that sound like this one.
+
+        Args:
+            call_recording: A fingerprinted CallRecording
+            limit: Maximum number of matches to return
+
+        Returns:
+            (recording, score) pairs, best first; score is the share of this
+            recording's sampled hashes that align with the match
+        """
+        if not call_recording.fingerprint:
+            return []
+
+        fingerprint = np.frombuffer(bytes(call_recording.fingerprint), dtype=np.uint32).reshape(-1, 2)
+        # Sample hashes evenly across the recording to bound the lookup
+        if len(fingerprint) > settings.FINGERPRINT_QUERY_HASHES:
+            positions = np.linspace(0, len(fingerprint) - 1, settings.FINGERPRINT_QUERY_HASHES).astype(int)
+            fingerprint = fingerprint[positions]
+
+        query_offsets = defaultdict(list)
+        for hash_value, frame in fingerprint:
+            query_offsets[int(hash_value)].append(int(frame))
+
+        candidates = FingerprintHash.objects.filter(
+            organization_id=call_recording.organization_id,
+            call_recording__in=DeduplicationService().reusable_recordings(call_recording)
+        )
+
+        # Votes per recording for the time shift between it and this recording
+        votes = defaultdict(Counter)
+        query_hashes = list(query_offsets)
+        for start in range(0, len(query_hashes), QUERY_BATCH_SIZE):
+            rows = candidates.filter(hash__in=query_hashes[start:start + QUERY_BATCH_SIZE]) \
+                .values_list('call_recording_id', 'hash', 'offset')
+            for recording_id, hash_value, offset in rows:
+                for query_frame in query_offsets[hash_value]:
+                    votes[recording_id][offset - query_frame] += 1
+
+        scores = []
+        for recording_id, shifts in votes.items():
+            # Allow one frame of jitter from re-encoding
+            aligned = max(shifts[shift - 1] + shifts[shift] + shifts[shift + 1] for shift in list(shifts))
+            if aligned >= settings.FINGERPRINT_MIN_MATCHES:
+                scores.append((recording_id, aligned / len(fingerprint)))
+
+        scores = [(recording_id, score) for recording_id, score in scores
+                  if score >= settings.FINGERPRINT_MATCH_THRESHOLD]
+        scores.sort(key=lambda item: item[1], reverse=True)
+        scores = scores[:limit]
+
+        recordings = CallRecording.objects.in_bulk([recording_id for recording_id, _ in scores])
+        return [(recordings[recording_id], score) for recording_id, score in scores if recording_id in recordings]
@@ -0,0 +1,207 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from apps.call_analyzer.services.audio import SAMPLE_RATE
+from apps.call_analyzer.services.vad import EnergyVAD
+
+logger = logging.getLogger(__name__)
+
+# One pool per (Whisper model, worker count), kept for the life of the process
+# so each pool process loads its Whisper model only once
+_pools: Dict[Tuple[str, int], ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+# Whisper model of the current pool process
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    """Load the Whisper model once in a pool process."""
+    global _worker_model
+    import torch
+    import whisper
+
+    torch.set_num_threads(threads)
+    _worker_model = whisper.load_model(model_name)
+
+
+def _transcribe_chunk(audio: np.ndarray, offset: float, model=None) -> Dict[str, Any]:
+    """Transcribe one chunk with timestamps shifted by its offset; in a pool process unless a model is given."""
+    result = (model or _worker_model).transcribe(audio, fp16=False)
+    segments = [
+        {
+            'start': segment.get('start', 0) + offset,
+            'end': segment.get('end', 0) + offset,
+            'text': segment.get('text', ''),
+            'avg_logprob': segment.get('avg_logprob'),
+            'no_speech_prob': segment.get('no_speech_prob'),
+        }
+        for segment in result.get('segments', [])
+    ]
+    return {'text': result.get('text', ''), 'segments': segments, 'language': result.get('language')}
+
+
+def pool_unavailable_reason() -> Optional[str]:
+    """
+    Why this process cannot start a Whisper pool, or None if it can.
+
+    Daemonic processes, such as the children of Celery's default prefork
+    pool, may not have child processes of their own; run the worker with
+    --pool=solo or --pool=threads to transcribe in parallel.
+    """
+    if multiprocessing.current_process().daemon:
+        return ("daemonic processes cannot start the Whisper process pool; "
+                "run the Celery worker with --pool=solo or --pool=threads")
+    return None
+
+
+def _get_pool(model_name: str, workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get((model_name, workers))
+        if pool is None:
+            threads = max((os.cpu_count() or 1) // workers, 1)
+            logger.info(f"Starting {workers} Whisper {model_name} processes with {threads} threads each")
+            # Spawned, not forked: forking a process that has started torch threads can deadlock
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model_name, threads)
+            )
+            _pools[(model_name, workers)] = pool
+        return pool
+
+
+def _discard_pool(model_name: str, workers: int) -> None:
+    with _pools_lock:
+        pool = _pools.pop((model_name, workers), None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_pools() -> None:
+    """Stop all Whisper pool processes."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ParallelTranscriber:
+    """
+    Transcribes a recording as VAD-delimited chunks in a pool of processes,
+    each holding its own Whisper model, and stitches the chunk transcripts
+    back together with recording-relative timestamps.
+    """
+
+    def __init__(self, model_name: str, workers: Optional[int] = None):
+        """
+        Args:
+            model_name: Whisper model loaded by each pool process
+            workers: Pool processes. Defaults to settings.TRANSCRIPTION_WORKERS,
+                     or the number of CPU cores if that is 0.
+        """
+        self.model_name = model_name
+        self.workers = workers or settings.TRANSCRIPTION_WORKERS or os.cpu_count() or 1
+        self.vad = EnergyVAD()
+
+    def transcribe(self, audio: np.ndarray,
+                   on_segments: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+        """
+        Transcribe a recording.
+
+        Args:
+            audio: Mono float32 samples at 16 kHz
+            on_segments: Called with the segments of each chunk, in order, as soon as
+                         it and every chunk before it are transcribed
+
+        Returns:
+            Whisper-style result with text, segments and language
+        """
+        reason = pool_unavailable_reason()
+        if reason is not None:
+            raise RuntimeError(reason)
+
+        chunks = self.vad.split(audio)
+        logger.info(f"Transcribing {len(chunks)} chunks of {len(audio) / SAMPLE_RATE:.0f}s of audio "
+                    f"on {self.workers} processes")
+        return self._transcribe_chunks(audio, chunks, on_segments)
+
+    def _transcribe_chunks(self, audio: np.ndarray, chunks: List[Tuple[int, int]],
+                           on_segments: Optional[Callable[[List[Dict[str, Any]]], None]]) -> Dict[str, Any]:
+        """Transcribe the chunks in order, reporting each one's segments, and stitch them."""
+        results = []
+        for result in self._chunk_results(audio, chunks):
+            results.append(result)
+            if on_segments is not None:
+                on_segments(result['segments'])
+
+        return self._stitch(results)
+
+    def _chunk_results(self, audio: np.ndarray, chunks: List[Tuple[int, int]]) -> Iterator[Dict[str, Any]]:
+        """Transcribe the chunks on the pool, yielding their results in order."""
+        pool = _get_pool(self.model_name, self.workers)
+        try:
+            futures = [
+                pool.submit(_transcribe_chunk, audio[start:end], start / SAMPLE_RATE)
+                for start, end in chunks
+            ]
+            for future in futures:
+                yield future.result()
+        except BrokenProcessPool:
+            _discard_pool(self.model_name, self.workers)
+            raise
+
+    def _stitch(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Join chunk transcripts in order; their timestamps are already recording-relative."""
+        segments = []
+        for result in results:
+            for segment in result['segments']:
+                # A segment may overhang the chunk's trailing silence; never overlap the next one
+                if segments and segment['start'] < segments[-1]['end']:
+                    segments[-1]['end'] = segment['start']
+                segments.append(segment)
+
+        languages = [result['language'] for result in results if result.get('language')]
+        return {
+            'text': ''.join(result['text'] for result in results),
+            'segments': segments,
+            'language': max(set(languages), key=languages.count) if languages else None,
+        }
+
+
+class SequentialTranscriber(ParallelTranscriber):
+    """
+    Transcribes the same VAD-delimited chunks one after another with an
+    in-process Whisper model, so progress can be reported chunk by chunk
+    without a process pool.
+    """
+
+    def __init__(self, model):
+        """
+        Args:
+            model: Loaded Whisper model
+        """
+        super().__init__(model_name=None, workers=1)
+        self.model = model
+
+    def transcribe(self, audio: np.ndarray,
+                   on_segments: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+        chunks = self.vad.split(audio)
+        logger.info(f"Transcribing {len(chunks)} chunks of {len(audio) / SAMPLE_RATE:.0f}s of audio in-process")
+        return self._transcribe_chunks(audio, chunks, on_segments)
+
+    def _chunk_results(self, audio: np.ndarray, chunks: List[Tuple[int, int]]) -> Iterator[Dict[str, Any]]:
+        for start, end in chunks:
+            yield _transcribe_chunk(np.array(audio[start:end]), start / SAMPLE_RATE, self.model)
@@ -0,0 +1,127 @@
+import logging
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.utils import timezone
+from pydub.utils import mediainfo
+
+from apps.call_analyzer.models import CallRecording
+from apps.core.services.degradation import DEFERRABLE_PERFORMANCE, DegradationController
+from apps.core.services.queues import get_queue_depth
+
+logger = logging.getLogger(__name__)
+
+# Whisper model sizes from fastest to most accurate
+WHISPER_MODEL_SIZES = ['tiny', 'base', 'small', 'medium', 'large']
+
+# Summary paths a call can be routed to
+SUMMARY_TEMPLATE = 'template'
+SUMMARY_SINGLE_PASS = 'single_pass'
+SUMMARY_FULL = 'full'
+
+
+class RoutingPolicy:
+    """
+    Chooses the Whisper model and summary path for each call from its
+    duration and the current task backlog.
+
+    Calls use settings.WHISPER_MODEL, or the duration tier from
+    settings.ROUTING_WHISPER_TIERS if any are configured; while the backlog
+    is above settings.ROUTING_BACKLOG_THRESHOLD every call steps down one
+    model size and uses single-pass summarization. Recordings shorter than
+    settings.ROUTING_SHORT_CALL_SECONDS skip the LLM entirely. In degraded
+    mode (see DegradationController) calls use settings.DEGRADATION_WHISPER_MODEL
+    and the performance analysis is deferred.
+    """
+
+    def route(self, call_recording: CallRecording) -> Dict[str, Any]:
+        """
+        Decide how to process a call recording.
+
+        Args:
+            call_recording: The CallRecording model instance
+
+        Returns:
+            Routing decision with duration_seconds, backlog, whisper_model, summary,
+            degraded and the list of deferred stages
+        """
+        if not settings.ROUTING_ENABLED:
+            decision = {
+                'duration_seconds': None,
+                'backlog': None,
+                'whisper_model': settings.WHISPER_MODEL,
+                'summary': self.summary_path(None, None),
+                'decided_at': timezone.now().isoformat(),
+            }
+        else:
+            duration = self._duration_seconds(call_recording)
+            backlog = get_queue_depth(settings.ROUTING_QUEUE_NAME)
+            decision = {
+                'duration_seconds': duration,
+                'backlog': backlog,
+                'whisper_model': self._whisper_model(duration, self._congested(backlog)),
+                'summary': self.summary_path(duration, backlog),
+                'decided_at': timezone.now().isoformat(),
+            }
+
+        self._apply_degradation(decision)
+        logger.info(f"Routing call recording {call_recording.id}: {decision}")
+        return decision
+
+    def summary_path(self, duration: Optional[float], backlog: Optional[int]) -> str:
+        """
+        Choose the summary path for a call of the given duration.
+
+        Args:
+            duration: Call duration in seconds, if known
+            backlog: Tasks waiting in the queue, if known
+
+        Returns:
+            SUMMARY_TEMPLATE, SUMMARY_SINGLE_PASS or SUMMARY_FULL
+        """
+        if not settings.ROUTING_ENABLED:
+            return SUMMARY_SINGLE_PASS if settings.SUMMARY_SINGLE_PASS else SUMMARY_FULL
+        if duration is not None and duration < settings.ROUTING_SHORT_CALL_SECONDS:
+            return SUMMARY_TEMPLATE
+        if self._congested(backlog) or settings.SUMMARY_SINGLE_PASS:
+            return SUMMARY_SINGLE_PASS
+        return SUMMARY_FULL
+
+    def _apply_degradation(self, decision: Dict[str, Any]) -> None:
+        """Downgrade Whisper and defer the performance analysis while the backlog is high."""
+        controller = DegradationController()
+        degraded = controller.is_degraded(controller.queue_depth())
+        decision['degraded'] = degraded
+        decision['deferred'] = []
+        if not degraded:
+            return
+
+        decision['whisper_model'] = settings.DEGRADATION_WHISPER_MODEL
+        if decision['summary'] != SUMMARY_TEMPLATE:
+            decision['deferred'].append(DEFERRABLE_PERFORMANCE)
+
+    def _congested(self, backlog: Optional[int]) -> bool:
+        return backlog is not None and backlog >= settings.ROUTING_BACKLOG_THRESHOLD
+
+    def _whisper_model(self, duration: Optional[float], congested: bool) -> str:
+        """WHISPER_MODEL or the configured tier for the duration, one size smaller under backlog."""
+        model = settings.WHISPER_MODEL
+        if duration is not None:
+            for max_seconds, tier_model in settings.ROUTING_WHISPER_TIERS:
+                if not max_seconds or duration <= max_seconds:
+                    model = tier_model
+                    break
+
+        if congested and model in WHISPER_MODEL_SIZES:
+            model = WHISPER_MODEL_SIZES[max(WHISPER_MODEL_SIZES.index(model) - 1, 0)]
+        return model
+
+    def _duration_seconds(self, call_recording: CallRecording) -> Optional[float]:
+        """Duration of the recording, probed from the file if not stored yet."""
+        if call_recording.duration:
+            return call_recording.duration.total_seconds()
+        try:
+            return float(mediainfo(call_recording.file.path)['duration'])
+        except Exception as e:
+            logger.warning(f"Could not determine duration of {call_recording.title}: {str(e)}")
+            return None
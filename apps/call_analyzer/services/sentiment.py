@@ -1,10 +1,13 @@
 import logging
+import queue
+import threading
 from typing import Dict, List, Tuple, Optional
 import nltk
 from textblob import TextBlob
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 
 from apps.call_analyzer.models import CallRecording, Transcription, SentimentAnalysis
+from apps.core.services.model_registry import model_registry
 
 # Download required NLTK resources on first import
 try:
@@ -14,6 +17,8 @@ except LookupError:
     
 logger = logging.getLogger(__name__)
 
+VADER_KEY = ('vader', 'default')
+
 class SentimentAnalysisService:
     """
     Service for analyzing sentiment in call transcriptions.
@@ -21,7 +26,60 @@ class SentimentAnalysisService:
     
     def __init__(self):
         """Initialize the sentiment analysis service with required models."""
-        self.vader = SentimentIntensityAnalyzer()
+        self.vader = model_registry.acquire(VADER_KEY, SentimentIntensityAnalyzer)
+        # Sentiment of each segment text scored so far
+        self._segment_scores = {}
+        self._segments = None
+        self._worker = None
+    
+    def start_incremental(self):
+        """
+        Score transcript segments in a background thread as they are passed to
+        `add_segments`, while the call is still being transcribed. `analyze`
+        then only scores the segments that changed in the final transcript.
+        """
+        self._segments = queue.Queue()
+        self._worker = threading.Thread(target=self._consume_segments, daemon=True)
+        self._worker.start()
+    
+    def add_segments(self, segments: List[Dict]):
+        """
+        Queue newly transcribed segments for scoring.
+        
+        Args:
+            segments: Transcript segments as saved on the partial Transcription
+        """
+        if self._segments is not None:
+            self._segments.put([segment['text'] for segment in segments])
+    
+    def _consume_segments(self):
+        """Score queued segment texts until `_stop_incremental`."""
+        while True:
+            texts = self._segments.get()
+            if texts is None:
+                return
+            try:
+                for text in texts:
+                    self._segment_sentiment(text)
+            except Exception as e:
+                logger.error(f"Incremental sentiment analysis error: {str(e)}")
+    
+    def _stop_incremental(self):
+        """Wait for the queued segments to be scored and stop the thread."""
+        if self._worker is not None:
+            self._segments.put(None)
+            self._worker.join()
+            self._worker = None
+            self._segments = None
+    
+    def release_models(self):
+        """
+        Release the VADER analyzer held by this service back to the shared registry.
+        """
+        self._stop_incremental()
+        if self.vader is not None:
+            model_registry.release(VADER_KEY)
+            self.vader = None
     
     def _get_sentiment_label(self, score: float) -> str:
         """
@@ -64,6 +122,12 @@ class SentimentAnalysisService:
         
         return sentiment_label, combined_score
     
+    def _segment_sentiment(self, text: str) -> Tuple[str, float]:
+        """`_analyze_text_sentiment` of a segment, scored once per text."""
+        if text not in self._segment_scores:
+            self._segment_scores[text] = self._analyze_text_sentiment(text)
+        return self._segment_scores[text]
+    
     def _detect_emotions(self, text: str) -> Dict[str, float]:
         """
         Detect emotions in text.
@@ -141,6 +205,9 @@ class SentimentAnalysisService:
             SentimentAnalysis model instance if successful, None otherwise.
         """
         try:
+            # Segments scored while the call was transcribed are reused
+            self._stop_incremental()
+            
             # Get the transcription
             transcription = call_recording.transcription
             if not transcription:
@@ -153,7 +220,7 @@ class SentimentAnalysisService:
             # Analyze segment sentiment
             segment_sentiment = []
             for segment in transcription.segments:
-                label, score = self._analyze_text_sentiment(segment['text'])
+                label, score = self._segment_sentiment(segment['text'])
                 sentiment_info = {
                     'start': segment['start'],
                     'end': segment['end'],
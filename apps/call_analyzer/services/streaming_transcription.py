@@ -0,0 +1,110 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+from django.conf import settings
+
+from apps.call_analyzer.services.audio import SAMPLE_RATE, stream_audio_windows
+
+logger = logging.getLogger(__name__)
+
+# Words of the transcript so far passed to Whisper as the prompt of the next window
+PROMPT_CONTEXT_WORDS = 100
+
+
+class StreamingTranscriber:
+    """
+    Transcribes a recording window by window while it is being decoded.
+
+    Consecutive windows overlap by `overlap_seconds`; each segment is kept
+    from the window in which it starts furthest from the edges, i.e. the
+    overlap is split down the middle. The tail of the transcript so far is
+    passed as Whisper's prompt so context carries across windows. Peak
+    memory is one window of audio regardless of the recording's length.
+    """
+
+    def __init__(self, model, window_seconds: Optional[float] = None, overlap_seconds: Optional[float] = None):
+        """
+        Args:
+            model: Loaded Whisper model
+            window_seconds: Audio transcribed per window. Defaults to
+                            settings.TRANSCRIPTION_WINDOW_SECONDS.
+            overlap_seconds: Audio shared by consecutive windows. Defaults to
+                             settings.TRANSCRIPTION_WINDOW_OVERLAP_SECONDS.
+        """
+        self.model = model
+        self.window_seconds = window_seconds or settings.TRANSCRIPTION_WINDOW_SECONDS
+        self.overlap_seconds = (settings.TRANSCRIPTION_WINDOW_OVERLAP_SECONDS
+                                if overlap_seconds is None else overlap_seconds)
+
+    def transcribe(self, source: Union[str, np.ndarray],
+                   on_segments: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                   on_audio: Optional[Callable[[np.ndarray], None]] = None) -> Dict[str, Any]:
+        """
+        Transcribe an audio file.
+
+        Args:
+            source: Path to the audio file, or its 16 kHz samples (e.g. memory-mapped
+                    from the feature store)
+            on_segments: Called with the segments kept from each window as it is transcribed
+            on_audio: Called with the samples of each window not in the previous one, so
+                      other stages can consume the audio as it is decoded
+
+        Returns:
+            Whisper-style result with text, segments, language and duration
+        """
+        segments = []
+        language = None
+        duration = 0.0
+        margin = self.overlap_seconds / 2
+        fed = 0
+
+        for start_sample, window, is_last in stream_audio_windows(source, self.window_seconds,
+                                                                  self.overlap_seconds):
+            if on_audio is not None:
+                on_audio(window[fed - start_sample:])
+                fed = start_sample + len(window)
+            offset = start_sample / SAMPLE_RATE
+            duration = offset + len(window) / SAMPLE_RATE
+            keep_from = offset + margin if start_sample else 0.0
+            keep_until = float('inf') if is_last else duration - margin
+
+            result = self.model.transcribe(
+                window,
+                fp16=False,
+                language=language,
+                initial_prompt=self._prompt(segments)
+            )
+            language = language or result.get('language')
+
+            kept = len(segments)
+            for segment in result.get('segments', []):
+                start = segment.get('start', 0) + offset
+                if keep_from <= start < keep_until:
+                    segments.append({
+                        'start': start,
+                        'end': min(segment.get('end', 0) + offset, keep_until),
+                        'text': segment.get('text', ''),
+                        'avg_logprob': segment.get('avg_logprob'),
+                        'no_speech_prob': segment.get('no_speech_prob'),
+                    })
+            if on_segments is not None:
+                on_segments(segments[kept:])
+
+        logger.info(f"Streamed {duration:.0f}s of audio through Whisper in "
+                    f"{self.window_seconds:.0f}s windows")
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': language,
+            'duration': duration,
+        }
+
+    def _prompt(self, segments) -> Optional[str]:
+        """The last words transcribed so far, as context for the next window."""
+        words = []
+        for segment in reversed(segments):
+            words[:0] = segment['text'].split()
+            if len(words) >= PROMPT_CONTEXT_WORDS:
+                break
+        return ' '.join(words[-PROMPT_CONTEXT_WORDS:]) or None
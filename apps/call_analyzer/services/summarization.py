@@ -1,123 +1,131 @@
+import json
 import logging
+import re
 from typing import Dict, List, Any, Optional
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
 
 from django.conf import settings
+from django.db import transaction
+from apps.core.services.generation import acquire_engine, release_engine
+from apps.core.services.stopping import JSON_OBJECT, KEY_ELEMENTS_COMPLETE, SINGLE_PASS_COMPLETE
 from apps.call_analyzer.models import CallRecording, Transcription, CallSummary, SalesPerformance
+from apps.call_analyzer.services.chunking import TranscriptChunker
 
 logger = logging.getLogger(__name__)
 
+# Closes the variable part of a prompt whose instructions precede the transcript
+RESPONSE_CUE = "\n\nYour response:\n"
+
+# Declared shape of a per-chunk performance analysis, enforced while decoding
+PERFORMANCE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'strengths': {'type': 'array', 'items': {'type': 'string', 'maxLength': 120}, 'maxItems': 3},
+        'weaknesses': {'type': 'array', 'items': {'type': 'string', 'maxLength': 120}, 'maxItems': 3},
+        'suggestions': {'type': 'array', 'items': {'type': 'string', 'maxLength': 120}, 'maxItems': 3},
+        'overall_score': {'type': 'integer', 'minimum': 0, 'maximum': 100},
+    },
+    'required': ['strengths', 'weaknesses', 'suggestions', 'overall_score'],
+}
+
 class SummarizationService:
     """
     Service for summarizing call transcriptions using an open-source LLM.
     """
     
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, assisted: Optional[bool] = None):
         """
         Initialize the summarization service.
         
         Args:
             model_name: Name or path of the open-source LLM to use.
+            assisted: Use assisted generation with the draft model. Defaults to
+                      whether 'summarization' is in settings.LLM_ASSISTED_SERVICES.
         """
         self.model_name = model_name or settings.OPEN_SOURCE_LLM_MODEL
-        self.model = None
-        self.tokenizer = None
+        self.assisted = 'summarization' in settings.LLM_ASSISTED_SERVICES if assisted is None else assisted
+        self.engine = None
     
     def _load_model(self):
         """
-        Load the LLM model if it's not already loaded.
+        Get the shared generation engine for the LLM if it's not already held.
         """
-        if self.model is None or self.tokenizer is None:
-            logger.info(f"Loading LLM model: {self.model_name}")
-            try:
-                # Try to load with reduced precision for memory efficiency
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_name,
-                    torch_dtype=torch.float16,
-                    device_map="auto",
-                    load_in_8bit=True  # Quantize for memory efficiency
-                )
-            except:
-                # Fall back to standard loading
-                logger.info("Falling back to standard model loading")
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        if self.engine is None:
+            self.engine = acquire_engine(self.model_name)
+        
+        return self.engine
+    
+    def release_models(self):
+        """
+        Release the models held by this service back to the shared registry.
+        """
+        if self.engine is not None:
+            release_engine(self.model_name)
+            self.engine = None
+    
+    def _chunk_transcription(self, transcription: Transcription) -> List[Dict[str, Any]]:
+        """
+        Split the transcription into token-bounded chunks of whole segments.
         
-        return self.model, self.tokenizer
+        Args:
+            transcription: The Transcription model instance
+            
+        Returns:
+            List of {start, end, text, token_ids} chunks
+        """
+        engine = self._load_model()
+        return TranscriptChunker(engine.tokenizer).chunk(transcription)
     
-    def _chunked_summarization(self, text: str, max_length: int = 4000) -> List[Dict[str, Any]]:
+    def _chunked_summarization(self, chunks: List[Dict[str, Any]],
+                               batch_size: Optional[int] = None, force: bool = False) -> List[Dict[str, Any]]:
         """
         Process long texts by summarizing in chunks.
         
         Args:
-            text: Full text to summarize
-            max_length: Maximum input length for the model
+            chunks: Transcript chunks from `_chunk_transcription`
+            batch_size: Number of chunk prompts generated together in one
+                        padded batch. Defaults to settings.SUMMARY_BATCH_SIZE;
+                        1 summarizes the chunks one at a time.
+            force: Bypass the LLM response cache
             
         Returns:
             Combined results from all chunks
         """
-        model, tokenizer = self._load_model()
-        
-        # Split text into chunks if needed
-        if len(text) <= max_length:
-            chunks = [text]
-        else:
-            # Split by sentences or paragraphs
-            sentences = text.split('. ')
-            chunks = []
-            current_chunk = ""
-            
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) <= max_length:
-                    current_chunk += sentence + ". "
-                else:
-                    chunks.append(current_chunk)
-                    current_chunk = sentence + ". "
-            
-            if current_chunk:
-                chunks.append(current_chunk)
-        
-        # Process each chunk
-        summarizer = pipeline(
-            "text-generation",
-            model=model,
-            tokenizer=tokenizer,
-            max_length=512
+        engine = self._load_model()
+        
+        # Summarize all chunks in padded batches (the engine returns just the generated part)
+        prompts = [engine.build_prompt(chunk['token_ids'], "\n\nSummary:") for chunk in chunks]
+        summaries = engine.generate(
+            prompts,
+            prefix="Summarize this sales call transcript: ",
+            batch_size=batch_size or settings.SUMMARY_BATCH_SIZE,
+            force=force,
+            stage='chunk_summary',
+            assisted=self.assisted
         )
         
-        results = []
-        for i, chunk in enumerate(chunks):
-            prompt = f"Summarize this sales call transcript: {chunk}\n\nSummary:"
-            
-            # Generate summary
-            response = summarizer(prompt, max_length=1024, num_return_sequences=1)[0]['generated_text']
-            
-            # Extract just the generated part (after the prompt)
-            summary_text = response.split("Summary:")[1].strip() if "Summary:" in response else response
-            
-            results.append({
+        return [
+            {
                 "chunk_id": i,
-                "summary": summary_text
-            })
-        
-        return results
+                "summary": summary_text.strip()
+            }
+            for i, summary_text in enumerate(summaries)
+        ]
 
-    def _extract_key_elements(self, text: str) -> Dict[str, Any]:
+    def _extract_key_elements(self, chunks: List[Dict[str, Any]], force: bool = False) -> Dict[str, Any]:
         """
         Extract key elements from a call transcript using LLM.
+        
+        Every chunk is analyzed and the items found in each are merged,
+        so the whole transcript is covered.
         """
-        model, tokenizer = self._load_model()
+        engine = self._load_model()
         
-        # Create a clearer, more structured prompt
-        prompt = f"""
+        # Create a clearer, more structured prompt. The instructions come
+        # first so they form a static prefix shared by every call.
+        prompt_prefix = """
         You are an expert at analyzing sales call transcripts.
         
-        Below is a transcript from a sales call. Extract the following information in a clear, structured format:
-
-        TRANSCRIPT:
-        {text[:3000]}  # Truncated to avoid token limits
+        Below is a transcript from a sales call. Extract the following information in a clear, structured format.
         
         Format your response exactly like this example:
         KEY POINTS:
@@ -135,28 +143,33 @@ class SummarizationService:
         OBJECTIONS:
         - Customer objection 1
         - Customer objection 2
+
+        TRANSCRIPT:
         """
         
-        # Generate response
-        generation = pipeline(
-            "text-generation",
-            model=model,
-            tokenizer=tokenizer,
-            max_length=1024,
-            truncation=True
-        )
-        
-        response = generation(prompt, max_length=1024, num_return_sequences=1)[0]['generated_text']
+        # Generate responses
+        prompts = [engine.build_prompt(chunk['token_ids'], RESPONSE_CUE) for chunk in chunks]
+        responses = engine.generate(prompts, prefix=prompt_prefix, batch_size=settings.SUMMARY_BATCH_SIZE,
+                                    force=force, stage='key_elements', stop=KEY_ELEMENTS_COMPLETE,
+                                    assisted=self.assisted)
         
         # More robust extraction of sections using regular expressions
-        structured_data = {
-            "key_points": self._extract_list_items(response, "KEY POINTS"),
-            "action_items": self._extract_list_items(response, "ACTION ITEMS"),
-            "questions": self._extract_list_items(response, "QUESTIONS"),
-            "objections": self._extract_list_items(response, "OBJECTIONS")
-        }
+        structured_data = {"key_points": [], "action_items": [], "questions": [], "objections": []}
+        for response in responses:
+            self._merge_items(structured_data["key_points"], self._extract_list_items(response, "KEY POINTS"))
+            self._merge_items(structured_data["action_items"], self._extract_list_items(response, "ACTION ITEMS"))
+            self._merge_items(structured_data["questions"], self._extract_list_items(response, "QUESTIONS"))
+            self._merge_items(structured_data["objections"], self._extract_list_items(response, "OBJECTIONS"))
         
         return structured_data
+    
+    def _merge_items(self, items: List[str], new_items: List[str]) -> None:
+        """Append items not already present (case-insensitive), e.g. from overlapping chunks."""
+        seen = {item.lower() for item in items}
+        for item in new_items:
+            if item.lower() not in seen:
+                items.append(item)
+                seen.add(item.lower())
 
     def _extract_list_items(self, text: str, section_name: str) -> List[str]:
         """Extract list items from a section using more robust pattern matching."""
@@ -204,25 +217,24 @@ class SummarizationService:
         
         return items
     
-    def _analyze_performance(self, text: str, call_recording: CallRecording) -> SalesPerformance:
+    def _analyze_performance(self, chunks: List[Dict[str, Any]], call_recording: CallRecording,
+                             force: bool = False) -> SalesPerformance:
         """
         Analyze sales performance aspects of the call.
         
         Args:
-            text: Call transcript text
+            chunks: Transcript chunks from `_chunk_transcription`
             call_recording: The CallRecording model instance
+            force: Bypass the LLM response cache
             
         Returns:
             SalesPerformance model instance
         """
-        model, tokenizer = self._load_model()
+        engine = self._load_model()
         
-        # Create prompt for performance analysis
-        prompt = f"""
-        Analyze this sales call transcript for sales performance:
-        
-        Transcript:
-        {text[:4000]}  # Truncate to avoid token limits
+        # Create prompt for performance analysis (static instructions first)
+        prompt_prefix = """
+        Analyze the sales call transcript below for sales performance.
         
         Provide:
         1. Strengths: What the salesperson did well
@@ -230,60 +242,215 @@ class SummarizationService:
         3. Suggestions: Specific advice for improvement
         4. Overall score: Rate the call on a scale of 0-100
         
-        Format your response as JSON.
+        Format your response as JSON with the keys "strengths", "weaknesses" and
+        "suggestions" (lists of strings) and "overall_score" (an integer).
+        
+        Transcript:
         """
         
-        # Generate response
-        generation = pipeline(
-            "text-generation",
-            model=model,
-            tokenizer=tokenizer,
-            max_length=1024
+        # Generate responses
+        # With constrained decoding the output always follows PERFORMANCE_SCHEMA
+        constrained = settings.LLM_CONSTRAINED_DECODING
+        prompts = [engine.build_prompt(chunk['token_ids'], RESPONSE_CUE) for chunk in chunks]
+        responses = engine.generate(prompts, prefix=prompt_prefix, batch_size=settings.SUMMARY_BATCH_SIZE,
+                                    force=force, stage='performance',
+                                    stop=None if constrained else JSON_OBJECT,
+                                    schema=PERFORMANCE_SCHEMA if constrained else None,
+                                    assisted=self.assisted)
+        
+        # Merge the per-chunk analyses, averaging the scores
+        analysis_data = {"strengths": [], "weaknesses": [], "suggestions": []}
+        scores = []
+        for response in responses:
+            chunk_data = self._parse_performance(response, constrained=constrained)
+            self._merge_items(analysis_data["strengths"], chunk_data.get('strengths', []))
+            self._merge_items(analysis_data["weaknesses"], chunk_data.get('weaknesses', []))
+            self._merge_items(analysis_data["suggestions"], chunk_data.get('suggestions', []))
+            # Chunks without a usable score are skipped, not counted as 50
+            try:
+                scores.append(float(chunk_data['overall_score']))
+            except (KeyError, TypeError, ValueError):
+                continue
+        
+        # Create or update performance analysis
+        performance, created = SalesPerformance.objects.update_or_create(
+            call_recording=call_recording,
+            defaults={
+                'strengths': analysis_data['strengths'],
+                'weaknesses': analysis_data['weaknesses'],
+                'suggestions': analysis_data['suggestions'],
+                'overall_score': sum(scores) / len(scores) if scores else 50
+            }
         )
         
-        response = generation(prompt, max_length=1024, num_return_sequences=1)[0]['generated_text']
+        return performance
+    
+    def _parse_performance(self, response: str, constrained: bool = False) -> Dict[str, Any]:
+        """
+        Parse one performance analysis response into a dictionary.
+        
+        Args:
+            response: LLM-generated text
+            constrained: Whether the response was decoded against PERFORMANCE_SCHEMA
+            
+        Returns:
+            Dictionary with strengths, weaknesses, suggestions and overall_score
+            (empty if a constrained response was cut off by the token budget)
+        """
+        if constrained:
+            try:
+                return json.loads(response)
+            except ValueError as e:
+                logger.error(f"Constrained performance analysis was cut off: {str(e)}")
+                return {}
         
-        # Parse the response (similar to above)
         try:
-            import json
             import re
             
             json_match = re.search(r'\{.*\}', response, re.DOTALL)
             if json_match:
                 json_str = json_match.group(0)
-                analysis_data = json.loads(json_str)
-            else:
-                # Manual extraction as fallback
-                analysis_data = {
-                    "strengths": self._extract_section(response, "Strengths"),
-                    "weaknesses": self._extract_section(response, "Weaknesses"),
-                    "suggestions": self._extract_section(response, "Suggestions"),
-                    "overall_score": self._extract_score(response)
-                }
+                return json.loads(json_str)
         except Exception as e:
             logger.error(f"Error parsing LLM response for performance: {str(e)}")
-            analysis_data = {
-                "strengths": self._extract_section(response, "Strengths"),
-                "weaknesses": self._extract_section(response, "Weaknesses"),
-                "suggestions": self._extract_section(response, "Suggestions"),
-                "overall_score": self._extract_score(response)
-            }
         
-        # Create or update performance analysis
-        performance, created = SalesPerformance.objects.update_or_create(
-            call_recording=call_recording,
-            defaults={
-                'strengths': analysis_data.get('strengths', []),
-                'weaknesses': analysis_data.get('weaknesses', []),
-                'suggestions': analysis_data.get('suggestions', []),
-                'overall_score': analysis_data.get('overall_score', 50)
-            }
-        )
+        # Manual extraction as fallback
+        data = {
+            "strengths": self._extract_section(response, "Strengths"),
+            "weaknesses": self._extract_section(response, "Weaknesses"),
+            "suggestions": self._extract_section(response, "Suggestions"),
+        }
+        score = self._extract_score(response)
+        if score is not None:
+            data["overall_score"] = score
+        return data
+    
+    def _single_pass_analysis(self, chunks: List[Dict[str, Any]], call_recording: CallRecording,
+                              force: bool = False, include_performance: bool = True) -> CallSummary:
+        """
+        Produce the summary, key elements and performance analysis of the
+        call from a single generation per chunk.
         
-        return performance
+        Args:
+            chunks: Transcript chunks from `_chunk_transcription`
+            call_recording: The CallRecording model instance
+            force: Bypass the LLM response cache
+            include_performance: Also assess the salesperson's performance; when
+                                 False the response ends after the objections
+            
+        Returns:
+            CallSummary model instance (the SalesPerformance is saved alongside it
+            when include_performance is set)
+        """
+        engine = self._load_model()
+        
+        task = "extract the key information and assess the salesperson's performance" if include_performance \
+            else "and extract the key information"
+        prompt_prefix = f"""
+        You are an expert at analyzing sales call transcripts.
+        
+        Below is a transcript from a sales call. Summarize it, {task}.
+        
+        Format your response exactly like this example:
+        OVERVIEW:
+        A short paragraph summarizing the call.
+        
+        KEY POINTS:
+        - First key point about the conversation
+        - Second key point about the conversation
+        
+        ACTION ITEMS:
+        - Action item 1
+        
+        QUESTIONS:
+        - Question 1 asked during the call
+        
+        OBJECTIONS:
+        - Customer objection 1
+        """
+        if include_performance:
+            prompt_prefix += """
+        STRENGTHS:
+        - What the salesperson did well
+        
+        WEAKNESSES:
+        - Area for improvement
+        
+        SUGGESTIONS:
+        - Specific advice for improvement
+        
+        OVERALL SCORE: Rate the call on a scale of 0-100
+"""
+        prompt_prefix += """
+        TRANSCRIPT:
+        """
+        
+        prompts = [engine.build_prompt(chunk['token_ids'], RESPONSE_CUE) for chunk in chunks]
+        responses = engine.generate(prompts, prefix=prompt_prefix, batch_size=settings.SUMMARY_BATCH_SIZE,
+                                    force=force, stage='single_pass',
+                                    stop=SINGLE_PASS_COMPLETE if include_performance else KEY_ELEMENTS_COMPLETE,
+                                    assisted=self.assisted)
+        
+        overviews = []
+        structured_data = {
+            "key_points": [], "action_items": [], "questions": [], "objections": [],
+            "strengths": [], "weaknesses": [], "suggestions": []
+        }
+        sections = {
+            "key_points": "KEY POINTS", "action_items": "ACTION ITEMS",
+            "questions": "QUESTIONS", "objections": "OBJECTIONS",
+            "strengths": "STRENGTHS", "weaknesses": "WEAKNESSES", "suggestions": "SUGGESTIONS"
+        }
+        scores = []
+        for response in responses:
+            overview = self._extract_paragraph(response, "OVERVIEW")
+            if overview:
+                overviews.append(overview)
+            for field, section_name in sections.items():
+                self._merge_items(structured_data[field], self._extract_list_items(response, section_name))
+            # Chunks without a score are skipped, as in _analyze_performance
+            score = self._extract_score(response)
+            if score is not None:
+                scores.append(score)
+        
+        with transaction.atomic():
+            summary, created = CallSummary.objects.update_or_create(
+                call_recording=call_recording,
+                defaults={
+                    'overview': " ".join(overviews),
+                    'key_points': structured_data['key_points'],
+                    'action_items': structured_data['action_items'],
+                    'questions': structured_data['questions'],
+                    'objections': structured_data['objections']
+                }
+            )
+            if include_performance:
+                SalesPerformance.objects.update_or_create(
+                    call_recording=call_recording,
+                    defaults={
+                        'strengths': structured_data['strengths'],
+                        'weaknesses': structured_data['weaknesses'],
+                        'suggestions': structured_data['suggestions'],
+                        'overall_score': sum(scores) / len(scores) if scores else 50
+                    }
+                )
+        
+        return summary
     
-    def _extract_score(self, text: str) -> float:
-        """Extract numerical score from text."""
+    def _extract_paragraph(self, text: str, section_name: str) -> str:
+        """Extract the free text of a section up to the next section heading."""
+        import re
+        
+        pattern = f"{section_name}:(.*?)(?:\n\s*[A-Z ]+:|$)"
+        match = re.search(pattern, text, re.DOTALL)
+        
+        if not match:
+            return ""
+        
+        return " ".join(match.group(1).split())
+    
+    def _extract_score(self, text: str) -> Optional[float]:
+        """Extract numerical score from text, or None if there is none."""
         import re
         
         score_pattern = r'Overall score:?\s*(\d+)'
@@ -297,15 +464,22 @@ class SummarizationService:
             except:
                 pass
         
-        # Default score if we can't extract one
-        return 50.0
+        # Callers default to 50 only when no chunk has a score
+        return None
     
-    def summarize(self, call_recording: CallRecording) -> Optional[CallSummary]:
+    def summarize(self, call_recording: CallRecording, single_pass: Optional[bool] = None,
+                  force: bool = False, defer_performance: bool = False) -> Optional[CallSummary]:
         """
         Generate a summary for the call recording.
         
         Args:
             call_recording: The CallRecording model instance to summarize.
+            single_pass: Produce the summary and performance analysis from one
+                         generation per chunk instead of three separate passes.
+                         Defaults to settings.SUMMARY_SINGLE_PASS.
+            force: Regenerate instead of reusing cached LLM outputs.
+            defer_performance: Skip the performance analysis; it is backfilled
+                               later with `analyze_performance`.
             
         Returns:
             CallSummary model instance if successful, None otherwise.
@@ -317,14 +491,21 @@ class SummarizationService:
                 logger.error(f"No transcription found for call recording: {call_recording.id}")
                 return None
             
+            # Split the transcript once; all three passes share the tokenized chunks
+            chunks = self._chunk_transcription(transcription)
+            
+            if settings.SUMMARY_SINGLE_PASS if single_pass is None else single_pass:
+                return self._single_pass_analysis(chunks, call_recording, force=force,
+                                                  include_performance=not defer_performance)
+            
             # Generate call summary chunks
-            summary_chunks = self._chunked_summarization(transcription.text)
+            summary_chunks = self._chunked_summarization(chunks, force=force)
             
             # Combine chunk summaries
             full_summary = " ".join([chunk["summary"] for chunk in summary_chunks])
             
             # Extract structured elements
-            structured_data = self._extract_key_elements(transcription.text)
+            structured_data = self._extract_key_elements(chunks, force=force)
             
             # Create or update call summary
             summary, created = CallSummary.objects.update_or_create(
@@ -339,10 +520,63 @@ class SummarizationService:
             )
             
             # Also analyze performance
-            self._analyze_performance(transcription.text, call_recording)
+            if not defer_performance:
+                self._analyze_performance(chunks, call_recording, force=force)
             
             return summary
             
         except Exception as e:
             logger.error(f"Summarization error for {call_recording.title}: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+    
+    def analyze_performance(self, call_recording: CallRecording, force: bool = False) -> Optional[SalesPerformance]:
+        """
+        Run only the performance analysis of a call, e.g. to backfill one
+        deferred under load.
+        
+        Args:
+            call_recording: The CallRecording model instance to analyze.
+            force: Regenerate instead of reusing cached LLM outputs.
+            
+        Returns:
+            SalesPerformance model instance if successful, None otherwise.
+        """
+        try:
+            chunks = self._chunk_transcription(call_recording.transcription)
+            return self._analyze_performance(chunks, call_recording, force=force)
+        except Exception as e:
+            logger.error(f"Performance analysis error for {call_recording.title}: {str(e)}")
+            return None
+    
+    def template_summary(self, call_recording: CallRecording) -> Optional[CallSummary]:
+        """
+        Summarize a very short recording (e.g. a voicemail) without the LLM.
+        The transcript itself becomes the overview and questions are picked
+        out of it; no performance analysis is produced.
+        
+        Args:
+            call_recording: The CallRecording model instance to summarize.
+            
+        Returns:
+            CallSummary model instance if successful, None otherwise.
+        """
+        try:
+            transcription = call_recording.transcription
+            text = transcription.text.strip()
+            sentences = [sentence.strip() for sentence in re.split(r'(?<=[.!?])\s+', text) if sentence.strip()]
+            
+            summary, created = CallSummary.objects.update_or_create(
+                call_recording=call_recording,
+                defaults={
+                    'overview': text,
+                    'key_points': [],
+                    'action_items': [],
+                    'questions': [sentence for sentence in sentences if sentence.endswith('?')],
+                    'objections': []
+                }
+            )
+            return summary
+            
+        except Exception as e:
+            logger.error(f"Template summary error for {call_recording.title}: {str(e)}")
+            return None
@@ -1,74 +1,179 @@
-import os
-import tempfile
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 from datetime import timedelta
 
+import numpy as np
 import whisper
-from pydub import AudioSegment
 from django.conf import settings
 
 from apps.call_analyzer.models import CallRecording, Transcription
+from apps.call_analyzer.services.cascade_transcription import CascadeTranscriber, transcript_confidence
+from apps.call_analyzer.services.diarization import DiarizationService, LogMelStream
+from apps.call_analyzer.services.feature_store import FeatureStore
+from apps.call_analyzer.services.parallel_transcription import (
+    ParallelTranscriber, SequentialTranscriber, pool_unavailable_reason
+)
+from apps.call_analyzer.services.streaming_transcription import StreamingTranscriber
+from apps.call_analyzer.services.trimming import NonSpeechTrimmer, TrimMap
+from apps.core.services.model_registry import model_registry
 
 logger = logging.getLogger(__name__)
 
+def whisper_key(model_name: str) -> Tuple[str, str]:
+    """Registry key for a Whisper model."""
+    return ('whisper', model_name)
+
+
+def load_whisper_model(model_name: str):
+    """
+    Load a Whisper model from disk.
+    
+    Args:
+        model_name: Name of the Whisper model to load.
+    """
+    logger.info(f"Loading Whisper model: {model_name}")
+    return whisper.load_model(model_name)
+
+
 class TranscriptionService:
     """
     Service for transcribing audio recordings using Whisper AI.
     """
     
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, parallel: Optional[bool] = None,
+                 streaming: Optional[bool] = None, cascade: Optional[bool] = None,
+                 progressive: Optional[bool] = None):
         """
         Initialize the transcription service with the specified Whisper model.
         
         Args:
             model_name: Name of the Whisper model to use.
                         Options: 'tiny', 'base', 'small', 'medium', 'large'
+            parallel: Transcribe silence-delimited chunks in a process pool.
+                      Defaults to settings.TRANSCRIPTION_PARALLEL.
+            streaming: Transcribe fixed windows while decoding, in bounded memory.
+                       Takes precedence over `parallel`. Defaults to
+                       settings.TRANSCRIPTION_STREAMING.
+            cascade: Transcribe with settings.TRANSCRIPTION_CASCADE_FAST_MODEL first and
+                     re-decode only low-confidence segments with `model_name`. Not used
+                     in streaming mode. Defaults to settings.TRANSCRIPTION_CASCADE.
+            progressive: Save the transcription with `partial` set after every chunk or
+                         window, and transcribe in VAD chunks in-process when neither
+                         `parallel` nor `streaming` is set. Defaults to
+                         settings.TRANSCRIPTION_PROGRESSIVE.
         """
         self.model_name = model_name or settings.WHISPER_MODEL
-        self.model = None
+        self.parallel = settings.TRANSCRIPTION_PARALLEL if parallel is None else parallel
+        self.streaming = settings.TRANSCRIPTION_STREAMING if streaming is None else streaming
+        self.cascade = settings.TRANSCRIPTION_CASCADE if cascade is None else cascade
+        self.progressive = settings.TRANSCRIPTION_PROGRESSIVE if progressive is None else progressive
+        self.models = {}
+    
+    def _load_model(self, model_name: Optional[str] = None):
+        """
+        Get a Whisper model from the shared model registry if it's not already held.
+        
+        Args:
+            model_name: Defaults to the service's model.
+        """
+        model_name = model_name or self.model_name
+        if model_name not in self.models:
+            self.models[model_name] = model_registry.acquire(
+                whisper_key(model_name),
+                lambda: load_whisper_model(model_name)
+            )
+        return self.models[model_name]
     
-    def _load_model(self):
+    def release_models(self):
         """
-        Load the Whisper model if it's not already loaded.
+        Release the Whisper models held by this service back to the shared registry.
         """
-        if self.model is None:
-            logger.info(f"Loading Whisper model: {self.model_name}")
-            self.model = whisper.load_model(self.model_name)
-        return self.model
+        for model_name in self.models:
+            model_registry.release(whisper_key(model_name))
+        self.models = {}
     
-    def _prepare_audio_file(self, file_path: str) -> str:
+    def _transcribe_parallel(self, audio: np.ndarray, model_name: str,
+                             on_segments: Optional[Callable[[List[Dict]], None]] = None) -> Optional[Dict]:
         """
-        Prepare the audio file for transcription by converting to WAV if needed.
+        Transcribe audio as silence-delimited chunks in the Whisper process pool.
         
         Args:
-            file_path: Path to the audio file.
+            audio: Decoded 16 kHz mono samples.
+            model_name: Whisper model of the pool processes.
+            on_segments: Called with the segments of each chunk as it is transcribed.
             
         Returns:
-            Path to the prepared audio file.
+            Whisper-style result, or None if the pool could not be used and the
+            audio should be transcribed in-process.
         """
-        # Check file extension
-        _, ext = os.path.splitext(file_path)
-        if ext.lower() in ['.wav']:
-            return file_path
-        
-        # Convert to WAV for better compatibility
+        reason = pool_unavailable_reason()
+        if reason is not None:
+            # Reported once at worker start (see config/celery.py)
+            logger.debug(f"Parallel transcription unavailable: {reason}")
+            return None
         try:
-            audio = AudioSegment.from_file(file_path)
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
-                tmp_path = tmp_file.name
-                audio.export(tmp_path, format='wav')
-                return tmp_path
+            return ParallelTranscriber(model_name).transcribe(audio, on_segments=on_segments)
         except Exception as e:
-            logger.error(f"Error converting audio file: {e}")
-            return file_path
+            logger.error(f"Parallel transcription failed, transcribing sequentially: {str(e)}")
+            return None
+    
+    def _progress(self, call_recording: CallRecording, trim_map: Optional[TrimMap],
+                  on_segments: Optional[Callable[[List[Dict]], None]]) -> Optional[Callable[[List[Dict]], None]]:
+        """
+        Callback saving each batch of new segments as a partial transcription.
+        
+        Args:
+            call_recording: The CallRecording being transcribed.
+            trim_map: Maps the transcribed audio's times to the recording's, if it was trimmed.
+            on_segments: Also called with each batch of saved segments.
+            
+        Returns:
+            The callback, or None unless the service is progressive.
+        """
+        if not self.progressive:
+            return None
+        segments = []
+        
+        def save(new_segments: List[Dict]) -> None:
+            new_segments = [self._stored_segment(segment, trim_map) for segment in new_segments]
+            segments.extend(new_segments)
+            Transcription.objects.update_or_create(
+                call_recording=call_recording,
+                defaults={
+                    'text': ''.join(segment['text'] for segment in segments),
+                    'segments': segments,
+                    'confidence_score': transcript_confidence(segments),
+                    'partial': True
+                }
+            )
+            if on_segments is not None:
+                on_segments(new_segments)
+        
+        return save
+    
+    def _stored_segment(self, segment: Dict, trim_map: Optional[TrimMap] = None) -> Dict:
+        """A Whisper segment as saved on the Transcription, in the recording's times."""
+        start, end = segment.get('start', 0), segment.get('end', 0)
+        if trim_map is not None:
+            start, end = trim_map.to_original(start), trim_map.to_original(end, is_end=True)
+        return {
+            'start': start,
+            'end': end,
+            'text': segment.get('text', ''),
+            'avg_logprob': segment.get('avg_logprob'),
+            'no_speech_prob': segment.get('no_speech_prob'),
+            'speaker': 'unknown'  # Whisper doesn't do speaker diarization by default
+        }
     
-    def transcribe(self, call_recording: CallRecording) -> Optional[Transcription]:
+    def transcribe(self, call_recording: CallRecording,
+                   on_segments: Optional[Callable[[List[Dict]], None]] = None) -> Optional[Transcription]:
         """
         Transcribe the given call recording and save the results.
         
         Args:
             call_recording: The CallRecording model instance to transcribe.
+            on_segments: In progressive mode, called with each batch of segments as it
+                         is saved, so later stages can start before Whisper finishes.
             
         Returns:
             Transcription model instance if successful, None otherwise.
@@ -78,31 +183,73 @@ class TranscriptionService:
             call_recording.status = 'processing'
             call_recording.save()
             
-            # Load model
-            model = self._load_model()
-            
-            # Prepare audio file
-            file_path = call_recording.file.path
-            prepared_path = self._prepare_audio_file(file_path)
-            
             # Run transcription
             logger.info(f"Starting transcription for: {call_recording.title}")
-            result = model.transcribe(prepared_path, fp16=False)
+            store = FeatureStore(call_recording)
+            audio = None
+            features = None
+            trim_map = None
+            if self.streaming:
+                # Compute the diarization spectrogram from the same windows, unless it is stored
+                diarization = DiarizationService()
+                logmel = None
+                if settings.DIARIZATION_ENABLED and store.load('logmel', diarization.feature_params()) is None:
+                    logmel = LogMelStream(diarization)
+                # Stream from the stored samples if the call was decoded before, else from the file
+                source = store.cached_audio()
+                result = StreamingTranscriber(self._load_model()).transcribe(
+                    call_recording.file.path if source is None else source,
+                    on_segments=self._progress(call_recording, None, on_segments),
+                    on_audio=logmel.feed if logmel is not None else None
+                )
+                if logmel is not None:
+                    features = logmel.features()
+            else:
+                # Decode the upload once to the 16 kHz mono samples Whisper expects; the
+                # memory-mapped samples are shared with the other audio stages and reprocessing
+                audio = store.audio()
+                speech = audio
+                if settings.TRIMMING_ENABLED:
+                    # Whisper only hears the speech; timestamps are mapped back below
+                    speech, trim_map = NonSpeechTrimmer().trim(audio)
+                # In cascade mode the first pass uses the fast model
+                cascade = self.cascade and settings.TRANSCRIPTION_CASCADE_FAST_MODEL != self.model_name
+                first_model_name = settings.TRANSCRIPTION_CASCADE_FAST_MODEL if cascade else self.model_name
+                result = None
+                if self.parallel:
+                    result = self._transcribe_parallel(
+                        speech, first_model_name, self._progress(call_recording, trim_map, on_segments)
+                    )
+                if result is None:
+                    model = self._load_model(first_model_name)
+                    if self.progressive:
+                        result = SequentialTranscriber(model).transcribe(
+                            speech, on_segments=self._progress(call_recording, trim_map, on_segments)
+                        )
+                    else:
+                        result = model.transcribe(speech, fp16=False)
+                if cascade:
+                    result = CascadeTranscriber(self._load_model).refine(result, speech)
             
             # Extract transcription text and segments
             text = result.get('text', '')
-            segments = [
-                {
-                    'start': segment.get('start', 0),
-                    'end': segment.get('end', 0),
-                    'text': segment.get('text', ''),
-                    'speaker': 'unknown'  # Whisper doesn't do speaker diarization by default
-                }
-                for segment in result.get('segments', [])
-            ]
+            segments = [self._stored_segment(segment, trim_map) for segment in result.get('segments', [])]
+            if trim_map is not None:
+                result['duration'] = trim_map.original_seconds
+                call_recording.trimmed_duration = timedelta(seconds=trim_map.trimmed_seconds)
+                call_recording.trimmed_seconds = trim_map.removed_seconds
+            
+            # Assign speakers before the single write, reusing the decoded audio
+            if settings.DIARIZATION_ENABLED:
+                try:
+                    self._assign_speakers(segments, call_recording, audio, features)
+                except Exception as e:
+                    logger.error(f"Speaker diarization error for {call_recording.title}: {str(e)}")
             
             # Calculate total duration
-            if segments:
+            if result.get('duration'):
+                call_recording.duration = timedelta(seconds=result['duration'])
+            elif segments:
                 duration_seconds = segments[-1].get('end', 0)
                 call_recording.duration = timedelta(seconds=duration_seconds)
             
@@ -112,17 +259,14 @@ class TranscriptionService:
                 defaults={
                     'text': text,
                     'segments': segments,
-                    'confidence_score': result.get('confidence', None)
+                    'confidence_score': transcript_confidence(segments),
+                    'partial': False
                 }
             )
             
-            # Update call recording status
-            call_recording.status = 'processed'
+            # The call stays 'processing' until process_call_recording_async finishes the
+            # later stages, so its analysis is not reused before it is complete
             call_recording.save()
-            
-            # Clean up temporary file if created
-            if prepared_path != file_path and os.path.exists(prepared_path):
-                os.remove(prepared_path)
                 
             return transcription
             
@@ -132,31 +276,55 @@ class TranscriptionService:
             call_recording.save()
             return None
             
-    def perform_speaker_diarization(self, transcription: Transcription) -> None:
+    def _assign_speakers(self, segments: List[Dict], call_recording: CallRecording,
+                         audio: Optional[np.ndarray] = None, features: Optional[np.ndarray] = None) -> None:
         """
-        Separate speakers in the transcription using a diarization model.
-        This is a placeholder - a full implementation would use a dedicated
-        speaker diarization model like pyannote.audio.
+        Set the speaker of each segment in place.
         
         Args:
-            transcription: The Transcription model instance.
+            segments: Transcript segments.
+            call_recording: The CallRecording the segments belong to.
+            audio: Decoded 16 kHz samples of the recording, if already loaded.
+            features: Log-mel spectrogram of the recording, if already computed
+                      (e.g. while streaming). Without either, the stored or decoded
+                      audio is read window by window, so the whole recording is
+                      never in memory after a streaming transcription.
         """
-        # This is a simplistic approach - in a real implementation,
-        # you would use a dedicated speaker diarization model
-        segments = transcription.segments
+        diarization = DiarizationService()
+        store = FeatureStore(call_recording)
         
-        # Simple heuristic: alternate speakers based on pauses
-        current_speaker = "speaker_A"
-        last_end_time = 0
+        def compute_features():
+            if features is not None:
+                return features
+            if audio is not None:
+                return diarization.log_mel(audio)
+            source = store.cached_audio()
+            return diarization.stream_log_mel(call_recording.file.path if source is None else source)
         
-        for i, segment in enumerate(segments):
-            # Switch speaker if there's a significant pause (e.g., > 1 second)
-            if i > 0 and segment['start'] - last_end_time > 1.0:
-                current_speaker = "speaker_B" if current_speaker == "speaker_A" else "speaker_A"
-            
-            segment['speaker'] = current_speaker
-            last_end_time = segment['end']
+        # The spectrogram is stored, so re-diarizing skips decoding and the FFTs
+        spectrogram = store.features('logmel', diarization.feature_params(), compute_features)
+        speakers = diarization.diarize_features(spectrogram, segments)
+        for segment, speaker in zip(segments, speakers):
+            segment['speaker'] = speaker
+    
+    def perform_speaker_diarization(self, transcription: Transcription,
+                                    audio: Optional[np.ndarray] = None) -> None:
+        """
+        Re-assign the speakers of an existing transcription.
+        
+        `transcribe` already diarizes new transcriptions while
+        settings.DIARIZATION_ENABLED is set.
         
-        # Update the transcription
-        transcription.segments = segments
-        transcription.save()
\ No newline at end of file
+        Args:
+            transcription: The Transcription model instance.
+            audio: Decoded 16 kHz samples of the recording, if already in memory.
+        """
+        try:
+            segments = transcription.segments
+            self._assign_speakers(segments, transcription.call_recording, audio)
+            
+            # Update the transcription
+            transcription.segments = segments
+            transcription.save(update_fields=['segments', 'updated_at'])
+        except Exception as e:
+            logger.error(f"Speaker diarization error for {transcription.call_recording.title}: {str(e)}")
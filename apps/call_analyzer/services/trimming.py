@@ -0,0 +1,198 @@
+import bisect
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from apps.call_analyzer.services.audio import SAMPLE_RATE
+from apps.call_analyzer.services.vad import EnergyVAD
+
+logger = logging.getLogger(__name__)
+
+# Spectral flatness is measured in the telephone speech band
+FLATNESS_BAND_HZ = (300, 3400)
+FFT_SIZE = 512
+# Frames per FFT block, bounding the memory of the spectrum
+BLOCK_FRAMES = 8192
+# Frames are judged by the audio around them, over this window
+CONTEXT_SECONDS = 1.0
+
+
+class TrimMap:
+    """
+    Maps times in trimmed audio back to times in the original recording.
+
+    The table holds the kept regions of the original audio in order; a
+    time in the trimmed audio falls in the region whose cumulative start is
+    the last one at or before it.
+    """
+
+    def __init__(self, regions: List[Tuple[int, int]], original_samples: int):
+        """
+        Args:
+            regions: (start_sample, end_sample) of each kept region of the original audio, in order
+            original_samples: Length of the original audio
+        """
+        self.regions = regions
+        self.original_samples = original_samples
+        self.trimmed_starts = list(np.cumsum([0] + [end - start for start, end in regions[:-1]]))
+
+    @property
+    def original_seconds(self) -> float:
+        return self.original_samples / SAMPLE_RATE
+
+    @property
+    def trimmed_seconds(self) -> float:
+        return sum(end - start for start, end in self.regions) / SAMPLE_RATE
+
+    @property
+    def removed_seconds(self) -> float:
+        return self.original_seconds - self.trimmed_seconds
+
+    def to_original(self, seconds: float, is_end: bool = False) -> float:
+        """
+        Convert a time in the trimmed audio to the original recording.
+
+        Args:
+            seconds: Time in the trimmed audio
+            is_end: The time ends a span, so a time exactly at a cut maps to
+                    the end of the region before it rather than the start of the next
+
+        Returns:
+            Time in the original recording
+        """
+        if not self.regions:
+            return seconds
+        sample = seconds * SAMPLE_RATE
+        index = bisect.bisect_right(self.trimmed_starts, sample) - 1
+        if is_end and index > 0 and sample <= self.trimmed_starts[index]:
+            index -= 1
+        index = max(index, 0)
+        start, end = self.regions[index]
+        return min(start + sample - self.trimmed_starts[index], end) / SAMPLE_RATE
+
+
+class NonSpeechTrimmer:
+    """
+    Removes long non-speech regions (dead air, ring-back, hold music) before transcription.
+
+    Each frame is judged over about a second of context and counts as
+    non-speech when it is silent by EnergyVAD, when the audio around it is
+    noise-like (mean spectral flatness above `flatness_threshold`), or when
+    its level barely varies (standard deviation of frame energy below
+    `modulation_db`; speech rises and falls with every syllable, tones and
+    music hold steady). Runs of non-speech of at least `min_seconds` are cut,
+    less `padding_ms` at either end so words at their edges are kept.
+    """
+
+    def __init__(self, min_seconds: Optional[float] = None, flatness_threshold: Optional[float] = None,
+                 modulation_db: Optional[float] = None, padding_ms: Optional[int] = None):
+        """
+        Args:
+            min_seconds: Shortest non-speech region removed. Defaults to settings.TRIMMING_MIN_SECONDS.
+            flatness_threshold: Spectral flatness above which audio is noise.
+                                Defaults to settings.TRIMMING_FLATNESS_THRESHOLD.
+            modulation_db: Energy variation below which audio is a steady tone or music.
+                           Defaults to settings.TRIMMING_MODULATION_DB.
+            padding_ms: Audio kept at either end of a removed region.
+                        Defaults to settings.TRIMMING_PADDING_MS.
+        """
+        self.min_seconds = min_seconds or settings.TRIMMING_MIN_SECONDS
+        self.flatness_threshold = flatness_threshold or settings.TRIMMING_FLATNESS_THRESHOLD
+        self.modulation_db = settings.TRIMMING_MODULATION_DB if modulation_db is None else modulation_db
+        self.padding_ms = settings.TRIMMING_PADDING_MS if padding_ms is None else padding_ms
+        self.vad = EnergyVAD()
+
+    def non_speech_frames(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Classify each EnergyVAD frame of the audio as non-speech or not.
+
+        Args:
+            audio: Mono float32 samples at SAMPLE_RATE
+
+        Returns:
+            Boolean array, True for non-speech frames
+        """
+        speech = self.vad.speech_frames(audio)
+        if not len(speech):
+            return speech
+
+        frame_length = SAMPLE_RATE * self.vad.frame_ms // 1000
+        frames = audio[:len(speech) * frame_length].reshape(len(speech), frame_length)
+        low, high = (int(hz * FFT_SIZE / SAMPLE_RATE) for hz in FLATNESS_BAND_HZ)
+
+        energy_db = np.empty(len(speech))
+        flatness = np.empty(len(speech))
+        for start in range(0, len(frames), BLOCK_FRAMES):
+            block = frames[start:start + BLOCK_FRAMES].astype(np.float64)
+            energy_db[start:start + len(block)] = 10 * np.log10(np.mean(block ** 2, axis=1) + 1e-10)
+            power = np.abs(np.fft.rfft(block, n=FFT_SIZE, axis=1)[:, low:high]) ** 2 + 1e-12
+            # Geometric over arithmetic mean of the power spectrum: near 1 for noise, near 0 for tones
+            flatness[start:start + len(block)] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+        # Context statistics over the frames that are not silent, so the start and end of a
+        # tone do not count as variation
+        context = max(int(CONTEXT_SECONDS * 1000 / self.vad.frame_ms), 1)
+        active = speech.astype(np.float64)
+        count = np.maximum(self._rolling_sum(active, context), 1)
+        mean_flatness = self._rolling_sum(flatness * active, context) / count
+        mean_energy = self._rolling_sum(energy_db * active, context) / count
+        energy_std = np.sqrt(np.maximum(self._rolling_sum(energy_db ** 2 * active, context) / count
+                                        - mean_energy ** 2, 0))
+
+        return ~speech | (mean_flatness > self.flatness_threshold) | (energy_std < self.modulation_db)
+
+    def trim(self, audio: np.ndarray) -> Tuple[np.ndarray, TrimMap]:
+        """
+        Remove the long non-speech regions of a recording.
+
+        Args:
+            audio: Mono float32 samples at SAMPLE_RATE
+
+        Returns:
+            The trimmed samples (`audio` itself if nothing was removed) and the
+            map from trimmed to original times
+        """
+        non_speech = self.non_speech_frames(audio)
+        frame_length = SAMPLE_RATE * self.vad.frame_ms // 1000
+        min_frames = int(self.min_seconds * 1000 / self.vad.frame_ms)
+        padding = SAMPLE_RATE * self.padding_ms // 1000
+
+        # Non-speech runs as (start_frame, end_frame)
+        edges = np.diff(np.concatenate([[0], non_speech.astype(np.int8), [0]]))
+        runs = zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+        regions = []
+        position = 0
+        for start, end in runs:
+            start, end = int(start), int(end)
+            if end - start < min_frames:
+                continue
+            cut_start = start * frame_length + (padding if start else 0)
+            cut_end = len(audio) if end == len(non_speech) else end * frame_length - padding
+            if cut_end <= cut_start:
+                continue
+            if cut_start > position:
+                regions.append((position, cut_start))
+            position = cut_end
+        if position < len(audio):
+            regions.append((position, len(audio)))
+
+        trim_map = TrimMap(regions, len(audio))
+        if regions == [(0, len(audio))]:
+            return audio, trim_map
+
+        trimmed = np.concatenate([audio[start:end] for start, end in regions]) if regions \
+            else np.zeros(0, dtype=np.float32)
+        logger.info(f"Trimmed {trim_map.removed_seconds:.0f}s of non-speech from "
+                    f"{trim_map.original_seconds:.0f}s of audio")
+        return trimmed, trim_map
+
+    def _rolling_sum(self, values: np.ndarray, window: int) -> np.ndarray:
+        """Sum over a centered window, truncated at the edges."""
+        sums = np.concatenate([[0], np.cumsum(values)])
+        index = np.arange(len(values))
+        starts = np.maximum(index - window // 2, 0)
+        ends = np.minimum(index + window // 2 + 1, len(values))
+        return sums[ends] - sums[starts]
@@ -0,0 +1,106 @@
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from apps.call_analyzer.services.audio import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class EnergyVAD:
+    """
+    Energy-based voice activity detection.
+
+    Frames whose RMS energy stays within `threshold_db` of the recording's
+    noise floor (its 10th percentile frame energy), or more than
+    `threshold_db` below its loudest frame, count as silence. Audio is
+    split at the middle of silences of at least `min_silence_ms` into chunks
+    of about `chunk_seconds`; chunks without any speech are dropped.
+    """
+
+    def __init__(self, frame_ms: Optional[int] = None, threshold_db: Optional[float] = None,
+                 min_silence_ms: Optional[int] = None, chunk_seconds: Optional[int] = None):
+        """
+        Args:
+            frame_ms: Analysis frame length. Defaults to settings.VAD_FRAME_MS.
+            threshold_db: Energy above the noise floor that counts as speech.
+                          Defaults to settings.VAD_THRESHOLD_DB.
+            min_silence_ms: Shortest silence a chunk may be cut at.
+                            Defaults to settings.VAD_MIN_SILENCE_MS.
+            chunk_seconds: Target chunk length; a chunk is cut hard at twice this
+                           length if no silence is found. Defaults to
+                           settings.TRANSCRIPTION_CHUNK_SECONDS.
+        """
+        self.frame_ms = frame_ms or settings.VAD_FRAME_MS
+        self.threshold_db = settings.VAD_THRESHOLD_DB if threshold_db is None else threshold_db
+        self.min_silence_ms = min_silence_ms or settings.VAD_MIN_SILENCE_MS
+        self.chunk_seconds = chunk_seconds or settings.TRANSCRIPTION_CHUNK_SECONDS
+
+    def speech_frames(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Classify each frame of the audio as speech or silence.
+
+        Args:
+            audio: Mono float32 samples at SAMPLE_RATE
+
+        Returns:
+            Boolean array, True for speech frames
+        """
+        frame_length = SAMPLE_RATE * self.frame_ms // 1000
+        frame_count = len(audio) // frame_length
+        if frame_count == 0:
+            return np.zeros(0, dtype=bool)
+
+        frames = audio[:frame_count * frame_length].reshape(frame_count, frame_length)
+        energy_db = 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-10)
+        noise_floor = np.percentile(energy_db, 10)
+        # Without quiet frames (continuous speech) the floor is speech itself; stay below the peak
+        threshold = min(noise_floor + self.threshold_db, energy_db.max() - self.threshold_db)
+        return energy_db > threshold
+
+    def split(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        Split audio into chunks at silence boundaries.
+
+        Args:
+            audio: Mono float32 samples at SAMPLE_RATE
+
+        Returns:
+            (start_sample, end_sample) of each chunk containing speech, in order
+        """
+        speech = self.speech_frames(audio)
+        frame_length = SAMPLE_RATE * self.frame_ms // 1000
+        if not speech.any():
+            return []
+
+        # Candidate cut points: middle frame of every long enough silence
+        min_silence_frames = max(self.min_silence_ms // self.frame_ms, 1)
+        cut_frames = []
+        run_start = None
+        for index, is_speech in enumerate(np.append(speech, True)):
+            if not is_speech and run_start is None:
+                run_start = index
+            elif is_speech and run_start is not None:
+                if index - run_start >= min_silence_frames:
+                    cut_frames.append((run_start + index) // 2)
+                run_start = None
+
+        target_frames = self.chunk_seconds * 1000 // self.frame_ms
+        max_frames = 2 * target_frames
+        boundaries = [0]
+        for cut in cut_frames + [len(speech)]:
+            while cut - boundaries[-1] > max_frames:
+                boundaries.append(boundaries[-1] + max_frames)
+            if cut - boundaries[-1] >= target_frames or cut == len(speech):
+                boundaries.append(cut)
+
+        chunks = []
+        for start, end in zip(boundaries, boundaries[1:]):
+            if end > start and speech[start:end].any():
+                end_sample = len(audio) if end == len(speech) else end * frame_length
+                chunks.append((start * frame_length, end_sample))
+
+        logger.debug(f"VAD split {len(audio) / SAMPLE_RATE:.0f}s of audio into {len(chunks)} chunks")
+        return chunks
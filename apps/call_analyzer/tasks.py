@@ -1,14 +1,20 @@
 import logging
 from celery import shared_task
+from django.conf import settings
+from apps.core.services.degradation import DEFERRABLE_PERFORMANCE, DegradationController
+from apps.core.services.queues import get_queue_depth
 from .models import CallRecording
+from .services.feature_store import evict_features
+from .services.fingerprint import FingerprintService
 from .services.transcription import TranscriptionService
 from .services.sentiment import SentimentAnalysisService
 from .services.summarization import SummarizationService
+from .services.routing import RoutingPolicy, SUMMARY_TEMPLATE, SUMMARY_SINGLE_PASS
 
 logger = logging.getLogger(__name__)
 
 @shared_task
-def process_call_recording_async(call_recording_id):
+def process_call_recording_async(call_recording_id, force=False):
     """
     Process a call recording asynchronously in the following steps:
     1. Transcribe audio to text
@@ -17,21 +23,39 @@ def process_call_recording_async(call_recording_id):
     
     Args:
         call_recording_id: ID of the CallRecording to process
+        force: Regenerate LLM outputs instead of reusing cached ones
     """
     logger.info(f"Starting async processing for call recording: {call_recording_id}")
     
+    # Services hold references into the shared model registry until released
+    services = []
+    
     try:
         # Get the call recording
         call_recording = CallRecording.objects.get(id=call_recording_id)
         
-        # Update status
+        # Choose the Whisper model and summary path for this call
+        routing_policy = RoutingPolicy()
+        route = routing_policy.route(call_recording)
+        
+        # Update status and record the routing decision
         call_recording.status = 'processing'
+        call_recording.routing = route
         call_recording.save()
         
         # Step 1: Transcription
-        logger.info(f"Starting transcription for call recording: {call_recording_id}")
-        transcription_service = TranscriptionService()
-        transcription = transcription_service.transcribe(call_recording)
+        logger.info(f"Starting transcription for call recording: {call_recording_id} "
+                    f"with Whisper model {route['whisper_model']}")
+        transcription_service = TranscriptionService(model_name=route['whisper_model'])
+        services.append(transcription_service)
+        sentiment_service = SentimentAnalysisService()
+        services.append(sentiment_service)
+        on_segments = None
+        if transcription_service.progressive:
+            # Score segments as they are saved, while Whisper works on the rest of the call
+            sentiment_service.start_incremental()
+            on_segments = sentiment_service.add_segments
+        transcription = transcription_service.transcribe(call_recording, on_segments=on_segments)
         
         if not transcription:
             logger.error(f"Transcription failed for call recording: {call_recording_id}")
@@ -39,22 +63,38 @@ def process_call_recording_async(call_recording_id):
             call_recording.save()
             return
         
-        # Optional: Speaker diarization
-        transcription_service.perform_speaker_diarization(transcription)
-        
         # Step 2: Sentiment Analysis
         logger.info(f"Starting sentiment analysis for call recording: {call_recording_id}")
-        sentiment_service = SentimentAnalysisService()
         sentiment = sentiment_service.analyze(call_recording)
         
         if not sentiment:
             logger.warning(f"Sentiment analysis failed for call recording: {call_recording_id}")
             # Continue processing even if sentiment analysis fails
         
+        # The duration is known once transcribed; re-route the summary if it could not be probed
+        if route['duration_seconds'] is None and call_recording.duration:
+            route['summary'] = routing_policy.summary_path(
+                call_recording.duration.total_seconds(), route['backlog']
+            )
+            call_recording.routing = route
+            call_recording.save()
+        
         # Step 3: Summarization
-        logger.info(f"Starting summarization for call recording: {call_recording_id}")
+        logger.info(f"Starting {route['summary']} summarization for call recording: {call_recording_id}")
         summarization_service = SummarizationService()
-        summary = summarization_service.summarize(call_recording)
+        services.append(summarization_service)
+        if route['summary'] == SUMMARY_TEMPLATE:
+            summary = summarization_service.template_summary(call_recording)
+        else:
+            defer_performance = DEFERRABLE_PERFORMANCE in route.get('deferred', [])
+            summary = summarization_service.summarize(
+                call_recording,
+                single_pass=route['summary'] == SUMMARY_SINGLE_PASS,
+                force=force,
+                defer_performance=defer_performance
+            )
+            # Backfilled by dispatch_deferred_performance once the backlog drains
+            call_recording.performance_deferred = bool(summary) and defer_performance
         
         if not summary:
             logger.error(f"Summarization failed for call recording: {call_recording_id}")
@@ -73,4 +113,108 @@ def process_call_recording_async(call_recording_id):
             call_recording.status = 'failed'
             call_recording.save()
         except:
-            pass
\ No newline at end of file
+            pass
+    finally:
+        for service in services:
+            service.release_models()
+
+
+@shared_task
+def fingerprint_call_recording_async(call_recording_id):
+    """
+    Fingerprint a new upload and look for processed calls that sound like it.
+    
+    A call with near duplicates stays pending with the matches in
+    `near_duplicates` until the user reuses one of them or processes it;
+    any other call is processed right away in this task, so an upload only
+    waits in the queue once.
+    
+    Args:
+        call_recording_id: ID of the CallRecording to fingerprint
+    """
+    try:
+        call_recording = CallRecording.objects.get(id=call_recording_id)
+        fingerprint_service = FingerprintService()
+        matches = []
+        if fingerprint_service.fingerprint(call_recording) is not None:
+            matches = fingerprint_service.find_near_duplicates(call_recording)
+        
+        # The user may have started processing while the call was fingerprinted
+        call_recording.refresh_from_db(fields=['status'])
+        if call_recording.status != 'pending':
+            return
+        
+        if matches:
+            logger.info(f"Call recording {call_recording_id} has {len(matches)} near duplicates")
+            call_recording.near_duplicates = [
+                {'id': recording.id, 'title': recording.title, 'score': round(score, 3)}
+                for recording, score in matches
+            ]
+            call_recording.save(update_fields=['near_duplicates'])
+            return
+        
+    except CallRecording.DoesNotExist:
+        logger.error(f"Call recording {call_recording_id} not found for fingerprinting")
+        return
+    except Exception as e:
+        logger.error(f"Error fingerprinting call recording {call_recording_id}: {str(e)}")
+    
+    process_call_recording_async(call_recording_id)
+
+
+@shared_task
+def backfill_performance_async(call_recording_id):
+    """
+    Run the performance analysis that was deferred while the system was degraded.
+    
+    Args:
+        call_recording_id: ID of the CallRecording to analyze
+    """
+    summarization_service = None
+    try:
+        call_recording = CallRecording.objects.get(id=call_recording_id)
+        if not call_recording.performance_deferred:
+            return
+        
+        logger.info(f"Backfilling performance analysis for call recording: {call_recording_id}")
+        summarization_service = SummarizationService()
+        if summarization_service.analyze_performance(call_recording):
+            call_recording.performance_deferred = False
+            call_recording.save(update_fields=['performance_deferred'])
+        
+    except Exception as e:
+        logger.error(f"Error backfilling performance analysis for {call_recording_id}: {str(e)}")
+    finally:
+        if summarization_service:
+            summarization_service.release_models()
+
+
+@shared_task
+def dispatch_deferred_performance():
+    """
+    Periodically queue deferred performance analyses once the backlog has drained.
+    """
+    controller = DegradationController()
+    if not controller.can_backfill(controller.queue_depth()):
+        return
+    # Wait for the previous backfill batch to be picked up before queuing more
+    if get_queue_depth(settings.DEGRADATION_BACKFILL_QUEUE) != 0:
+        return
+    
+    call_recording_ids = list(
+        CallRecording.objects.filter(performance_deferred=True, status='processed')
+        .order_by('created_at')
+        .values_list('id', flat=True)[:settings.DEGRADATION_BACKFILL_BATCH]
+    )
+    for call_recording_id in call_recording_ids:
+        backfill_performance_async.delay(call_recording_id)
+    if call_recording_ids:
+        logger.info(f"Queued {len(call_recording_ids)} deferred performance analyses")
+
+
+@shared_task
+def evict_feature_store():
+    """
+    Daily retention pass over the stored audio features.
+    """
+    return evict_features()
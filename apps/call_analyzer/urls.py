@@ -5,5 +5,6 @@ urlpatterns = [
     path('', views.call_list, name='call_list'),
     path('<int:pk>/', views.call_detail, name='call_detail'),
     path('upload/', views.call_upload, name='call_upload'),
+    path('<int:pk>/resolve-duplicate/', views.call_resolve_duplicate, name='call_resolve_duplicate'),
     path('<int:pk>/generate-email/', views.generate_email, name='generate_email')
 ]
\ No newline at end of file
@@ -25,11 +25,26 @@ from .models import CallRecording, Transcription, CallSummary, SentimentAnalysis
 from .services.transcription import TranscriptionService
 from .services.sentiment import SentimentAnalysisService
 from .services.summarization import SummarizationService
-from .tasks import process_call_recording_async
+from .services.deduplication import DeduplicationService
+from .tasks import fingerprint_call_recording_async, process_call_recording_async
 from apps.email_generator.models import EmailTemplate
+from apps.core.uploads import get_upload_hash
+from apps.core.utils import parse_bool
 
 logger = logging.getLogger(__name__)
 
+
+def start_processing(call_recording):
+    """
+    Queue a new upload. With fingerprinting on, the same task fingerprints it
+    first, and one that sounds like a processed call waits for the user's choice.
+    """
+    if settings.FINGERPRINT_ENABLED:
+        fingerprint_call_recording_async.delay(call_recording.id)
+    else:
+        process_call_recording_async.delay(call_recording.id)
+
+
 class CallRecordingViewSet(viewsets.ModelViewSet):
     """
     API endpoint for call recordings.
@@ -54,6 +69,10 @@ class CallRecordingViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """
         When a new call recording is uploaded, save it and start processing.
+        
+        If it sounds like a recording that was already processed, it stays
+        pending and the recording lists the matches in `near_duplicates` once
+        fingerprinted, so the client can either `reuse` one of them or `process`.
         """
         # Validate file size
         file = self.request.FILES.get('file')
@@ -68,18 +87,46 @@ class CallRecordingViewSet(viewsets.ModelViewSet):
         call_recording = serializer.save(
             user=self.request.user,
             organization=self.request.user.profile.organization if hasattr(self.request.user, 'profile') else None,
-            status='pending'
+            status='pending',
+            content_hash=get_upload_hash(self.request) or ''
         )
         
-        # Start async processing
-        process_call_recording_async.delay(call_recording.id)
+        # Start async processing, unless an identical recording was already analyzed
+        if DeduplicationService().reuse_analysis(call_recording):
+            return call_recording
+        
+        # Offer reusing the results of a re-encoded or trimmed copy instead of processing
+        start_processing(call_recording)
         
         return call_recording
     
+    @action(detail=True, methods=['post'])
+    def reuse(self, request, pk=None):
+        """
+        Reuse the analysis of a near-duplicate recording (`source`) instead of processing this one.
+        """
+        call_recording = self.get_object()
+        
+        if call_recording.status != 'pending':
+            return Response(
+                {"detail": "Only pending calls can reuse another call's analysis."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        source = CallRecording.objects.filter(id=request.data.get('source')).first()
+        if source is None or not DeduplicationService().reuse_analysis(call_recording, original=source):
+            return Response(
+                {"detail": "The analysis of that call cannot be reused."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({"detail": "Analysis reused."})
+    
     @action(detail=True, methods=['post'])
     def process(self, request, pk=None):
         """
         Manually trigger processing for a call recording.
+        Pass force=true to regenerate LLM outputs instead of reusing cached ones.
         """
         call_recording = self.get_object()
         
@@ -92,10 +139,12 @@ class CallRecordingViewSet(viewsets.ModelViewSet):
         
         # Start processing
         call_recording.status = 'processing'
+        call_recording.near_duplicates = []
         call_recording.save()
         
         # Start async task
-        process_call_recording_async.delay(call_recording.id)
+        force = parse_bool(request.data.get('force', request.query_params.get('force', False)))
+        process_call_recording_async.delay(call_recording.id, force=force)
         
         return Response({"detail": "Processing started."})
     
@@ -276,13 +325,53 @@ def call_detail(request, pk):
         messages.error(request, "You do not have permission to view this call.")
         return redirect('call_list')
     
+    # Matches stored by fingerprint_call_recording_async, for the user to choose from
+    near_duplicates = []
+    if call.status == 'pending' and call.near_duplicates:
+        recordings = CallRecording.objects.in_bulk([match['id'] for match in call.near_duplicates])
+        near_duplicates = [(recordings[match['id']], match['score'])
+                           for match in call.near_duplicates if match['id'] in recordings]
+    
     context = {
-        'call': call
+        'call': call,
+        'near_duplicates': near_duplicates
     }
     
     return render(request, 'call_analyzer/call_detail.html', context)
 
 
+@login_required
+def call_resolve_duplicate(request, pk):
+    """
+    View to reuse the analysis of a near-duplicate call, or process the call anyway.
+    """
+    call = get_object_or_404(CallRecording, pk=pk)
+    
+    # Check permission
+    if not request.user.is_staff and call.user != request.user:
+        messages.error(request, "You do not have permission to modify this call.")
+        return redirect('call_list')
+    
+    if request.method != 'POST' or call.status != 'pending':
+        return redirect('call_detail', pk=call.id)
+    
+    source = CallRecording.objects.filter(id=request.POST.get('source')).first()
+    if source is not None:
+        if DeduplicationService().reuse_analysis(call, original=source):
+            messages.success(request, f"Reused the analysis of {source.title}.")
+            return redirect('call_detail', pk=call.id)
+        messages.error(request, "The analysis of that call cannot be reused.")
+        return redirect('call_detail', pk=call.id)
+    
+    # Mark the call before queuing it, so a repeated submission does not queue it twice
+    call.status = 'processing'
+    call.near_duplicates = []
+    call.save()
+    process_call_recording_async.delay(call.id)
+    messages.success(request, "Call recording is being processed.")
+    return redirect('call_detail', pk=call.id)
+
+
 @login_required
 def call_upload(request):
     """
@@ -315,11 +404,17 @@ def call_upload(request):
             file=file,
             user=request.user,
             organization=request.user.profile.organization if hasattr(request.user, 'profile') else None,
-            status='pending'
+            status='pending',
+            content_hash=get_upload_hash(request) or ''
         )
         
-        # Start async processing
-        process_call_recording_async.delay(call.id)
+        # Start async processing, unless an identical recording was already analyzed
+        if DeduplicationService().reuse_analysis(call):
+            messages.success(request, "This recording was already analyzed; its results have been reused.")
+            return redirect('call_detail', pk=call.id)
+        
+        # Offer reusing the results of a re-encoded or trimmed copy instead of processing
+        start_processing(call)
         
         messages.success(request, "Call recording uploaded successfully and is being processed.")
         return redirect('call_detail', pk=call.id)
@@ -357,13 +452,17 @@ def generate_email(request, pk):
         # Generate the email
         from apps.email_generator.services.generator import EmailGenerationService
         service = EmailGenerationService()
-        email = service.generate_email(
-            call_recording=call,
-            tone=tone,
-            user=request.user,
-            organization=request.user.profile.organization if hasattr(request.user, 'profile') else None,
-            template=template
-        )
+        try:
+            email = service.generate_email(
+                call_recording=call,
+                tone=tone,
+                user=request.user,
+                organization=request.user.profile.organization if hasattr(request.user, 'profile') else None,
+                template=template,
+                force=parse_bool(request.POST.get('force', False))
+            )
+        finally:
+            service.release_models()
         
         if not email:
             messages.error(request, "Failed to generate email. Please try again.")
@@ -0,0 +1,100 @@
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.core.services.llm import BACKENDS
+
+BENCHMARK_PROMPT = (
+    "Summarize this sales call transcript: Hi, this is Sam from Acme. Thanks for taking the time today. "
+    "I wanted to walk you through how our platform reduces onboarding time for new sales reps, and hear "
+    "about the challenges your team is facing with ramp-up and call coaching.\n\nSummary:"
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare LLM inference backends by decode throughput and resident memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', default='torch,torch-int8,onnx',
+                            help=f"Comma-separated backends to compare ({', '.join(BACKENDS)})")
+        parser.add_argument('--model', default=settings.OPEN_SOURCE_LLM_MODEL, help='LLM to benchmark')
+        parser.add_argument('--runs', type=int, default=3, help='Timed generations per backend')
+        parser.add_argument('--max-new-tokens', type=int, default=128, help='Tokens generated per run')
+        parser.add_argument('--json', action='store_true', help='Print one JSON result per backend')
+
+    def handle(self, *args, **options):
+        backends = [backend for backend in options['backends'].split(',') if backend]
+
+        if len(backends) == 1:
+            result = self._benchmark(backends[0], options)
+            if options['json']:
+                self.stdout.write(json.dumps(result))
+            else:
+                self._print_table([result])
+            return
+
+        # Each backend runs in a fresh process so RSS is not shared between them
+        results = []
+        for backend in backends:
+            command = [
+                sys.executable, sys.argv[0], 'benchmark_llm',
+                '--backends', backend,
+                '--model', options['model'],
+                '--runs', str(options['runs']),
+                '--max-new-tokens', str(options['max_new_tokens']),
+                '--json',
+            ]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                self.stderr.write(f"Benchmark of {backend} failed:\n{completed.stderr}")
+                continue
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+        if options['json']:
+            for result in results:
+                self.stdout.write(json.dumps(result))
+        else:
+            self._print_table(results)
+
+    def _benchmark(self, backend, options):
+        """Load the model with one backend and time greedy generations."""
+        from apps.core.services.generation import GenerationEngine
+
+        started = time.perf_counter()
+        engine = GenerationEngine(options['model'], dtype=settings.LLM_DTYPE, device=settings.LLM_DEVICE,
+                                  backend=backend)
+        load_seconds = time.perf_counter() - started
+
+        # Warm-up run, excluded from the timings
+        engine.generate(BENCHMARK_PROMPT, force=True, stage='warmup', max_new_tokens=8, do_sample=False)
+        for _ in range(options['runs']):
+            engine.generate(BENCHMARK_PROMPT, force=True, stage='benchmark',
+                            max_new_tokens=options['max_new_tokens'], do_sample=False)
+
+        stats = engine.stats()['stages']['benchmark']
+        return {
+            'requested_backend': backend,
+            'backend': engine.backend,
+            'load_seconds': round(load_seconds, 1),
+            'tokens_per_second': round(stats['generated_tokens'] / stats['seconds'], 2) if stats['seconds'] else 0,
+            'peak_rss_mb': round(self._peak_rss_mb(), 1),
+        }
+
+    def _peak_rss_mb(self):
+        """Peak resident set size of this process in MB."""
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+    def _print_table(self, results):
+        self.stdout.write(f"{'backend':<12} {'loaded as':<12} {'load s':>8} {'tokens/s':>10} {'peak RSS MB':>12}")
+        for result in results:
+            self.stdout.write(
+                f"{result['requested_backend']:<12} {result['backend']:<12} {result['load_seconds']:>8} "
+                f"{result['tokens_per_second']:>10} {result['peak_rss_mb']:>12}"
+            )
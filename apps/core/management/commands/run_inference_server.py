@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.core.services.generation import GenerationEngine
+from apps.core.services.inference_server import InferenceServer
+
+
+class Command(BaseCommand):
+    help = 'Run the shared local LLM inference server used by all workers on this node'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=settings.LLM_SERVER_HOST, help='Interface to bind')
+        parser.add_argument('--port', type=int, default=settings.LLM_SERVER_PORT, help='Port to bind')
+        parser.add_argument('--model', default=settings.OPEN_SOURCE_LLM_MODEL, help='LLM to serve')
+        parser.add_argument('--max-batch-size', type=int, default=settings.LLM_SERVER_MAX_BATCH_SIZE,
+                            help='Prompts generated together in one batch')
+        parser.add_argument('--batch-window-ms', type=int, default=settings.LLM_SERVER_BATCH_WINDOW_MS,
+                            help='How long to wait for more requests before running a batch')
+
+    def handle(self, *args, **options):
+        engine = GenerationEngine(options['model'], dtype=settings.LLM_DTYPE, device=settings.LLM_DEVICE)
+        server = InferenceServer(
+            engine,
+            options['host'],
+            options['port'],
+            max_batch_size=options['max_batch_size'],
+            batch_window_ms=options['batch_window_ms']
+        )
+        self.stdout.write(f"Serving {options['model']} on {options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Inference server stopped')
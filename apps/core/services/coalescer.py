@@ -0,0 +1,211 @@
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from django.conf import settings
+
+from apps.core.services.generation import BaseGenerationEngine, GenerationEngine, Prompt
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    """
+    A generate() call waiting for the scheduler, with its result slots.
+    """
+
+    def __init__(self, prompts: List[Prompt], kwargs: Dict[str, Any]):
+        self.prompts = prompts
+        self.kwargs = kwargs
+        # Only calls with identical generation settings can share a batch
+        self.batch_key = json.dumps(kwargs, sort_keys=True, default=str)
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.texts: List[Optional[str]] = [None] * len(prompts)
+        self.error: Optional[Exception] = None
+
+
+class RequestCoalescer(BaseGenerationEngine):
+    """
+    Micro-batching front-end of a generation engine.
+
+    Concurrent generate() calls are queued; a scheduler thread collects the
+    calls arriving within `window_ms` (up to `max_batch_size` prompts),
+    groups those with identical generation settings, buckets their prompts
+    by token length and runs one batched `engine.generate` per bucket.
+    Each caller blocks until its own prompts are done.
+    """
+
+    def __init__(self, engine: GenerationEngine, window_ms: Optional[int] = None,
+                 max_batch_size: Optional[int] = None, bucket_tokens: Optional[int] = None):
+        """
+        Args:
+            engine: Engine running the batches
+            window_ms: How long to wait for further calls before running a batch.
+                       Defaults to settings.LLM_COALESCE_WINDOW_MS.
+            max_batch_size: Prompts per batch. Defaults to settings.LLM_COALESCE_MAX_BATCH_SIZE.
+            bucket_tokens: Width of the prompt length buckets. Defaults to
+                           settings.LLM_COALESCE_BUCKET_TOKENS.
+        """
+        super().__init__(engine.tokenizer)
+        self.engine = engine
+        self.model_name = engine.model_name
+        self.window = (settings.LLM_COALESCE_WINDOW_MS if window_ms is None else window_ms) / 1000.0
+        self.max_batch_size = max_batch_size or settings.LLM_COALESCE_MAX_BATCH_SIZE
+        self.bucket_tokens = bucket_tokens or settings.LLM_COALESCE_BUCKET_TOKENS
+
+        self._queue: "queue.Queue[Optional[_PendingRequest]]" = queue.Queue()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self.requests_served = 0
+        self.batches_run = 0
+        self.prompts_generated = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+        threading.Thread(target=self._schedule, name='llm-coalescer', daemon=True).start()
+
+    def generate(self, prompts: Union[Prompt, List[Prompt]], batch_size: Optional[int] = None,
+                 **kwargs) -> List[str]:
+        """
+        Queue prompts for the next batch and wait for their completions.
+
+        Same interface as `GenerationEngine.generate`; `batch_size` is
+        ignored in favour of `max_batch_size`.
+        """
+        if isinstance(prompts, str) or (prompts and isinstance(prompts[0], int)):
+            prompts = [prompts]
+        if not prompts:
+            return []
+        if self._closed:
+            raise RuntimeError(f"Request coalescer for {self.model_name} is closed")
+
+        request = _PendingRequest(list(prompts), kwargs)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.texts
+
+    def close(self) -> None:
+        """
+        Stop the scheduler thread once the calls already queued are done.
+
+        The thread holds the engine, so its model is only freed after this.
+        """
+        self._closed = True
+        self._queue.put(None)
+
+    def _schedule(self) -> None:
+        """Collect queued calls into batches and run them, until closed."""
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                break
+            pending = [request]
+            prompt_count = len(request.prompts)
+            deadline = time.monotonic() + self.window
+
+            while prompt_count < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                pending.append(request)
+                prompt_count += len(request.prompts)
+
+            self._record_wait(pending)
+
+            groups: Dict[str, List[_PendingRequest]] = {}
+            for request in pending:
+                groups.setdefault(request.batch_key, []).append(request)
+            for group in groups.values():
+                try:
+                    self._run(group)
+                except Exception as e:
+                    logger.error(f"Error scheduling coalesced batch: {str(e)}")
+                    for request in group:
+                        request.error = request.error or e
+                finally:
+                    for request in group:
+                        request.done.set()
+
+        # Calls that raced with close()
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.error = RuntimeError(f"Request coalescer for {self.model_name} is closed")
+                request.done.set()
+        logger.info(f"Request coalescer for {self.model_name} stopped")
+
+    def _run(self, group: List[_PendingRequest]) -> None:
+        """Generate the prompts of calls with identical settings, one batch per length bucket."""
+        buckets: Dict[int, list] = {}
+        for request in group:
+            for index, prompt in enumerate(request.prompts):
+                bucket = self._prompt_length(prompt) // self.bucket_tokens
+                buckets.setdefault(bucket, []).append((request, index, prompt))
+
+        kwargs = group[0].kwargs
+        for bucket in buckets.values():
+            try:
+                texts = self.engine.generate(
+                    [prompt for _, _, prompt in bucket],
+                    batch_size=self.max_batch_size,
+                    **kwargs
+                )
+            except Exception as e:
+                logger.error(f"Error generating coalesced batch of {len(bucket)} prompts: {str(e)}")
+                for request, _, _ in bucket:
+                    request.error = e
+                continue
+
+            for (request, index, _), text in zip(bucket, texts):
+                request.texts[index] = text
+            with self._stats_lock:
+                self.batches_run += 1
+                self.prompts_generated += len(bucket)
+
+        logger.debug(f"Coalesced {len(group)} calls into {len(buckets)} length buckets")
+
+    def _prompt_length(self, prompt: Prompt) -> int:
+        if isinstance(prompt, str):
+            return len(self.tokenizer(prompt, add_special_tokens=False)['input_ids'])
+        return len(prompt)
+
+    def _record_wait(self, pending: List[_PendingRequest]) -> None:
+        """Account the time each call spent queued before its batch started."""
+        now = time.monotonic()
+        waits = [now - request.enqueued_at for request in pending]
+        with self._stats_lock:
+            self.requests_served += len(pending)
+            self.total_wait += sum(waits)
+            self.max_wait = max([self.max_wait] + waits)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the batching metrics and the engine's stats."""
+        with self._stats_lock:
+            batching = {
+                'queued': self._queue.qsize(),
+                'requests_served': self.requests_served,
+                'batches_run': self.batches_run,
+                'avg_batch_prompts': self.prompts_generated / self.batches_run if self.batches_run else 0,
+                'batch_fill_rate': (self.prompts_generated / (self.batches_run * self.max_batch_size)
+                                    if self.batches_run else 0),
+                'avg_wait_ms': 1000 * self.total_wait / self.requests_served if self.requests_served else 0,
+                'max_wait_ms': 1000 * self.max_wait,
+            }
+        return dict(self.engine.stats(), coalescer=batching)
@@ -0,0 +1,312 @@
+import logging
+from typing import Any, Dict, List
+
+import torch
+from transformers import LogitsProcessor, LogitsProcessorList
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = ' \t\n\r'
+# Longest whitespace run allowed between JSON tokens, so decoding cannot stall on blank lines
+MAX_WHITESPACE_RUN = 12
+# Candidates checked per step before looking further down the ranking
+DEFAULT_TOP_K = 64
+# Give up (and end the sequence) if no valid token is among this many candidates
+MAX_CANDIDATES = 2048
+
+
+class SchemaMatcher:
+    """
+    Character-level matcher for a JSON object with a fixed set of properties.
+
+    Supports the subset of JSON schema the LLM services declare: an object
+    whose properties are all required and emitted in declared order, with
+    values that are strings, integers (with minimum/maximum) or arrays of
+    strings (with maxItems). Strings may set maxLength.
+    """
+
+    _WHITESPACE_PHASES = {'start', 'before_key', 'colon', 'value', 'array_open',
+                          'array_after_item', 'array_after_comma', 'after_value'}
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.fields = list(schema['properties'].items())
+        self.phase = 'start'
+        self.field = 0
+        self.key_pos = 0
+        self.whitespace = 0
+        self.items = 0
+        self.length = 0
+        self.escaped = False
+        self.number = ''
+        self.in_array = False
+
+    def copy(self) -> 'SchemaMatcher':
+        matcher = SchemaMatcher.__new__(SchemaMatcher)
+        matcher.__dict__.update(self.__dict__)
+        return matcher
+
+    @property
+    def complete(self) -> bool:
+        return self.phase == 'done'
+
+    @property
+    def _spec(self) -> Dict[str, Any]:
+        return self.fields[self.field][1]
+
+    def feed_text(self, text: str) -> bool:
+        """Feed several characters; returns False as soon as one is invalid."""
+        for char in text:
+            if not self.feed(char):
+                return False
+        return True
+
+    def feed(self, char: str) -> bool:
+        """
+        Advance by one character.
+
+        Returns:
+            True if the text so far is still a valid prefix of a matching object
+        """
+        if self.phase == 'integer':
+            if char.isdigit():
+                return self._feed_digit(char)
+            if not self._finish_integer():
+                return False
+            self.phase = 'after_value'
+
+        if char in WHITESPACE and self.phase in self._WHITESPACE_PHASES:
+            self.whitespace += 1
+            return self.whitespace <= MAX_WHITESPACE_RUN
+        self.whitespace = 0
+
+        handler = getattr(self, f"_feed_{self.phase}")
+        return handler(char)
+
+    def _feed_start(self, char: str) -> bool:
+        if char != '{':
+            return False
+        self.phase = 'before_key'
+        return True
+
+    def _feed_before_key(self, char: str) -> bool:
+        if char != '"':
+            return False
+        self.phase = 'key'
+        self.key_pos = 0
+        return True
+
+    def _feed_key(self, char: str) -> bool:
+        name = self.fields[self.field][0]
+        if self.key_pos < len(name):
+            if char != name[self.key_pos]:
+                return False
+            self.key_pos += 1
+            return True
+        if char != '"':
+            return False
+        self.phase = 'colon'
+        return True
+
+    def _feed_colon(self, char: str) -> bool:
+        if char != ':':
+            return False
+        self.phase = 'value'
+        return True
+
+    def _feed_value(self, char: str) -> bool:
+        value_type = self._spec.get('type')
+        if value_type == 'array' and char == '[':
+            self.phase = 'array_open'
+            self.items = 0
+            return True
+        if value_type == 'string' and char == '"':
+            self._start_string(in_array=False)
+            return True
+        if value_type == 'integer' and char.isdigit():
+            self.phase = 'integer'
+            self.number = ''
+            return self._feed_digit(char)
+        return False
+
+    def _feed_digit(self, char: str) -> bool:
+        if self.number == '0':
+            return False  # no leading zeros
+        number = self.number + char
+        maximum = self._spec.get('maximum')
+        if maximum is not None and int(number) > maximum:
+            return False
+        self.number = number
+        return True
+
+    def _finish_integer(self) -> bool:
+        minimum = self._spec.get('minimum')
+        return minimum is None or int(self.number) >= minimum
+
+    def _start_string(self, in_array: bool) -> None:
+        self.phase = 'string'
+        self.in_array = in_array
+        self.length = 0
+        self.escaped = False
+
+    def _string_spec(self) -> Dict[str, Any]:
+        return self._spec.get('items', {}) if self.in_array else self._spec
+
+    def _feed_string(self, char: str) -> bool:
+        if self.escaped:
+            self.escaped = False
+            if char not in '"\\/bfnrt':
+                return False
+        elif char == '\\':
+            self.escaped = True
+            return True
+        elif char == '"':
+            if self.in_array:
+                self.items += 1
+                self.phase = 'array_after_item'
+            else:
+                self.phase = 'after_value'
+            return True
+        elif ord(char) < 0x20:
+            return False
+
+        self.length += 1
+        max_length = self._string_spec().get('maxLength')
+        return max_length is None or self.length <= max_length
+
+    def _feed_array_open(self, char: str) -> bool:
+        if char == '"':
+            self._start_string(in_array=True)
+            return True
+        if char == ']':
+            self.phase = 'after_value'
+            return True
+        return False
+
+    def _feed_array_after_item(self, char: str) -> bool:
+        if char == ',':
+            max_items = self._spec.get('maxItems')
+            if max_items is not None and self.items >= max_items:
+                return False
+            self.phase = 'array_after_comma'
+            return True
+        if char == ']':
+            self.phase = 'after_value'
+            return True
+        return False
+
+    def _feed_array_after_comma(self, char: str) -> bool:
+        if char != '"':
+            return False
+        self._start_string(in_array=True)
+        return True
+
+    def _feed_after_value(self, char: str) -> bool:
+        last_field = self.field == len(self.fields) - 1
+        if char == ',' and not last_field:
+            self.field += 1
+            self.phase = 'before_key'
+            return True
+        if char == '}' and last_field:
+            self.phase = 'done'
+            return True
+        return False
+
+    def _feed_done(self, char: str) -> bool:
+        return False
+
+
+class JsonSchemaLogitsProcessor(LogitsProcessor):
+    """
+    Masks every token that would take the generated text outside the schema.
+
+    Each sequence keeps an incremental SchemaMatcher; at every step the
+    top-ranked candidates are checked against a copy of it and all other
+    tokens are masked. Once the object is complete only EOS is allowed.
+
+    The matcher state after every generated token is kept, so a call whose
+    tokens diverge from the previous one (assisted decoding scores draft
+    tokens that may then be rejected) resumes from the longest shared prefix.
+    """
+
+    def __init__(self, tokenizer, schema: Dict[str, Any], prompt_length: int, top_k: int = DEFAULT_TOP_K):
+        self.tokenizer = tokenizer
+        self.schema = schema
+        self.prompt_length = prompt_length
+        self.top_k = top_k
+        self.eos_token_id = tokenizer.eos_token_id
+        # Per row: the generated tokens seen so far, and the matcher state before each and after the last
+        self._tokens: Dict[int, List[int]] = {}
+        self._states: Dict[int, List[SchemaMatcher]] = {}
+        self._pieces: Dict[int, str] = {}
+
+    def _piece(self, token_id: int) -> str:
+        """Text of a single token; special tokens decode to ''."""
+        piece = self._pieces.get(token_id)
+        if piece is None:
+            piece = self.tokenizer.decode([token_id], skip_special_tokens=True)
+            self._pieces[token_id] = piece
+        return piece
+
+    def _matcher(self, row: int, generated: List[int]) -> SchemaMatcher:
+        """The row's matcher after `generated`, resumed from the longest prefix already matched."""
+        tokens = self._tokens.setdefault(row, [])
+        states = self._states.setdefault(row, [SchemaMatcher(self.schema)])
+
+        shared = 0
+        for seen, token_id in zip(tokens, generated):
+            if seen != token_id:
+                break
+            shared += 1
+        del tokens[shared:]
+        del states[shared + 1:]
+
+        # Tokens from EOS on are padding and leave the state unchanged
+        ended = self.eos_token_id in tokens
+        for token_id in generated[shared:]:
+            matcher = states[-1].copy()
+            ended = ended or token_id == self.eos_token_id
+            if not ended:
+                matcher.feed_text(self._piece(token_id))
+            tokens.append(token_id)
+            states.append(matcher)
+        return states[-1]
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        masked = torch.full_like(scores, float('-inf'))
+
+        for row in range(input_ids.shape[0]):
+            matcher = self._matcher(row, input_ids[row, self.prompt_length:].tolist())
+
+            allowed = []
+            if not matcher.complete:
+                ranking = torch.argsort(scores[row], descending=True)
+                for start in range(0, min(len(ranking), MAX_CANDIDATES), self.top_k):
+                    for token_id in ranking[start:start + self.top_k].tolist():
+                        piece = self._piece(token_id)
+                        if piece and matcher.copy().feed_text(piece):
+                            allowed.append(token_id)
+                    if allowed:
+                        break
+                if not allowed:
+                    logger.warning("No schema-valid token among the top candidates; ending sequence")
+
+            if not allowed:
+                allowed = [self.eos_token_id]
+            masked[row, allowed] = scores[row, allowed]
+
+        return masked
+
+
+def build_logits_processor(tokenizer, schema: Dict[str, Any], prompt_length: int) -> LogitsProcessorList:
+    """
+    Build the schema-constrained logits processor for one generation batch.
+
+    Args:
+        tokenizer: Tokenizer used to decode candidate tokens
+        schema: Declared JSON schema of the output
+        prompt_length: Length of the (padded) prompt in the batch
+
+    Returns:
+        LogitsProcessorList for `model.generate`
+    """
+    return LogitsProcessorList([JsonSchemaLogitsProcessor(tokenizer, schema, prompt_length)])
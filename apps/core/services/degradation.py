@@ -0,0 +1,48 @@
+import logging
+from typing import Optional
+
+from django.conf import settings
+
+from apps.core.services.queues import get_queue_depth
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages that can be deferred under load and backfilled later
+DEFERRABLE_PERFORMANCE = 'performance'
+DEFERRABLE_EMAIL_FEEDBACK = 'email_feedback'
+
+
+class DegradationController:
+    """
+    Backlog-aware load shedding.
+
+    While the processing queue holds at least settings.DEGRADATION_HIGH_WATERMARK
+    tasks, optional LLM stages are deferred and calls use a smaller Whisper
+    model. Deferred stages are backfilled once the queue has drained to
+    settings.DEGRADATION_LOW_WATERMARK or less.
+    """
+
+    def __init__(self, queue_name: Optional[str] = None):
+        """
+        Args:
+            queue_name: Celery queue whose depth measures load.
+                        Defaults to settings.DEGRADATION_QUEUE_NAME.
+        """
+        self.queue_name = queue_name or settings.DEGRADATION_QUEUE_NAME
+
+    def queue_depth(self) -> Optional[int]:
+        """Current number of waiting tasks, or None if unknown."""
+        return get_queue_depth(self.queue_name)
+
+    def is_degraded(self, depth: Optional[int]) -> bool:
+        """Whether optional stages should be deferred at this queue depth."""
+        if not settings.DEGRADATION_ENABLED or depth is None:
+            return False
+        degraded = depth >= settings.DEGRADATION_HIGH_WATERMARK
+        if degraded:
+            logger.info(f"Degraded mode: {depth} tasks waiting in {self.queue_name}")
+        return degraded
+
+    def can_backfill(self, depth: Optional[int]) -> bool:
+        """Whether deferred stages may be re-queued at this queue depth."""
+        return depth is not None and depth <= settings.DEGRADATION_LOW_WATERMARK
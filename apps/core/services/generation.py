@@ -0,0 +1,502 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union
+
+import torch
+from django.conf import settings
+
+try:
+    from transformers import DynamicCache
+except ImportError:  # transformers < 4.36 uses tuples of tensors
+    DynamicCache = None
+
+from apps.core.services.constrained import build_logits_processor
+from apps.core.services.llm import load_causal_lm
+from apps.core.services.model_registry import model_registry
+from apps.core.services.response_cache import get_response_cache, make_cache_key
+from apps.core.services.stopping import build_stopping_criteria, trim_completed
+
+logger = logging.getLogger(__name__)
+
+# A prompt is either text or a list of token IDs
+Prompt = Union[str, List[int]]
+
+# Number of tokenized prompt fragments kept per engine
+ENCODE_CACHE_SIZE = 256
+
+
+class BaseGenerationEngine(ABC):
+    """
+    Base class of the in-process and remote generation engines.
+
+    Prompts are assembled here from cached token IDs of their fragments, so
+    only the tokenizer is needed; the model may live in another process.
+    """
+
+    def __init__(self, tokenizer):
+        """
+        Prepare the tokenizer for batched generation.
+
+        Args:
+            tokenizer: Tokenizer of the LLM
+        """
+        self.tokenizer = tokenizer
+
+        # Decoder-only models need left padding so every prompt ends at the
+        # same position and generation continues directly after it
+        self.tokenizer.padding_side = 'left'
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        self._encode_cache: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._encode_lock = threading.Lock()
+
+    def encode(self, text: str) -> List[int]:
+        """
+        Tokenize a prompt fragment without special tokens.
+
+        Static fragments such as instruction text are cached, so repeated
+        prompts only pay for tokenizing their variable parts.
+        """
+        with self._encode_lock:
+            if text in self._encode_cache:
+                self._encode_cache.move_to_end(text)
+                return self._encode_cache[text]
+
+        token_ids = self.tokenizer(text, add_special_tokens=False)['input_ids']
+
+        with self._encode_lock:
+            self._encode_cache[text] = token_ids
+            while len(self._encode_cache) > ENCODE_CACHE_SIZE:
+                self._encode_cache.popitem(last=False)
+        return token_ids
+
+    def build_prompt(self, *parts: Union[str, List[int]]) -> List[int]:
+        """
+        Assemble a tokenized prompt from text fragments and already tokenized parts.
+
+        Args:
+            *parts: Prompt fragments, either text or lists of token IDs
+                    (e.g. a cached transcript chunk)
+
+        Returns:
+            Token IDs of the full prompt
+        """
+        prompt_ids: List[int] = []
+        for part in parts:
+            prompt_ids.extend(self.encode(part) if isinstance(part, str) else part)
+        return prompt_ids
+
+    @abstractmethod
+    def generate(self, prompts: Union[Prompt, List[Prompt]], **kwargs) -> List[str]:
+        """Generate a completion for each prompt (see GenerationEngine.generate)."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the engine, for monitoring."""
+
+    def close(self) -> None:
+        """Stop any background work, so the engine can be freed once the registry drops it."""
+
+
+class GenerationEngine(BaseGenerationEngine):
+    """
+    Text generation front-end for one (model, dtype, device) combination.
+
+    The engine is built once per process and shared by every LLM service,
+    so per-call overhead is reduced to tokenization, decoding and the
+    forward passes themselves.
+    """
+
+    def __init__(self, model_name: str, dtype: Optional[str] = None, device: Optional[str] = None,
+                 draft_model_name: Optional[str] = None, backend: Optional[str] = None):
+        """
+        Load the model and prepare the tokenizer for batched generation.
+
+        Args:
+            model_name: Name or path of the open-source LLM to use.
+            dtype: Optional torch dtype name, e.g. 'float32' or 'bfloat16'
+            device: Optional device to place the model on, e.g. 'cpu' or 'cuda'
+            draft_model_name: Smaller model sharing the tokenizer, used for assisted
+                              generation. Defaults to settings.OPEN_SOURCE_LLM_DRAFT_MODEL.
+            backend: Inference backend (see apps.core.services.llm). Defaults to settings.LLM_BACKEND.
+        """
+        self.model_name = model_name
+        self.dtype = dtype
+        self.device = device
+        self.model, tokenizer, self.backend = load_causal_lm(
+            model_name, dtype=dtype, device=device, backend=backend
+        )
+        if hasattr(self.model, 'eval'):
+            self.model.eval()
+        super().__init__(tokenizer)
+
+        # Cached prefix key/values and assisted generation need a PyTorch model
+        self.torch_backend = self.backend != 'onnx'
+
+        # The draft model is loaded on the first assisted generation
+        self.draft_model_name = draft_model_name or settings.OPEN_SOURCE_LLM_DRAFT_MODEL
+        self.draft_model = None
+        self._draft_lock = threading.Lock()
+
+        # Past key/values of static prompt prefixes
+        self._prefix_cache: "OrderedDict[Tuple[int, ...], tuple]" = OrderedDict()
+        self._prefix_lock = threading.Lock()
+        self.prefix_cache_hits = 0
+        self.prefix_cache_misses = 0
+
+        # Token counts per pipeline stage, for tuning the generation budgets
+        self.stage_stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    def generate(self, prompts: Union[Prompt, List[Prompt]], batch_size: Optional[int] = None,
+                 prefix: Optional[Prompt] = None, force: bool = False, stage: Optional[str] = None,
+                 stop: Optional[str] = None, schema: Optional[Dict[str, Any]] = None,
+                 assisted: bool = False, **params) -> List[str]:
+        """
+        Generate a completion for each prompt.
+
+        Prompts are sorted by token length and generated in padded batches
+        of `batch_size`, so each batch pads to similar lengths.
+
+        When a static `prefix` is given, its past key/values are computed
+        once and reused, so prefill only covers the variable part of each
+        prompt. The full prompt is `prefix` followed by the prompt itself.
+
+        Outputs are looked up in and written to the persistent response
+        cache, keyed by model, revision, prompt and generation parameters.
+
+        Decoding is bounded by the stage's `max_new_tokens` budget from
+        settings.LLM_GENERATION_BUDGETS and ends early once the `stop`
+        condition is met; token counts are recorded per stage.
+
+        With a `schema`, decoding is constrained to tokens that keep the
+        output a valid prefix of a JSON object matching it, and ends as soon
+        as the object is closed.
+
+        Decoding is greedy unless `do_sample` is passed. With `assisted`, the
+        draft model proposes tokens that the model verifies in a single
+        forward pass; greedy outputs are identical to unassisted decoding, so
+        cached responses are shared between modes.
+
+        Args:
+            prompts: A prompt or list of prompts, each either text or token IDs
+                     from `build_prompt`
+            batch_size: Prompts per `model.generate` call. Defaults to all at once.
+            prefix: Optional shared instruction text (or token IDs) preceding every prompt
+            force: Skip response cache lookups and regenerate (the cache is still refreshed)
+            stage: Name of the pipeline stage, selecting the token budget and keying the stats
+            stop: JSON_OBJECT or a completion regex (see apps.core.services.stopping)
+            schema: Optional JSON schema the output must match (see apps.core.services.constrained)
+            assisted: Use speculative decoding with the draft model (one sequence at a time)
+            **params: Generation parameters passed through to `model.generate`
+
+        Returns:
+            List with the generated text (prompt excluded) for each prompt, in input order
+        """
+        if isinstance(prompts, str) or (prompts and isinstance(prompts[0], int)):
+            prompts = [prompts]
+        if not prompts:
+            return []
+
+        batch_size = batch_size or len(prompts)
+        params.setdefault('pad_token_id', self.tokenizer.pad_token_id)
+        # Greedy unless sampling is asked for: the checkpoint's generation_config may enable
+        # sampling, and greedy outputs are what the cache and assisted decoding rely on
+        params.setdefault('do_sample', False)
+        if stage in settings.LLM_GENERATION_BUDGETS:
+            params.setdefault('max_new_tokens', settings.LLM_GENERATION_BUDGETS[stage])
+
+        encoded = [
+            self.tokenizer(prompt, add_special_tokens=prefix is None)['input_ids']
+            if isinstance(prompt, str) else list(prompt)
+            for prompt in prompts
+        ]
+        prefix_ids = None
+        if prefix is not None:
+            prefix_ids = self.encode(prefix) if isinstance(prefix, str) else list(prefix)
+
+        results: List[Optional[str]] = [None] * len(prompts)
+        cache_keys = self._lookup_cached(
+            results, encoded, prefix_ids, dict(params, stop=stop, schema=schema), force
+        )
+
+        pending = [i for i in range(len(prompts)) if results[i] is None]
+        order = sorted(pending, key=lambda i: len(encoded[i]))
+
+        draft_model = self._draft() if assisted and pending else None
+        step = 1 if draft_model is not None else batch_size
+
+        for start in range(0, len(order), step):
+            indices = order[start:start + step]
+            batch_params = dict(params)
+
+            if draft_model is not None or not self.torch_backend:
+                # Assisted generation keeps its own caches for both models and
+                # ONNX Runtime its own KV buffers, so the prefix is prefilled
+                # together with the prompt
+                batch = self.tokenizer.pad(
+                    {'input_ids': [(prefix_ids or []) + encoded[i] for i in indices]},
+                    return_tensors='pt'
+                ).to(self.model.device)
+                if draft_model is not None:
+                    batch_params['assistant_model'] = draft_model
+            else:
+                batch = self.tokenizer.pad(
+                    {'input_ids': [encoded[i] for i in indices]},
+                    return_tensors='pt'
+                ).to(self.model.device)
+                if prefix_ids:
+                    batch = self._prepend_prefix(batch, prefix_ids)
+                    batch_params['past_key_values'] = self._expand_past(
+                        self._prefix_state(prefix_ids), len(indices)
+                    )
+
+            started = time.perf_counter()
+            texts, generated_tokens = self._generate_batch(batch, stop=stop, schema=schema, **batch_params)
+            for i, text in zip(indices, texts):
+                results[i] = text
+                self._store_cached(cache_keys[i], text)
+
+            self._record_stage(
+                stage, len(indices),
+                prompt_tokens=sum(len(encoded[i]) + len(prefix_ids or []) for i in indices),
+                generated_tokens=generated_tokens,
+                seconds=time.perf_counter() - started,
+                assisted=draft_model is not None
+            )
+
+        return results
+
+    def _record_stage(self, stage: Optional[str], sequences: int, prompt_tokens: int, generated_tokens: int,
+                      seconds: float, assisted: bool = False) -> None:
+        """
+        Accumulate the token counts and generation time of one batch under its
+        stage name; assisted batches are kept apart to compare decode speed.
+        """
+        stage = stage or 'default'
+        key = f"{stage}:assisted" if assisted else stage
+        with self._stats_lock:
+            stats = self.stage_stats.setdefault(
+                key, {'calls': 0, 'sequences': 0, 'prompt_tokens': 0, 'generated_tokens': 0, 'seconds': 0.0}
+            )
+            stats['calls'] += 1
+            stats['sequences'] += sequences
+            stats['prompt_tokens'] += prompt_tokens
+            stats['generated_tokens'] += generated_tokens
+            stats['seconds'] += seconds
+        logger.info(f"LLM stage {stage}{' (assisted)' if assisted else ''}: {sequences} sequences, "
+                    f"{prompt_tokens} prompt tokens, {generated_tokens} generated tokens in {seconds:.2f}s "
+                    f"({generated_tokens / seconds if seconds else 0:.1f} tokens/s)")
+
+    def _draft(self):
+        """
+        Get the draft model for assisted generation, loading it on first use.
+
+        Returns:
+            The draft model, or None if none is configured, the backend is not
+            PyTorch or it failed to load
+        """
+        if not self.draft_model_name or not self.torch_backend:
+            return None
+        with self._draft_lock:
+            if self.draft_model is None:
+                try:
+                    self.draft_model, _, _ = load_causal_lm(
+                        self.draft_model_name, dtype=self.dtype, device=self.device, backend=self.backend
+                    )
+                    self.draft_model.eval()
+                except Exception as e:
+                    logger.error(f"Error loading draft model {self.draft_model_name}, "
+                                 f"falling back to unassisted generation: {str(e)}")
+                    self.draft_model_name = None
+                    return None
+        return self.draft_model
+
+    def _lookup_cached(self, results: List[Optional[str]], encoded: List[List[int]],
+                       prefix_ids: Optional[List[int]], params: Dict, force: bool) -> List[Optional[str]]:
+        """
+        Fill `results` with cached outputs and return the cache key of every prompt.
+        """
+        cache_keys: List[Optional[str]] = [None] * len(encoded)
+        cache = get_response_cache()
+        if cache is None:
+            return cache_keys
+
+        revision = getattr(self.model.config, '_commit_hash', None)
+        # Outputs differ across backends and precisions, so each has its own entries
+        params = dict(params, backend=self.backend, dtype=str(getattr(self.model, 'dtype', None) or self.dtype))
+        for i, prompt_ids in enumerate(encoded):
+            cache_keys[i] = make_cache_key(self.model_name, revision, (prefix_ids or []) + prompt_ids, params)
+            if force:
+                continue
+            try:
+                results[i] = cache.get(cache_keys[i])
+            except Exception as e:
+                logger.warning(f"LLM response cache lookup failed: {str(e)}")
+
+        hits = sum(1 for result in results if result is not None)
+        if hits:
+            logger.info(f"LLM response cache: {hits}/{len(encoded)} prompts served from cache")
+        return cache_keys
+
+    def _store_cached(self, key: Optional[str], text: str) -> None:
+        """Write one generated output to the response cache."""
+        if key is None:
+            return
+        try:
+            get_response_cache().set(key, text)
+        except Exception as e:
+            logger.warning(f"LLM response cache write failed: {str(e)}")
+
+    def _prefix_state(self, prefix_ids: List[int]):
+        """
+        Get the past key/values of a static prompt prefix, computing them on a cache miss.
+        """
+        key = tuple(prefix_ids)
+        with self._prefix_lock:
+            if key in self._prefix_cache:
+                self._prefix_cache.move_to_end(key)
+                self.prefix_cache_hits += 1
+                return self._prefix_cache[key]
+            self.prefix_cache_misses += 1
+
+        with torch.inference_mode():
+            outputs = self.model(
+                input_ids=torch.tensor([prefix_ids], device=self.model.device),
+                use_cache=True
+            )
+        past = outputs.past_key_values
+        # Keep an immutable per-layer copy; every generation works on its own expansion
+        if hasattr(past, 'to_legacy_cache'):
+            past = past.to_legacy_cache()
+
+        with self._prefix_lock:
+            self._prefix_cache[key] = past
+            while len(self._prefix_cache) > settings.LLM_PREFIX_CACHE_SIZE:
+                self._prefix_cache.popitem(last=False)
+
+        logger.debug(f"Prefix cache for {self.model_name}: {self.prefix_cache_hits} hits, "
+                     f"{self.prefix_cache_misses} misses")
+        return past
+
+    def _expand_past(self, past, batch_size: int):
+        """Copy cached prefix key/values once per sequence in the batch."""
+        expanded = tuple(
+            (key.repeat(batch_size, 1, 1, 1), value.repeat(batch_size, 1, 1, 1))
+            for key, value in past
+        )
+        if DynamicCache is not None:
+            return DynamicCache.from_legacy_cache(expanded)
+        return expanded
+
+    def _prepend_prefix(self, batch, prefix_ids: List[int]):
+        """
+        Put the prefix in front of a left-padded batch.
+
+        Padding then sits between the prefix and each prompt; the attention
+        mask hides it and position IDs are derived from the mask.
+        """
+        batch_size = batch['input_ids'].shape[0]
+        prefix = torch.tensor([prefix_ids], device=self.model.device).expand(batch_size, -1)
+        batch['input_ids'] = torch.cat([prefix, batch['input_ids']], dim=1)
+        batch['attention_mask'] = torch.cat(
+            [torch.ones_like(prefix), batch['attention_mask']], dim=1
+        )
+        return batch
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the engine's cache counters and per-stage token counts."""
+        with self._stats_lock:
+            stages = {stage: dict(counts) for stage, counts in self.stage_stats.items()}
+        return {
+            'backend': self.backend,
+            'prefix_cache_hits': self.prefix_cache_hits,
+            'prefix_cache_misses': self.prefix_cache_misses,
+            'prefix_cache_size': len(self._prefix_cache),
+            'stages': stages,
+        }
+
+    def _generate_batch(self, inputs, stop: Optional[str] = None, schema: Optional[Dict[str, Any]] = None,
+                        **params) -> Tuple[List[str], int]:
+        """
+        Run one padded batch through the model and decode the new tokens.
+
+        Returns:
+            Tuple of (generated texts, number of generated tokens in the batch)
+        """
+        prompt_length = inputs['input_ids'].shape[1]
+        if stop is not None:
+            params['stopping_criteria'] = build_stopping_criteria(self.tokenizer, prompt_length, stop)
+        if schema is not None:
+            params['logits_processor'] = build_logits_processor(self.tokenizer, schema, prompt_length)
+
+        with torch.inference_mode():
+            output_ids = self.model.generate(**inputs, **params)
+
+        # Strip the (padded) prompt from every sequence
+        new_tokens = output_ids[:, prompt_length:]
+        generated_tokens = int((new_tokens != params['pad_token_id']).sum())
+        texts = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        if stop is not None:
+            texts = [trim_completed(text, stop) for text in texts]
+        return texts, generated_tokens
+
+
+def engine_key(model_name: str, dtype: Optional[str] = None, device: Optional[str] = None) -> Tuple[Hashable, ...]:
+    """Registry key for a generation engine."""
+    return ('generation', model_name, dtype, device)
+
+
+def _engine_options(dtype: Optional[str], device: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Fill in the configured dtype and device when not given explicitly."""
+    return (dtype or getattr(settings, 'LLM_DTYPE', None),
+            device or getattr(settings, 'LLM_DEVICE', None))
+
+
+def _registry_entry(model_name: str, dtype: Optional[str], device: Optional[str]):
+    """
+    Registry key and loader of the engine to use: a client of the shared
+    inference server when settings.LLM_INFERENCE_SERVER_URL is set,
+    otherwise an in-process engine (optionally coalescing concurrent calls).
+    """
+    server_url = getattr(settings, 'LLM_INFERENCE_SERVER_URL', '')
+    if server_url:
+        from apps.core.services.inference_server import RemoteGenerationEngine
+        return (('remote-generation', server_url, model_name),
+                lambda: RemoteGenerationEngine(server_url, model_name))
+
+    dtype, device = _engine_options(dtype, device)
+    return (engine_key(model_name, dtype, device),
+            lambda: _load_engine(model_name, dtype, device))
+
+
+def _load_engine(model_name: str, dtype: Optional[str], device: Optional[str]) -> BaseGenerationEngine:
+    """
+    Build an in-process engine, behind a RequestCoalescer when
+    settings.LLM_COALESCE_WINDOW_MS is set so concurrent tasks share batches.
+    """
+    engine = GenerationEngine(model_name, dtype=dtype, device=device)
+    if getattr(settings, 'LLM_COALESCE_WINDOW_MS', 0) > 0:
+        from apps.core.services.coalescer import RequestCoalescer
+        return RequestCoalescer(engine)
+    return engine
+
+
+def acquire_engine(model_name: str, dtype: Optional[str] = None,
+                   device: Optional[str] = None) -> BaseGenerationEngine:
+    """
+    Get the shared generation engine for (model, dtype, device) from the model registry.
+    Balance with `release_engine`.
+    """
+    key, loader = _registry_entry(model_name, dtype, device)
+    return model_registry.acquire(key, loader, close=lambda engine: engine.close())
+
+
+def release_engine(model_name: str, dtype: Optional[str] = None, device: Optional[str] = None) -> None:
+    """Release a reference obtained through `acquire_engine`."""
+    key, _ = _registry_entry(model_name, dtype, device)
+    model_registry.release(key)
@@ -0,0 +1,191 @@
+import json
+import logging
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Union
+
+from django.conf import settings
+from transformers import AutoTokenizer
+
+from apps.core.services.coalescer import RequestCoalescer
+from apps.core.services.generation import BaseGenerationEngine, GenerationEngine, Prompt
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceServer:
+    """
+    Local HTTP server that owns the only copy of the LLM on a node.
+
+    Requests from all Celery workers go through a RequestCoalescer, which
+    batches requests with identical generation settings arriving within
+    `batch_window_ms` into one `GenerationEngine.generate` call of up to
+    `max_batch_size` prompts.
+    """
+
+    def __init__(self, engine: GenerationEngine, host: str, port: int,
+                 max_batch_size: Optional[int] = None, batch_window_ms: Optional[int] = None):
+        """
+        Args:
+            engine: In-process engine serving the requests
+            host: Interface to bind
+            port: Port to bind
+            max_batch_size: Prompts per batch. Defaults to settings.LLM_SERVER_MAX_BATCH_SIZE.
+            batch_window_ms: How long to wait for further requests before running a batch.
+                             Defaults to settings.LLM_SERVER_BATCH_WINDOW_MS.
+        """
+        self.engine = engine
+        self.coalescer = RequestCoalescer(
+            engine,
+            window_ms=settings.LLM_SERVER_BATCH_WINDOW_MS if batch_window_ms is None else batch_window_ms,
+            max_batch_size=max_batch_size or settings.LLM_SERVER_MAX_BATCH_SIZE
+        )
+        self.httpd = ThreadingHTTPServer((host, port), _InferenceRequestHandler)
+        self.httpd.inference_server = self
+
+    def serve_forever(self) -> None:
+        """Serve HTTP requests until interrupted."""
+        host, port = self.httpd.server_address[:2]
+        logger.info(f"Inference server for {self.engine.model_name} listening on {host}:{port} "
+                    f"(max batch {self.coalescer.max_batch_size}, window {self.coalescer.window * 1000:.0f} ms)")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+
+    def submit(self, payload: Dict[str, Any]) -> List[str]:
+        """Run one /generate request through the coalescer and return its texts."""
+        return self.coalescer.generate(
+            payload['prompts'],
+            prefix=payload.get('prefix'),
+            force=payload.get('force', False),
+            stage=payload.get('stage'),
+            stop=payload.get('stop'),
+            schema=payload.get('schema'),
+            assisted=payload.get('assisted', False),
+            **payload.get('params', {})
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the server's batching metrics and the engine's stats."""
+        return dict(self.coalescer.stats(), model=self.engine.model_name)
+
+
+class _InferenceRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the inference server: POST /generate and GET /stats.
+    """
+
+    def do_GET(self):
+        if self.path != '/stats':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        self._send_json(200, self.server.inference_server.stats())
+
+    def do_POST(self):
+        if self.path != '/generate':
+            self._send_json(404, {'error': 'Not found'})
+            return
+
+        server = self.server.inference_server
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._send_json(400, {'error': 'Invalid JSON'})
+            return
+
+        if payload.get('model') != server.engine.model_name:
+            self._send_json(400, {'error': f"Server runs {server.engine.model_name}, not {payload.get('model')}"})
+            return
+
+        try:
+            texts = server.submit(payload)
+        except Exception as e:
+            logger.error(f"Error serving generation request: {str(e)}")
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {'texts': texts})
+
+    def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class RemoteGenerationEngine(BaseGenerationEngine):
+    """
+    Generation engine backed by the shared inference server.
+
+    Only the tokenizer is loaded in the calling process; prompts are sent as
+    token IDs, so chunking and prefix handling work exactly as in-process.
+    """
+
+    def __init__(self, server_url: str, model_name: str):
+        """
+        Args:
+            server_url: Base URL of the inference server, e.g. http://127.0.0.1:8765
+            model_name: Name or path of the LLM the server runs
+        """
+        self.server_url = server_url.rstrip('/')
+        self.model_name = model_name
+        logger.info(f"Using inference server at {self.server_url} for {model_name}")
+        super().__init__(AutoTokenizer.from_pretrained(model_name))
+
+    def generate(self, prompts: Union[Prompt, List[Prompt]], batch_size: Optional[int] = None,
+                 prefix: Optional[Prompt] = None, force: bool = False, stage: Optional[str] = None,
+                 stop: Optional[str] = None, schema: Optional[Dict[str, Any]] = None,
+                 assisted: bool = False, **params) -> List[str]:
+        """
+        Generate a completion for each prompt on the inference server.
+
+        Same interface as `GenerationEngine.generate`; `batch_size` is
+        ignored because the server batches requests from all workers.
+        """
+        if isinstance(prompts, str) or (prompts and isinstance(prompts[0], int)):
+            prompts = [prompts]
+        if not prompts:
+            return []
+
+        payload = {
+            'model': self.model_name,
+            'prompts': [prompt if isinstance(prompt, str) else list(prompt) for prompt in prompts],
+            'prefix': prefix if prefix is None or isinstance(prefix, str) else list(prefix),
+            'force': force,
+            'stage': stage,
+            'stop': stop,
+            'schema': schema,
+            'assisted': assisted,
+            'params': params,
+        }
+        return self._request('/generate', payload)['texts']
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the inference server's stats."""
+        return self._request('/stats')
+
+    def _request(self, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(
+            f"{self.server_url}{path}",
+            data=data,
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=settings.LLM_INFERENCE_SERVER_TIMEOUT) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            message = json.loads(e.read() or b'{}').get('error', e.reason)
+            raise RuntimeError(f"Inference server error {e.code}: {message}") from e
+        except (urllib.error.URLError, TimeoutError) as e:
+            reason = getattr(e, 'reason', None) or str(e) or 'timed out'
+            raise RuntimeError(
+                f"Inference server at {self.server_url} (LLM_INFERENCE_SERVER_URL) unreachable: {reason}"
+            ) from e
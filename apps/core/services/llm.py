@@ -0,0 +1,100 @@
+import logging
+import os
+from typing import Any, Optional, Tuple
+
+import torch
+from django.conf import settings
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+# Supported values of settings.LLM_BACKEND
+BACKENDS = ('auto', 'torch', 'torch-int8', 'onnx')
+
+
+def load_causal_lm(model_name: str, dtype: Optional[str] = None, device: Optional[str] = None,
+                   backend: Optional[str] = None) -> Tuple[Any, Any, str]:
+    """
+    Load an LLM and its tokenizer with the configured inference backend.
+
+    Backends:
+        auto: 8-bit weights via bitsandbytes where available, else the default load
+        torch: Plain PyTorch weights in `dtype` (fp32 by default)
+        torch-int8: PyTorch with dynamic int8 quantization of the linear layers (CPU)
+        onnx: ONNX Runtime graph with KV cache, exported on first use
+
+    Args:
+        model_name: Name or path of the open-source LLM to load.
+        dtype: Optional torch dtype name, e.g. 'float32' or 'bfloat16'
+        device: Optional device to place the model on, e.g. 'cpu' or 'cuda'
+        backend: One of BACKENDS. Defaults to settings.LLM_BACKEND.
+
+    Returns:
+        Tuple of (model, tokenizer, name of the backend that actually loaded)
+    """
+    backend = backend or settings.LLM_BACKEND
+    logger.info(f"Loading LLM model: {model_name} (backend={backend}, dtype={dtype}, device={device})")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    if backend == 'onnx':
+        try:
+            model = _load_onnx(model_name)
+            logger.info(f"LLM backend loaded for {model_name}: onnx")
+            return model, tokenizer, 'onnx'
+        except ImportError:
+            logger.error("optimum[onnxruntime] is not installed, falling back to the torch backend")
+        except Exception as e:
+            logger.error(f"Error loading ONNX model for {model_name}, falling back to the torch backend: {str(e)}")
+        backend = 'torch'
+
+    if backend == 'torch-int8':
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info(f"LLM backend loaded for {model_name}: torch-int8")
+        return model, tokenizer, 'torch-int8'
+
+    if backend == 'torch' or dtype is not None or device is not None:
+        # Explicit placement requested
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=getattr(torch, dtype) if dtype else None
+        )
+        if device is not None:
+            model = model.to(device)
+        logger.info(f"LLM backend loaded for {model_name}: torch ({model.dtype})")
+        return model, tokenizer, 'torch'
+
+    try:
+        # Try to load with reduced precision for memory efficiency
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16,
+            device_map="auto",
+            load_in_8bit=True  # Quantize for memory efficiency
+        )
+        logger.info(f"LLM backend loaded for {model_name}: torch 8-bit (bitsandbytes)")
+    except Exception:
+        # Fall back to standard loading
+        logger.info("Falling back to standard model loading")
+        model = AutoModelForCausalLM.from_pretrained(model_name)
+        logger.info(f"LLM backend loaded for {model_name}: torch ({model.dtype})")
+    return model, tokenizer, 'torch'
+
+
+def _load_onnx(model_name: str):
+    """
+    Load the ONNX Runtime export of a model, exporting it on first use.
+
+    Exports are kept under settings.LLM_ONNX_DIR so only the first worker
+    pays the export cost.
+    """
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    export_dir = os.path.join(str(settings.LLM_ONNX_DIR), model_name.replace('/', '--'))
+    if os.path.exists(os.path.join(export_dir, 'config.json')):
+        return ORTModelForCausalLM.from_pretrained(export_dir, use_cache=True)
+
+    logger.info(f"Exporting {model_name} to ONNX in {export_dir}")
+    model = ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True)
+    model.save_pretrained(export_dir)
+    return model
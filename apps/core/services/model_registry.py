@@ -0,0 +1,194 @@
+import gc
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _RegistryEntry:
+    """
+    A loaded model together with the number of services currently using it,
+    and an optional hook releasing its resources on eviction.
+    """
+
+    def __init__(self, model: Any, close: Optional[Callable[[Any], None]] = None):
+        self.model = model
+        self.close = close
+        self.refcount = 0
+
+    def evicted(self, key: Hashable) -> None:
+        """Run the close hook, e.g. to stop a thread that keeps the model alive."""
+        if self.close is None:
+            return
+        try:
+            self.close(self.model)
+        except Exception as e:
+            logger.error(f"Error closing evicted model {key}: {str(e)}")
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded models shared by all AI services.
+
+    Each model is loaded at most once per process and handed out to every
+    service asking for the same key. Entries are refcounted; once more than
+    `max_models` models are resident, the least recently used entries that
+    no service holds any more are evicted. Models load outside the registry
+    lock, so a cold load only blocks the callers waiting for the same key.
+    """
+
+    def __init__(self, max_models: Optional[int] = None):
+        """
+        Initialize the registry.
+
+        Args:
+            max_models: Maximum number of resident models. Defaults to
+                        settings.MODEL_REGISTRY_MAX_MODELS.
+        """
+        self._max_models = max_models
+        self._entries: "OrderedDict[Hashable, _RegistryEntry]" = OrderedDict()
+        # Keys being loaded, set once the load finishes or fails
+        self._loading: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def max_models(self) -> int:
+        if self._max_models is not None:
+            return self._max_models
+        return getattr(settings, 'MODEL_REGISTRY_MAX_MODELS', 3)
+
+    def acquire(self, key: Hashable, loader: Callable[[], Any],
+                close: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Get the model registered under `key`, loading it if needed.
+
+        Every call must be balanced by a call to `release` once the
+        caller no longer needs the model.
+
+        Args:
+            key: Hashable identifier of the model, e.g. ('whisper', 'base')
+            loader: Callable returning the loaded model on a cache miss
+            close: Called with the model when it is evicted
+
+        Returns:
+            The shared model instance
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return self._hold(key, entry)
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading this key; use its model, or retry the load if it failed
+            loading.wait()
+
+        try:
+            logger.info(f"Loading model into registry: {key}")
+            entry = _RegistryEntry(loader(), close)
+            with self._lock:
+                self._entries[key] = entry
+                return self._hold(key, entry)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def _hold(self, key: Hashable, entry: _RegistryEntry) -> Any:
+        """Take a reference to a resident entry and mark it most recently used."""
+        entry.refcount += 1
+        self._entries.move_to_end(key)
+        self._evict()
+        return entry.model
+
+    def release(self, key: Hashable) -> None:
+        """
+        Drop one reference to the model registered under `key`.
+
+        Args:
+            key: Identifier previously passed to `acquire`
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refcount = max(entry.refcount - 1, 0)
+            self._evict()
+
+    def preload(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        """
+        Load a model without holding a reference to it, so it stays warm
+        until the LRU policy needs the room.
+        """
+        self.acquire(key, loader)
+        self.release(key)
+
+    def evict(self, key: Hashable) -> bool:
+        """
+        Evict an unreferenced model explicitly.
+
+        Returns:
+            True if the model was evicted, False if it is missing or in use.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refcount > 0:
+                return False
+            del self._entries[key]
+        entry.evicted(key)
+        gc.collect()
+        return True
+
+    def _evict(self) -> None:
+        """Evict least recently used, unreferenced models above capacity."""
+        evicted = False
+        while len(self._entries) > self.max_models:
+            victim = next(
+                (key for key, entry in self._entries.items() if entry.refcount == 0),
+                None
+            )
+            if victim is None:
+                logger.warning(
+                    f"Model registry over capacity ({len(self._entries)}/{self.max_models}) "
+                    f"but every model is in use"
+                )
+                break
+            logger.info(f"Evicting model from registry: {victim}")
+            self._entries.pop(victim).evicted(victim)
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the current refcount of every resident model."""
+        with self._lock:
+            return {str(key): entry.refcount for key, entry in self._entries.items()}
+
+
+model_registry = ModelRegistry()
+
+
+def preload_models() -> None:
+    """
+    Warm the registry with the models listed in settings.MODEL_REGISTRY_PRELOAD.
+
+    Called from the Celery worker_process_init hook so the first task on a
+    worker does not pay the cold-load cost.
+    """
+    preload = getattr(settings, 'MODEL_REGISTRY_PRELOAD', [])
+
+    if 'whisper' in preload:
+        from apps.call_analyzer.services.transcription import load_whisper_model, whisper_key
+        model_registry.preload(whisper_key(settings.WHISPER_MODEL),
+                               lambda: load_whisper_model(settings.WHISPER_MODEL))
+
+    if 'llm' in preload:
+        from apps.core.services.generation import acquire_engine, release_engine
+        acquire_engine(settings.OPEN_SOURCE_LLM_MODEL)
+        release_engine(settings.OPEN_SOURCE_LLM_MODEL)
@@ -0,0 +1,39 @@
+import logging
+import threading
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _broker_client():
+    """Redis client of the Celery broker, created on first use."""
+    global _client
+
+    import redis
+
+    with _client_lock:
+        if _client is None:
+            _client = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=1)
+    return _client
+
+
+def get_queue_depth(queue_name: str = 'celery') -> Optional[int]:
+    """
+    Number of tasks waiting in a Celery queue on the Redis broker.
+
+    Args:
+        queue_name: Name of the Celery queue
+
+    Returns:
+        Queue length, or None if the broker could not be queried
+    """
+    try:
+        return _broker_client().llen(queue_name)
+    except Exception as e:
+        logger.warning(f"Could not read length of queue {queue_name}: {str(e)}")
+        return None
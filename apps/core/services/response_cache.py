@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model_name: str, revision: Optional[str], prompt_ids: List[int], params: Dict[str, Any]) -> str:
+    """
+    Build the content address of one generation.
+
+    Args:
+        model_name: Name or path of the LLM
+        revision: Model revision (commit hash) if known
+        prompt_ids: Token IDs of the full prompt, prefix included
+        params: Generation parameters
+
+    Returns:
+        Hex digest identifying the generation
+    """
+    prompt_hash = hashlib.sha256(json.dumps(prompt_ids).encode('utf-8')).hexdigest()
+    payload = json.dumps({
+        'model': model_name,
+        'revision': revision,
+        'prompt': prompt_hash,
+        'params': params,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache(ABC):
+    """
+    Base class for persistent caches of LLM generation outputs.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """The cached response for `key`, or None."""
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        """Store a response under `key`."""
+
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    Local disk cache backed by SQLite, with TTL expiry and size-based LRU eviction.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: int):
+        """
+        Args:
+            path: Path of the SQLite database file
+            max_bytes: Total size of cached responses before the least recently used are evicted
+            ttl: Seconds a response stays valid
+        """
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Delete least recently used responses until the cache fits in max_bytes."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+
+class RedisResponseCache(ResponseCache):
+    """
+    Redis-backed cache shared by all workers, with TTL expiry and size-based LRU eviction.
+
+    Access times and sizes are tracked in a sorted set and a hash next to the values.
+    """
+
+    def __init__(self, url: str, max_bytes: int, ttl: int, prefix: str = 'llm-response'):
+        """
+        Args:
+            url: Redis connection URL
+            max_bytes: Total size of cached responses before the least recently used are evicted
+            ttl: Seconds a response stays valid
+            prefix: Namespace of the cache keys
+        """
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _value_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self._value_key(key))
+        if value is None:
+            return None
+        self.client.zadd(f"{self.prefix}:lru", {key: time.time()})
+        return value.decode('utf-8')
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode('utf-8'))
+        pipe = self.client.pipeline()
+        pipe.set(self._value_key(key), value, ex=self.ttl)
+        pipe.zadd(f"{self.prefix}:lru", {key: time.time()})
+        pipe.hset(f"{self.prefix}:sizes", key, size)
+        pipe.execute()
+        self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used responses until the cache fits in max_bytes."""
+        sizes = {k.decode('utf-8'): int(v) for k, v in self.client.hgetall(f"{self.prefix}:sizes").items()}
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        for raw_key in self.client.zrange(f"{self.prefix}:lru", 0, -1):
+            if total <= self.max_bytes:
+                break
+            key = raw_key.decode('utf-8')
+            pipe = self.client.pipeline()
+            pipe.delete(self._value_key(key))
+            pipe.zrem(f"{self.prefix}:lru", key)
+            pipe.hdel(f"{self.prefix}:sizes", key)
+            pipe.execute()
+            total -= sizes.get(key, 0)
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the process-wide response cache configured by settings.LLM_RESPONSE_CACHE_BACKEND.
+
+    Returns:
+        The cache, or None when caching is disabled
+    """
+    global _response_cache
+
+    backend = settings.LLM_RESPONSE_CACHE_BACKEND
+    if backend == 'none':
+        return None
+
+    with _response_cache_lock:
+        if _response_cache is None:
+            if backend == 'redis':
+                _response_cache = RedisResponseCache(
+                    settings.LLM_RESPONSE_CACHE_REDIS_URL,
+                    max_bytes=settings.LLM_RESPONSE_CACHE_MAX_BYTES,
+                    ttl=settings.LLM_RESPONSE_CACHE_TTL
+                )
+            else:
+                _response_cache = SQLiteResponseCache(
+                    settings.LLM_RESPONSE_CACHE_PATH,
+                    max_bytes=settings.LLM_RESPONSE_CACHE_MAX_BYTES,
+                    ttl=settings.LLM_RESPONSE_CACHE_TTL
+                )
+            logger.info(f"Using {backend} LLM response cache")
+    return _response_cache
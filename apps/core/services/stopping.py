@@ -0,0 +1,108 @@
+import re
+from typing import Optional
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+# Stop value meaning "stop once a complete top-level JSON object was produced"
+JSON_OBJECT = 'json'
+
+# Stop patterns for the structured text responses
+KEY_ELEMENTS_COMPLETE = r"OBJECTIONS:\s*\n(?:[ \t]*[-•*\d][^\n]*\n)+[ \t]*\n"
+SINGLE_PASS_COMPLETE = r"OVERALL SCORE:?\s*\d+\D"
+EMAIL_SIGN_OFF_COMPLETE = (
+    r"\n[ \t]*(?:Best regards|Kind regards|Warm regards|Regards|Sincerely|Best|Thanks|Thank you|Cheers),?"
+    r"[ \t]*\n+[ \t]*[^\n]+\n"
+)
+
+
+def json_object_end(text: str) -> Optional[int]:
+    """
+    Position just after the first complete top-level JSON object in `text`, or None.
+    Braces inside JSON strings are ignored.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"' and depth > 0:
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}' and depth > 0:
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return None
+
+
+def json_object_complete(text: str) -> bool:
+    """Check whether `text` contains a complete top-level JSON object."""
+    return json_object_end(text) is not None
+
+
+def completion_end(text: str, stop: str) -> Optional[int]:
+    """
+    Position in `text` where the `stop` condition was first met, or None.
+
+    Args:
+        text: Generated text
+        stop: JSON_OBJECT or a completion regex
+    """
+    if stop == JSON_OBJECT:
+        return json_object_end(text)
+    match = re.search(stop, text, re.IGNORECASE)
+    return match.end() if match else None
+
+
+def trim_completed(text: str, stop: str) -> str:
+    """
+    Cut generated text where its `stop` condition was met.
+
+    Sequences of a batch keep generating until every sequence is complete,
+    so one that completed early carries tokens past its structure.
+    """
+    end = completion_end(text, stop)
+    return text if end is None else text[:end]
+
+
+class TextStoppingCriteria(StoppingCriteria):
+    """
+    Stops a batch once the generated text of every sequence is structurally complete.
+
+    `stop` is either JSON_OBJECT or a regular expression that matches once
+    the expected structure has been produced. A single bool is returned for
+    the whole batch, as transformers 4.35 expects; sequences that completed
+    earlier are cut back with `trim_completed` after generation.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, stop: str):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop = stop
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        return all(completion_end(text, self.stop) is not None for text in texts)
+
+
+def build_stopping_criteria(tokenizer, prompt_length: int, stop: str) -> StoppingCriteriaList:
+    """
+    Build the stopping criteria for one generation batch.
+
+    Args:
+        tokenizer: Tokenizer used to decode the generated tokens
+        prompt_length: Length of the (padded) prompt in the batch
+        stop: JSON_OBJECT or a completion regex
+
+    Returns:
+        StoppingCriteriaList for `model.generate`
+    """
+    return StoppingCriteriaList([TextStoppingCriteria(tokenizer, prompt_length, stop)])
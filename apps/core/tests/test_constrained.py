@@ -0,0 +1,79 @@
+import torch
+from django.test import SimpleTestCase
+
+from apps.core.services.constrained import JsonSchemaLogitsProcessor, SchemaMatcher
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'score': {'type': 'integer', 'minimum': 1, 'maximum': 100},
+        'tags': {'type': 'array', 'items': {'type': 'string', 'maxLength': 5}, 'maxItems': 2},
+    },
+}
+
+# Token id -> text; 0 is EOS
+VOCAB = ['', '{', '"', 'score', '":', '5', '0', '}', 'x', ',', 'tags', '[', ']']
+EOS, OPEN, QUOTE, SCORE, KEY_END, FIVE, ZERO, CLOSE, TEXT, COMMA = range(10)
+PROMPT = [TEXT, TEXT]
+
+
+class FakeTokenizer:
+    eos_token_id = EOS
+
+    def decode(self, token_ids, skip_special_tokens=False):
+        return ''.join(VOCAB[token_id] for token_id in token_ids)
+
+
+class SchemaMatcherTests(SimpleTestCase):
+    def matches(self, text):
+        return SchemaMatcher(SCHEMA).feed_text(text)
+
+    def test_accepts_matching_object(self):
+        matcher = SchemaMatcher(SCHEMA)
+        self.assertTrue(matcher.feed_text('{"score": 42, "tags": ["a", "bc"]}'))
+        self.assertTrue(matcher.complete)
+
+    def test_rejects_wrong_key(self):
+        self.assertFalse(self.matches('{"scope"'))
+
+    def test_rejects_out_of_range_integers(self):
+        self.assertFalse(self.matches('{"score": 101'))
+        self.assertFalse(self.matches('{"score": 0,'))
+        self.assertFalse(self.matches('{"score": 07'))
+
+    def test_enforces_array_and_string_limits(self):
+        self.assertFalse(self.matches('{"score": 1, "tags": ["a", "b",'))
+        self.assertFalse(self.matches('{"score": 1, "tags": ["abcdef"'))
+
+    def test_copy_is_independent(self):
+        matcher = SchemaMatcher(SCHEMA)
+        matcher.feed_text('{"score": 4')
+        matcher.copy().feed_text('2, "tags": []}')
+        self.assertFalse(matcher.complete)
+        self.assertFalse(matcher.feed_text('}'))
+
+
+class JsonSchemaLogitsProcessorTests(SimpleTestCase):
+    def setUp(self):
+        self.processor = JsonSchemaLogitsProcessor(FakeTokenizer(), SCHEMA, prompt_length=len(PROMPT))
+
+    def allowed(self, generated):
+        input_ids = torch.tensor([PROMPT + generated])
+        scores = torch.zeros(1, len(VOCAB))
+        masked = self.processor(input_ids, scores)
+        return set(torch.nonzero(torch.isfinite(masked[0])).flatten().tolist())
+
+    def test_masks_tokens_outside_schema(self):
+        self.assertEqual(self.allowed([]), {OPEN})
+        self.assertEqual(self.allowed([OPEN]), {QUOTE})
+        self.assertEqual(self.allowed([OPEN, QUOTE, SCORE, KEY_END]), {FIVE, ZERO})
+
+    def test_allows_only_eos_once_complete(self):
+        self.processor.schema = {'properties': {'score': SCHEMA['properties']['score']}}
+        self.assertEqual(self.allowed([OPEN, QUOTE, SCORE, KEY_END, FIVE, CLOSE]), {EOS})
+
+    def test_resumes_from_shared_prefix_after_rejected_draft_tokens(self):
+        # Assisted decoding scores draft tokens, then continues from a shorter prefix
+        self.assertEqual(self.allowed([OPEN, QUOTE, SCORE, KEY_END, FIVE]), {FIVE, ZERO, COMMA})
+        self.assertEqual(self.allowed([OPEN, QUOTE, SCORE, KEY_END]), {FIVE, ZERO})
+        self.assertEqual(self.allowed([OPEN, QUOTE, SCORE, KEY_END, FIVE, ZERO]), {COMMA})
@@ -0,0 +1,59 @@
+import hashlib
+from typing import Optional
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Computes the SHA-256 of each uploaded file while it is received.
+
+    Installed ahead of Django's memory and temporary-file handlers, it passes
+    every chunk on unchanged, so the upload is read only once.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.hashes = {}
+        self.sha256 = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.hashes[self.field_name] = self.sha256.hexdigest()
+        # Let the next handler build the uploaded file
+        return None
+
+
+def get_upload_hash(request, field_name: str = 'file') -> Optional[str]:
+    """
+    SHA-256 of a file uploaded with the request.
+
+    Uses the digest computed by HashingUploadHandler during the upload, and
+    only reads the file again if the handler was not installed.
+
+    Args:
+        request: The Django or DRF request
+        field_name: Form field of the file
+
+    Returns:
+        Hex digest, or None if no file was uploaded in that field
+    """
+    for handler in request.upload_handlers:
+        if isinstance(handler, HashingUploadHandler) and field_name in handler.hashes:
+            return handler.hashes[field_name]
+
+    uploaded_file = request.FILES.get(field_name)
+    if uploaded_file is None:
+        return None
+    sha256 = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        sha256.update(chunk)
+    uploaded_file.seek(0)
+    return sha256.hexdigest()
@@ -0,0 +1,7 @@
+def parse_bool(value) -> bool:
+    """
+    Interpret a request parameter such as 'true', '1' or 'yes' as a boolean.
+    """
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
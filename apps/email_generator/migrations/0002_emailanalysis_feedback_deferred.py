@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_generator', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailanalysis',
+            name='feedback_deferred',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -107,6 +107,8 @@ class EmailAnalysis(TimeStampedModel):
     strengths = models.JSONField(default=list)
     weaknesses = models.JSONField(default=list)
     suggestions = models.JSONField(default=list)
+    # LLM feedback skipped under load, to be backfilled
+    feedback_deferred = models.BooleanField(default=False, db_index=True)
     
     # Readability metrics
     word_count = models.IntegerField()
@@ -1,15 +1,28 @@
+import json
 import logging
 import re
 from typing import Dict, List, Any, Optional
 import nltk
 from textblob import TextBlob
 import spacy
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
 
 from django.conf import settings
+from apps.core.services.generation import acquire_engine, release_engine
+from apps.core.services.stopping import JSON_OBJECT
+from apps.core.services.model_registry import model_registry
 from apps.email_generator.models import GeneratedEmail, EmailAnalysis
 
+# Declared shape of the LLM quality feedback, enforced while decoding
+FEEDBACK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'strengths': {'type': 'array', 'items': {'type': 'string', 'maxLength': 120}, 'maxItems': 3},
+        'weaknesses': {'type': 'array', 'items': {'type': 'string', 'maxLength': 120}, 'maxItems': 3},
+        'suggestions': {'type': 'array', 'items': {'type': 'string', 'maxLength': 120}, 'maxItems': 3},
+    },
+    'required': ['strengths', 'weaknesses', 'suggestions'],
+}
+
 # Download required NLTK resources
 try:
     nltk.data.find('punkt')
@@ -20,57 +33,65 @@ except LookupError:
 
 logger = logging.getLogger(__name__)
 
+SPACY_KEY = ('spacy', 'en_core_web_sm')
+
+
+def load_spacy_model():
+    """
+    Load the spaCy English pipeline, downloading it on first use.
+    """
+    try:
+        return spacy.load("en_core_web_sm")
+    except:
+        # Download if not available
+        spacy.cli.download("en_core_web_sm")
+        return spacy.load("en_core_web_sm")
+
 class EmailAnalyzerService:
     """
     Service for analyzing and scoring generated emails.
     """
     
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, assisted: Optional[bool] = None):
         """
         Initialize the email analyzer service.
         
         Args:
             model_name: Name of the LLM model to use for advanced analysis.
+            assisted: Use assisted generation with the draft model. Defaults to
+                      whether 'email_analysis' is in settings.LLM_ASSISTED_SERVICES.
         """
         self.model_name = model_name or settings.OPEN_SOURCE_LLM_MODEL
-        self.model = None
-        self.tokenizer = None
+        self.assisted = 'email_analysis' in settings.LLM_ASSISTED_SERVICES if assisted is None else assisted
+        self.engine = None
         self.nlp = None
     
     def _load_model(self):
         """
-        Load the LLM model if it's not already loaded.
+        Get the shared generation engine for the LLM if it's not already held.
         """
-        if self.model is None or self.tokenizer is None:
-            logger.info(f"Loading LLM model: {self.model_name}")
-            try:
-                # Try to load with reduced precision for memory efficiency
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_name,
-                    torch_dtype=torch.float16,
-                    device_map="auto",
-                    load_in_8bit=True  # Quantize for memory efficiency
-                )
-            except:
-                # Fall back to standard loading
-                logger.info("Falling back to standard model loading")
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
-        
-        return self.model, self.tokenizer
+        if self.engine is None:
+            self.engine = acquire_engine(self.model_name)
+        
+        return self.engine
+    
+    def release_models(self):
+        """
+        Release the models held by this service back to the shared registry.
+        """
+        if self.engine is not None:
+            release_engine(self.model_name)
+            self.engine = None
+        if self.nlp is not None:
+            model_registry.release(SPACY_KEY)
+            self.nlp = None
     
     def _load_spacy(self):
         """
-        Load the spaCy model if it's not already loaded.
+        Get the spaCy model from the shared model registry if it's not already held.
         """
         if self.nlp is None:
-            try:
-                self.nlp = spacy.load("en_core_web_sm")
-            except:
-                # Download if not available
-                spacy.cli.download("en_core_web_sm")
-                self.nlp = spacy.load("en_core_web_sm")
+            self.nlp = model_registry.acquire(SPACY_KEY, load_spacy_model)
         
         return self.nlp
     
@@ -237,50 +258,62 @@ class EmailAnalyzerService:
             "sentiment_score": sentiment_score
         }
     
-    def _get_quality_feedback(self, email: GeneratedEmail) -> Dict[str, List[str]]:
+    def _get_quality_feedback(self, email: GeneratedEmail, force: bool = False) -> Dict[str, List[str]]:
         """
         Get detailed quality feedback using the LLM.
         
         Args:
             email: The email to analyze
+            force: Bypass the LLM response cache
             
         Returns:
             Dictionary with strengths, weaknesses, and suggestions
         """
-        model, tokenizer = self._load_model()
-        
-        # Create prompt for email quality analysis
-        prompt = f"""
-        Analyze this cold sales email for quality and provide feedback:
-        
-        Subject: {email.subject}
+        engine = self._load_model()
         
-        Body:
-        {email.body}
+        # Create prompt for email quality analysis; the instructions are a
+        # static prefix and only the email itself varies
+        prompt_prefix = """
+        Analyze the cold sales email below for quality and provide feedback.
         
         Provide:
         1. Strengths: What's good about this email
         2. Weaknesses: Problems or issues with the email
         3. Suggestions: Specific improvements to make
         
-        Format your response as JSON.
+        Format your response as JSON with the keys "strengths", "weaknesses"
+        and "suggestions", each a list of strings.
         """
+        prompt = f"""
+        Subject: {email.subject}
+        
+        Body:
+        {email.body}
         
-        # Generate response
-        generator = pipeline(
-            "text-generation",
-            model=model,
-            tokenizer=tokenizer,
-            max_length=1024
-        )
+        Your response:
+        """
         
-        response = generator(prompt, max_length=1024, num_return_sequences=1)[0]['generated_text']
+        # Generate response; with constrained decoding it always follows FEEDBACK_SCHEMA
+        constrained = settings.LLM_CONSTRAINED_DECODING
+        response = engine.generate(
+            prompt,
+            prefix=prompt_prefix,
+            force=force,
+            stage='email_feedback',
+            stop=None if constrained else JSON_OBJECT,
+            schema=FEEDBACK_SCHEMA if constrained else None,
+            assisted=self.assisted
+        )[0]
+        
+        if constrained:
+            try:
+                return json.loads(response)
+            except ValueError as e:
+                logger.error(f"Constrained email feedback was cut off: {str(e)}")
+                return {"strengths": [], "weaknesses": [], "suggestions": []}
         
         # Parse the response
         try:
-            import json
-            import re
-            
             # Look for content between curly braces
             json_match = re.search(r'\{.*\}', response, re.DOTALL)
             if json_match:
@@ -326,12 +359,16 @@ class EmailAnalyzerService:
         
         return items
     
-    def analyze_email(self, email: GeneratedEmail) -> Optional[EmailAnalysis]:
+    def analyze_email(self, email: GeneratedEmail, force: bool = False,
+                      defer_feedback: bool = False) -> Optional[EmailAnalysis]:
         """
         Analyze a generated email for quality, spam likelihood, and engagement potential.
         
         Args:
             email: The email to analyze
+            force: Regenerate the LLM feedback instead of reusing a cached one
+            defer_feedback: Skip the LLM feedback and only compute the scores;
+                            the feedback is backfilled later with `backfill_feedback`
             
         Returns:
             EmailAnalysis model instance if successful, None otherwise.
@@ -343,7 +380,10 @@ class EmailAnalyzerService:
             engagement = self._analyze_engagement_potential(email.subject, email.body)
             
             # Get quality feedback
-            feedback = self._get_quality_feedback(email)
+            if defer_feedback:
+                feedback = {}
+            else:
+                feedback = self._get_quality_feedback(email, force=force)
             
             # Calculate overall score (weighted average)
             overall_score = (
@@ -363,6 +403,7 @@ class EmailAnalyzerService:
                     'strengths': feedback.get("strengths", []),
                     'weaknesses': feedback.get("weaknesses", []),
                     'suggestions': feedback.get("suggestions", []),
+                    'feedback_deferred': defer_feedback,
                     'word_count': readability["word_count"],
                     'avg_sentence_length': readability["avg_sentence_length"],
                     'complexity_score': readability["complexity_score"]
@@ -373,4 +414,30 @@ class EmailAnalyzerService:
             
         except Exception as e:
             logger.error(f"Email analysis error: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+    
+    def backfill_feedback(self, email: GeneratedEmail) -> Optional[EmailAnalysis]:
+        """
+        Add the LLM quality feedback to an analysis whose feedback was deferred.
+        
+        Args:
+            email: The analyzed email
+            
+        Returns:
+            The updated EmailAnalysis model instance if successful, None otherwise.
+        """
+        try:
+            analysis = EmailAnalysis.objects.get(email=email)
+            feedback = self._get_quality_feedback(email)
+            
+            analysis.strengths = feedback.get("strengths", [])
+            analysis.weaknesses = feedback.get("weaknesses", [])
+            analysis.suggestions = feedback.get("suggestions", [])
+            analysis.feedback_deferred = False
+            analysis.save(update_fields=['strengths', 'weaknesses', 'suggestions', 'feedback_deferred', 'updated_at'])
+            
+            return analysis
+            
+        except Exception as e:
+            logger.error(f"Email feedback backfill error: {str(e)}")
+            return None
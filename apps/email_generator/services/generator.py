@@ -1,56 +1,72 @@
 import logging
 from typing import Dict, List, Any, Optional
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
 
 from django.conf import settings
+from apps.core.services.generation import acquire_engine, release_engine
+from apps.core.services.stopping import EMAIL_SIGN_OFF_COMPLETE
 from apps.call_analyzer.models import CallRecording
 from apps.email_generator.models import GeneratedEmail, EmailTemplate
 
 logger = logging.getLogger(__name__)
 
+# Instructions shared by every email prompt, sent as a cached prompt prefix
+EMAIL_INSTRUCTIONS = """
+        Generate a personalized cold sales email based on the call insights below.
+        
+        Requirements:
+        - Use the tone given with the call insights
+        - Address the key objections tactfully
+        - Include a clear call to action
+        - Keep it concise and professional
+        - Personalize it based on the call insights
+        
+        Format your response with:
+        SUBJECT: [Email Subject Line]
+        
+        [Email Body]
+        
+        Call insights:
+        """
+
 class EmailGenerationService:
     """
     Service for generating cold emails based on call insights using an open-source LLM.
     """
     
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, assisted: Optional[bool] = None):
         """
         Initialize the email generation service.
         
         Args:
             model_name: Name or path of the open-source LLM to use.
+            assisted: Use assisted generation with the draft model. Defaults to
+                      whether 'email_generation' is in settings.LLM_ASSISTED_SERVICES.
         """
         self.model_name = model_name or settings.OPEN_SOURCE_LLM_MODEL
-        self.model = None
-        self.tokenizer = None
+        self.assisted = 'email_generation' in settings.LLM_ASSISTED_SERVICES if assisted is None else assisted
+        self.engine = None
     
     def _load_model(self):
         """
-        Load the LLM model if it's not already loaded.
+        Get the shared generation engine for the LLM if it's not already held.
         """
-        if self.model is None or self.tokenizer is None:
-            logger.info(f"Loading LLM model: {self.model_name}")
-            try:
-                # Try to load with reduced precision for memory efficiency
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_name,
-                    torch_dtype=torch.float16,
-                    device_map="auto",
-                    load_in_8bit=True  # Quantize for memory efficiency
-                )
-            except:
-                # Fall back to standard loading
-                logger.info("Falling back to standard model loading")
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
-        
-        return self.model, self.tokenizer
+        if self.engine is None:
+            self.engine = acquire_engine(self.model_name)
+        
+        return self.engine
+    
+    def release_models(self):
+        """
+        Release the models held by this service back to the shared registry.
+        """
+        if self.engine is not None:
+            release_engine(self.model_name)
+            self.engine = None
     
     def _build_prompt(self, call_recording: CallRecording, tone: str, template: Optional[EmailTemplate] = None) -> str:
         """
         Build the prompt for the email generation based on call insights.
+        The prompt follows the static EMAIL_INSTRUCTIONS prefix.
         
         Args:
             call_recording: The call recording to base the email on
@@ -77,10 +93,9 @@ class EmailGenerationService:
         if hasattr(call_recording, 'sentiment'):
             sentiment = call_recording.sentiment.overall_sentiment
         
-        # Format the prompt
+        # Format the call-specific part of the prompt; the static instructions
+        # are sent separately as EMAIL_INSTRUCTIONS so they can be cached
         prompt = f"""
-        Generate a personalized cold sales email based on the following call insights:
-        
         Call Summary: {call_recording.summary.overview}
         
         Key Points Discussed:
@@ -95,12 +110,7 @@ class EmailGenerationService:
         
         Sentiment from call: {sentiment}
         
-        Requirements:
-        - Tone should be {tone}
-        - Address the key objections tactfully
-        - Include a clear call to action
-        - Keep it concise and professional
-        - Personalize it based on the call insights
+        Tone should be {tone}
         """
         
         # Add template if provided
@@ -114,15 +124,6 @@ class EmailGenerationService:
             {template.body_template}
             """
         
-        # Add format instructions
-        prompt += """
-        
-        Format your response with:
-        SUBJECT: [Email Subject Line]
-        
-        [Email Body]
-        """
-        
         return prompt
 
     def _parse_response(self, response: str) -> Dict[str, str]:
@@ -185,7 +186,8 @@ class EmailGenerationService:
                      tone: str = 'professional', 
                      user=None, 
                      organization=None, 
-                     template: Optional[EmailTemplate] = None) -> Optional[GeneratedEmail]:
+                     template: Optional[EmailTemplate] = None,
+                     force: bool = False) -> Optional[GeneratedEmail]:
         """
         Generate a cold email based on call insights.
         
@@ -195,26 +197,27 @@ class EmailGenerationService:
             user: The user generating the email
             organization: The organization the user belongs to
             template: Optional email template to use
+            force: Regenerate instead of reusing a cached LLM output
             
         Returns:
             GeneratedEmail model instance if successful, None otherwise.
         """
         try:
             # Load model
-            model, tokenizer = self._load_model()
+            engine = self._load_model()
             
             # Build prompt
             prompt = self._build_prompt(call_recording, tone, template)
             
             # Generate email
-            generator = pipeline(
-                "text-generation",
-                model=model,
-                tokenizer=tokenizer,
-                max_length=1024
-            )
-            
-            response = generator(prompt, max_length=1024, num_return_sequences=1)[0]['generated_text']
+            response = engine.generate(
+                prompt,
+                prefix=EMAIL_INSTRUCTIONS,
+                force=force,
+                stage='email',
+                stop=EMAIL_SIGN_OFF_COMPLETE,
+                assisted=self.assisted
+            )[0]
             
             # Parse response
             parsed_email = self._parse_response(response)
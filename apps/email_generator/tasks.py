@@ -1,17 +1,21 @@
 import logging
 from celery import shared_task
-from .models import GeneratedEmail
+from django.conf import settings
+from apps.core.services.degradation import DegradationController
+from apps.core.services.queues import get_queue_depth
+from .models import GeneratedEmail, EmailAnalysis
 from .services.analyzer import EmailAnalyzerService
 
 logger = logging.getLogger(__name__)
 
 @shared_task
-def analyze_email_async(email_id):
+def analyze_email_async(email_id, force=False):
     """
     Analyze a generated email asynchronously.
     
     Args:
         email_id: ID of the GeneratedEmail to analyze
+        force: Regenerate the LLM feedback instead of reusing a cached one
     """
     logger.info(f"Starting async analysis for email: {email_id}")
     
@@ -19,9 +23,16 @@ def analyze_email_async(email_id):
         # Get the email
         email = GeneratedEmail.objects.get(id=email_id)
         
+        # Skip the LLM feedback while the backlog is high; it is backfilled later
+        controller = DegradationController()
+        defer_feedback = controller.is_degraded(controller.queue_depth())
+        
         # Analyze email
         analyzer_service = EmailAnalyzerService()
-        analysis = analyzer_service.analyze_email(email)
+        try:
+            analysis = analyzer_service.analyze_email(email, force=force, defer_feedback=defer_feedback)
+        finally:
+            analyzer_service.release_models()
         
         if not analysis:
             logger.error(f"Analysis failed for email: {email_id}")
@@ -34,13 +45,59 @@ def analyze_email_async(email_id):
 
 
 @shared_task
-def generate_email_variants_async(email_id, tones=None):
+def backfill_email_feedback_async(email_id):
+    """
+    Add the LLM feedback that was deferred while the system was degraded.
+    
+    Args:
+        email_id: ID of the analyzed GeneratedEmail
+    """
+    try:
+        email = GeneratedEmail.objects.get(id=email_id)
+        
+        logger.info(f"Backfilling LLM feedback for email: {email_id}")
+        analyzer_service = EmailAnalyzerService()
+        try:
+            analyzer_service.backfill_feedback(email)
+        finally:
+            analyzer_service.release_models()
+        
+    except Exception as e:
+        logger.error(f"Error backfilling feedback for email {email_id}: {str(e)}")
+
+
+@shared_task
+def dispatch_deferred_feedback():
+    """
+    Periodically queue deferred email feedback once the backlog has drained.
+    """
+    controller = DegradationController()
+    if not controller.can_backfill(controller.queue_depth()):
+        return
+    # Wait for the previous backfill batch to be picked up before queuing more
+    if get_queue_depth(settings.DEGRADATION_BACKFILL_QUEUE) != 0:
+        return
+    
+    email_ids = list(
+        EmailAnalysis.objects.filter(feedback_deferred=True)
+        .order_by('created_at')
+        .values_list('email_id', flat=True)[:settings.DEGRADATION_BACKFILL_BATCH]
+    )
+    for email_id in email_ids:
+        backfill_email_feedback_async.delay(email_id)
+    if email_ids:
+        logger.info(f"Queued {len(email_ids)} deferred email feedback analyses")
+
+
+@shared_task
+def generate_email_variants_async(email_id, tones=None, force=False):
     """
     Generate variants of an email with different tones.
     
     Args:
         email_id: ID of the original GeneratedEmail
         tones: List of tones to generate variants for. If None, generates all possible tones.
+        force: Regenerate instead of reusing cached LLM outputs
     """
     from .services.generator import EmailGenerationService
     
@@ -64,27 +121,31 @@ def generate_email_variants_async(email_id, tones=None):
         
         # Generate a variant for each tone
         generator_service = EmailGenerationService()
-        for tone in tones:
-            logger.info(f"Generating {tone} variant for email: {email_id}")
+        try:
+            for tone in tones:
+                logger.info(f"Generating {tone} variant for email: {email_id}")
             
-            variant = generator_service.generate_email(
-                call_recording=original_email.call_recording,
-                tone=tone,
-                user=original_email.user,
-                organization=original_email.organization,
-                template=original_email.template
-            )
+                variant = generator_service.generate_email(
+                    call_recording=original_email.call_recording,
+                    tone=tone,
+                    user=original_email.user,
+                    organization=original_email.organization,
+                    template=original_email.template,
+                    force=force
+                )
             
-            if variant:
-                # Update parent reference
-                variant.parent = original_email
-                variant.version = original_email.version + 1
-                variant.save()
+                if variant:
+                    # Update parent reference
+                    variant.parent = original_email
+                    variant.version = original_email.version + 1
+                    variant.save()
                 
-                # Analyze the variant
-                analyze_email_async.delay(variant.id)
-            else:
-                logger.warning(f"Failed to generate {tone} variant for email: {email_id}")
+                    # Analyze the variant
+                    analyze_email_async.delay(variant.id, force=force)
+                else:
+                    logger.warning(f"Failed to generate {tone} variant for email: {email_id}")
+        finally:
+            generator_service.release_models()
         
         logger.info(f"Completed variant generation for email: {email_id}")
         
@@ -9,6 +9,7 @@ from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 
 from apps.call_analyzer.models import CallRecording
+from apps.core.utils import parse_bool
 from .models import GeneratedEmail, EmailTemplate, EmailAnalysis, ABTestGroup, ABTestVariant
 from .services.generator import EmailGenerationService
 from .services.analyzer import EmailAnalyzerService
@@ -79,6 +80,7 @@ class GeneratedEmailViewSet(viewsets.ModelViewSet):
         call_id = serializer.validated_data.get('call_recording_id')
         tone = serializer.validated_data.get('tone', 'professional')
         template_id = serializer.validated_data.get('template_id')
+        force = parse_bool(request.data.get('force', False))
         
         # Get the call recording
         call_recording = get_object_or_404(CallRecording, id=call_id)
@@ -96,13 +98,17 @@ class GeneratedEmailViewSet(viewsets.ModelViewSet):
         
         # Generate the email
         service = EmailGenerationService()
-        email = service.generate_email(
-            call_recording=call_recording,
-            tone=tone,
-            user=request.user,
-            organization=request.user.profile.organization if hasattr(request.user, 'profile') else None,
-            template=template
-        )
+        try:
+            email = service.generate_email(
+                call_recording=call_recording,
+                tone=tone,
+                user=request.user,
+                organization=request.user.profile.organization if hasattr(request.user, 'profile') else None,
+                template=template,
+                force=force
+            )
+        finally:
+            service.release_models()
         
         if not email:
             return Response({
@@ -123,12 +129,16 @@ class GeneratedEmailViewSet(viewsets.ModelViewSet):
     def analyze(self, request, pk=None):
         """
         Manually trigger analysis for a generated email.
+        Pass force=true to regenerate the LLM feedback instead of reusing a cached one.
         """
         email = self.get_object()
         
         # Start analysis
         service = EmailAnalyzerService()
-        analysis = service.analyze_email(email)
+        try:
+            analysis = service.analyze_email(email, force=parse_bool(request.data.get('force', False)))
+        finally:
+            service.release_models()
         
         if not analysis:
             return Response({
@@ -165,6 +175,7 @@ class GeneratedEmailViewSet(viewsets.ModelViewSet):
         
         # Get the tone from request
         tone = request.data.get('tone', 'professional')
+        force = parse_bool(request.data.get('force', False))
         
         # We need the call recording
         call_recording = original_email.call_recording
@@ -175,13 +186,17 @@ class GeneratedEmailViewSet(viewsets.ModelViewSet):
         
         # Generate the variant
         service = EmailGenerationService()
-        variant_email = service.generate_email(
-            call_recording=call_recording,
-            tone=tone,
-            user=request.user,
-            organization=request.user.profile.organization if hasattr(request.user, 'profile') else None,
-            template=original_email.template
-        )
+        try:
+            variant_email = service.generate_email(
+                call_recording=call_recording,
+                tone=tone,
+                user=request.user,
+                organization=request.user.profile.organization if hasattr(request.user, 'profile') else None,
+                template=original_email.template,
+                force=force
+            )
+        finally:
+            service.release_models()
         
         if not variant_email:
             return Response({
@@ -403,7 +418,10 @@ def analyze_email_view(request, pk):
     
     # Analyze the email
     service = EmailAnalyzerService()
-    analysis = service.analyze_email(email)
+    try:
+        analysis = service.analyze_email(email)
+    finally:
+        service.release_models()
     
     if analysis:
         messages.success(request, "Email analysis completed successfully.")
@@ -1,5 +1,7 @@
 import os
+import logging
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -14,6 +16,32 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def preload_models(**kwargs):
+    """
+    Load the shared models once per worker process, before the first task.
+    """
+    from apps.core.services.model_registry import preload_models as preload
+    try:
+        preload()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Error preloading models: {str(e)}")
+
+
+@worker_process_init.connect
+def check_transcription_pool(**kwargs):
+    """
+    Report once per worker process that TRANSCRIPTION_PARALLEL cannot take effect.
+    """
+    from django.conf import settings
+    from apps.call_analyzer.services.parallel_transcription import pool_unavailable_reason
+    reason = pool_unavailable_reason() if settings.TRANSCRIPTION_PARALLEL else None
+    if reason is not None:
+        logging.getLogger(__name__).error(
+            f"TRANSCRIPTION_PARALLEL is set but calls will be transcribed sequentially: {reason}"
+        )
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
@@ -166,6 +166,193 @@ CELERY_TIMEZONE = TIME_ZONE
 WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
 OPEN_SOURCE_LLM_MODEL = 'Qwen/Qwen2-1.5B-Instruct'  # Smaller 0.5B version
 
+# Smaller sibling of the LLM proposing tokens for assisted (speculative) generation
+OPEN_SOURCE_LLM_DRAFT_MODEL = os.getenv('OPEN_SOURCE_LLM_DRAFT_MODEL', 'Qwen/Qwen2-0.5B-Instruct')
+# Services using assisted generation ('summarization', 'email_generation', 'email_analysis')
+LLM_ASSISTED_SERVICES = [name for name in os.getenv('LLM_ASSISTED_SERVICES', '').split(',') if name]
+
+# Generation engine placement; unset keeps the default loading strategy
+LLM_DTYPE = os.getenv('LLM_DTYPE') or None  # e.g. 'float32', 'bfloat16'
+LLM_DEVICE = os.getenv('LLM_DEVICE') or None  # e.g. 'cpu', 'cuda'
+# Inference backend: 'auto' (8-bit where bitsandbytes works), 'torch', 'torch-int8' or 'onnx'
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'auto')
+LLM_ONNX_DIR = os.getenv('LLM_ONNX_DIR', str(BASE_DIR / 'cache' / 'onnx'))
+
+# Token budget per transcript chunk and tokens of trailing segments repeated in the next chunk
+TRANSCRIPT_CHUNK_TOKENS = int(os.getenv('TRANSCRIPT_CHUNK_TOKENS', '1500'))
+TRANSCRIPT_CHUNK_OVERLAP_TOKENS = int(os.getenv('TRANSCRIPT_CHUNK_OVERLAP_TOKENS', '100'))
+
+# Number of transcript chunks summarized together in one padded batch (1 disables batching)
+SUMMARY_BATCH_SIZE = int(os.getenv('SUMMARY_BATCH_SIZE', '4'))
+
+# Produce summary, key elements and performance scores from one generation per chunk
+SUMMARY_SINGLE_PASS = os.getenv('SUMMARY_SINGLE_PASS', 'False') == 'True'
+
+# Number of static prompt prefixes whose past key/values are kept per generation engine
+LLM_PREFIX_CACHE_SIZE = int(os.getenv('LLM_PREFIX_CACHE_SIZE', '16'))
+
+# Persistent cache of LLM outputs: 'sqlite' (local disk), 'redis' or 'none'
+LLM_RESPONSE_CACHE_BACKEND = os.getenv('LLM_RESPONSE_CACHE_BACKEND', 'sqlite')
+LLM_RESPONSE_CACHE_PATH = os.getenv('LLM_RESPONSE_CACHE_PATH', str(BASE_DIR / 'cache' / 'llm_responses.sqlite3'))
+LLM_RESPONSE_CACHE_REDIS_URL = os.getenv('LLM_RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/1')
+LLM_RESPONSE_CACHE_MAX_BYTES = int(os.getenv('LLM_RESPONSE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+LLM_RESPONSE_CACHE_TTL = int(os.getenv('LLM_RESPONSE_CACHE_TTL', str(30 * 24 * 60 * 60)))  # 30 days
+
+# max_new_tokens budget per generation stage
+LLM_GENERATION_BUDGETS = {
+    'chunk_summary': int(os.getenv('LLM_BUDGET_CHUNK_SUMMARY', '256')),
+    'key_elements': int(os.getenv('LLM_BUDGET_KEY_ELEMENTS', '384')),
+    'performance': int(os.getenv('LLM_BUDGET_PERFORMANCE', '384')),
+    'single_pass': int(os.getenv('LLM_BUDGET_SINGLE_PASS', '640')),
+    'email': int(os.getenv('LLM_BUDGET_EMAIL', '400')),
+    'email_feedback': int(os.getenv('LLM_BUDGET_EMAIL_FEEDBACK', '384')),
+}
+
+# Constrain JSON outputs (performance analysis, email feedback) to their declared schema while decoding
+LLM_CONSTRAINED_DECODING = os.getenv('LLM_CONSTRAINED_DECODING', 'True') == 'True'
+
+# Shared inference server (`manage.py run_inference_server`); when the URL is set,
+# services send generations there instead of loading the LLM in every worker
+LLM_INFERENCE_SERVER_URL = os.getenv('LLM_INFERENCE_SERVER_URL', '')
+LLM_INFERENCE_SERVER_TIMEOUT = int(os.getenv('LLM_INFERENCE_SERVER_TIMEOUT', '600'))
+LLM_SERVER_HOST = os.getenv('LLM_SERVER_HOST', '127.0.0.1')
+LLM_SERVER_PORT = int(os.getenv('LLM_SERVER_PORT', '8765'))
+LLM_SERVER_MAX_BATCH_SIZE = int(os.getenv('LLM_SERVER_MAX_BATCH_SIZE', '8'))
+LLM_SERVER_BATCH_WINDOW_MS = int(os.getenv('LLM_SERVER_BATCH_WINDOW_MS', '20'))
+
+# In-process micro-batching of concurrent generate() calls (threaded workers); 0 disables it
+LLM_COALESCE_WINDOW_MS = int(os.getenv('LLM_COALESCE_WINDOW_MS', '0'))
+LLM_COALESCE_MAX_BATCH_SIZE = int(os.getenv('LLM_COALESCE_MAX_BATCH_SIZE', '8'))
+# Prompts are batched with others of similar length, in buckets of this many tokens
+LLM_COALESCE_BUCKET_TOKENS = int(os.getenv('LLM_COALESCE_BUCKET_TOKENS', '256'))
+
+# Transcribe silence-delimited chunks of each recording in a pool of Whisper processes.
+# Needs a Celery worker started with --pool=solo or --pool=threads: children of the
+# default prefork pool are daemonic and cannot start the Whisper processes
+TRANSCRIPTION_PARALLEL = os.getenv('TRANSCRIPTION_PARALLEL', 'False') == 'True'
+# Pool processes per Celery worker; 0 uses one per CPU core
+TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', '0'))
+# Target chunk length; chunks are cut at the nearest silence, at most twice this long
+TRANSCRIPTION_CHUNK_SECONDS = int(os.getenv('TRANSCRIPTION_CHUNK_SECONDS', '60'))
+# Transcribe long recordings in fixed overlapping windows while decoding, in constant memory
+TRANSCRIPTION_STREAMING = os.getenv('TRANSCRIPTION_STREAMING', 'False') == 'True'
+TRANSCRIPTION_WINDOW_SECONDS = float(os.getenv('TRANSCRIPTION_WINDOW_SECONDS', '30'))
+TRANSCRIPTION_WINDOW_OVERLAP_SECONDS = float(os.getenv('TRANSCRIPTION_WINDOW_OVERLAP_SECONDS', '4'))
+# Transcribe with a fast Whisper model first and re-decode only low-confidence segments
+# with the routed model
+TRANSCRIPTION_CASCADE = os.getenv('TRANSCRIPTION_CASCADE', 'False') == 'True'
+TRANSCRIPTION_CASCADE_FAST_MODEL = os.getenv('TRANSCRIPTION_CASCADE_FAST_MODEL', 'tiny')
+# Segments below this avg_logprob are re-decoded, unless above this no_speech_prob
+TRANSCRIPTION_CASCADE_MIN_LOGPROB = float(os.getenv('TRANSCRIPTION_CASCADE_MIN_LOGPROB', '-0.6'))
+TRANSCRIPTION_CASCADE_NO_SPEECH_THRESHOLD = float(os.getenv('TRANSCRIPTION_CASCADE_NO_SPEECH_THRESHOLD', '0.6'))
+# Save the transcript after every chunk or window, flagged partial, and score sentiment
+# on the saved segments while the rest of the call is still being transcribed.
+# Only sentiment overlaps transcription; summarization still waits for the full transcript.
+# Without parallel or streaming mode, Whisper then transcribes silence-delimited chunks
+# in-process instead of the whole recording at once, which can change the transcript.
+# With TRANSCRIPTION_CASCADE on, partial rows hold the fast model's text until the
+# larger model's corrections replace it in the final transcript.
+TRANSCRIPTION_PROGRESSIVE = os.getenv('TRANSCRIPTION_PROGRESSIVE', 'False') == 'True'
+# Energy-based voice activity detection: frame length, speech level above the
+# noise floor, and the shortest silence a recording is split at
+VAD_FRAME_MS = int(os.getenv('VAD_FRAME_MS', '30'))
+VAD_THRESHOLD_DB = float(os.getenv('VAD_THRESHOLD_DB', '12'))
+VAD_MIN_SILENCE_MS = int(os.getenv('VAD_MIN_SILENCE_MS', '400'))
+
+# Cut dead air, ring-back and hold music before transcription (not in streaming mode).
+# Non-speech is silence, noise-like audio (spectral flatness above the threshold) or
+# audio whose level varies less than TRIMMING_MODULATION_DB, for at least TRIMMING_MIN_SECONDS
+TRIMMING_ENABLED = os.getenv('TRIMMING_ENABLED', 'True') == 'True'
+TRIMMING_MIN_SECONDS = float(os.getenv('TRIMMING_MIN_SECONDS', '3'))
+TRIMMING_FLATNESS_THRESHOLD = float(os.getenv('TRIMMING_FLATNESS_THRESHOLD', '0.4'))
+TRIMMING_MODULATION_DB = float(os.getenv('TRIMMING_MODULATION_DB', '3'))
+TRIMMING_PADDING_MS = int(os.getenv('TRIMMING_PADDING_MS', '300'))
+
+# Speaker diarization from clustered spectral embeddings of the transcript segments
+DIARIZATION_ENABLED = os.getenv('DIARIZATION_ENABLED', 'True') == 'True'
+DIARIZATION_MAX_SPEAKERS = int(os.getenv('DIARIZATION_MAX_SPEAKERS', '4'))
+# Calls whose best clustering has a lower silhouette are attributed to a single speaker;
+# -1 always splits into at least two
+DIARIZATION_MIN_SILHOUETTE = float(os.getenv('DIARIZATION_MIN_SILHOUETTE', '0.55'))
+# Threads computing the spectrogram; 0 uses one per CPU core
+DIARIZATION_WORKERS = int(os.getenv('DIARIZATION_WORKERS', '0'))
+
+# Decoded audio and spectrograms stored as memory-mapped .npy files next to each recording,
+# shared by the audio stages and reused when a call is reprocessed
+FEATURE_STORE_ENABLED = os.getenv('FEATURE_STORE_ENABLED', 'True') == 'True'
+# Features unused for this long are evicted, then the least recently used above the size cap
+FEATURE_STORE_RETENTION_DAYS = int(os.getenv('FEATURE_STORE_RETENTION_DAYS', '30'))
+FEATURE_STORE_MAX_BYTES = int(os.getenv('FEATURE_STORE_MAX_BYTES', str(20 * 1024 ** 3)))
+
+# Per-call routing of Whisper model and summary path by duration and queue backlog
+ROUTING_ENABLED = os.getenv('ROUTING_ENABLED', 'True') == 'True'
+ROUTING_QUEUE_NAME = os.getenv('ROUTING_QUEUE_NAME', 'celery')
+# Waiting tasks above which calls get a smaller Whisper model and single-pass summaries
+ROUTING_BACKLOG_THRESHOLD = int(os.getenv('ROUTING_BACKLOG_THRESHOLD', '20'))
+# Recordings shorter than this get a template summary without the LLM
+ROUTING_SHORT_CALL_SECONDS = int(os.getenv('ROUTING_SHORT_CALL_SECONDS', '45'))
+# Optional Whisper model by duration as "max_seconds:model" tiers, e.g. "2400:base,0:tiny";
+# 0 matches any duration. Empty uses WHISPER_MODEL for every call.
+ROUTING_WHISPER_TIERS = [
+    (int(max_seconds), model)
+    for max_seconds, model in (
+        tier.split(':') for tier in os.getenv('ROUTING_WHISPER_TIERS', '').split(',') if tier
+    )
+]
+
+# Degraded mode: defer optional LLM stages while the backlog is high, backfill when it drains
+DEGRADATION_ENABLED = os.getenv('DEGRADATION_ENABLED', 'True') == 'True'
+DEGRADATION_QUEUE_NAME = os.getenv('DEGRADATION_QUEUE_NAME', 'celery')
+# Waiting tasks at which degraded mode starts
+DEGRADATION_HIGH_WATERMARK = int(os.getenv('DEGRADATION_HIGH_WATERMARK', '30'))
+# Waiting tasks at or below which deferred stages are backfilled
+DEGRADATION_LOW_WATERMARK = int(os.getenv('DEGRADATION_LOW_WATERMARK', '5'))
+# Whisper model used for every call while degraded
+DEGRADATION_WHISPER_MODEL = os.getenv('DEGRADATION_WHISPER_MODEL', 'tiny')
+DEGRADATION_BACKFILL_QUEUE = os.getenv('DEGRADATION_BACKFILL_QUEUE', 'backfill')
+# Deferred stages queued per backfill dispatch (every DEGRADATION_BACKFILL_INTERVAL seconds)
+DEGRADATION_BACKFILL_BATCH = int(os.getenv('DEGRADATION_BACKFILL_BATCH', '5'))
+DEGRADATION_BACKFILL_INTERVAL = int(os.getenv('DEGRADATION_BACKFILL_INTERVAL', '60'))
+# Backfills run on their own queue so they never delay new work
+CELERY_TASK_ROUTES = {
+    'apps.call_analyzer.tasks.backfill_performance_async': {'queue': DEGRADATION_BACKFILL_QUEUE},
+    'apps.email_generator.tasks.backfill_email_feedback_async': {'queue': DEGRADATION_BACKFILL_QUEUE},
+}
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-deferred-performance': {
+        'task': 'apps.call_analyzer.tasks.dispatch_deferred_performance',
+        'schedule': DEGRADATION_BACKFILL_INTERVAL,
+    },
+    'dispatch-deferred-feedback': {
+        'task': 'apps.email_generator.tasks.dispatch_deferred_feedback',
+        'schedule': DEGRADATION_BACKFILL_INTERVAL,
+    },
+    'evict-feature-store': {
+        'task': 'apps.call_analyzer.tasks.evict_feature_store',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
+# Model registry: models are shared per process and evicted LRU above this count
+MODEL_REGISTRY_MAX_MODELS = int(os.getenv('MODEL_REGISTRY_MAX_MODELS', '4'))
+# Models loaded when a Celery worker process starts ('whisper', 'llm')
+MODEL_REGISTRY_PRELOAD = [name for name in os.getenv('MODEL_REGISTRY_PRELOAD', 'whisper,llm').split(',') if name]
+
 # File upload settings
 MAX_CALL_FILE_SIZE = 100 * 1024 * 1024  # 100 MB
+# Uploads are hashed (SHA-256) while they are written, to detect re-uploaded recordings
+FILE_UPLOAD_HANDLERS = [
+    'apps.core.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Reuse the analysis of an identical recording already processed in the organization
+CALL_DEDUPLICATION_ENABLED = os.getenv('CALL_DEDUPLICATION_ENABLED', 'True') == 'True'
+# Acoustic fingerprints offer reusing the results of re-encoded or trimmed copies of a call
+FINGERPRINT_ENABLED = os.getenv('FINGERPRINT_ENABLED', 'True') == 'True'
+# Hashes of a new upload looked up in the index, sampled across the recording
+FINGERPRINT_QUERY_HASHES = int(os.getenv('FINGERPRINT_QUERY_HASHES', '2000'))
+# Time-aligned matching hashes, absolute and as a share of the sampled hashes, to report a match
+FINGERPRINT_MIN_MATCHES = int(os.getenv('FINGERPRINT_MIN_MATCHES', '20'))
+FINGERPRINT_MATCH_THRESHOLD = float(os.getenv('FINGERPRINT_MATCH_THRESHOLD', '0.2'))
 ALLOWED_CALL_FILE_TYPES = ['audio/wav', 'audio/mp3', 'audio/mpeg', 'audio/ogg']